@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.schemas.user import UserCreate, User
@@ -17,7 +18,10 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(UserModel).filter(UserModel.email == user.email).first()
     if db_user:
         return db_user
-    
+    # End the lookup's read transaction before the slow hash: on SQLite the insert could not
+    # upgrade that snapshot once another request had written, and fails with "database is locked"
+    db.rollback()
+
     hashed_password = get_password_hash(user.password)
     db_user = UserModel(
         email=user.email,
@@ -25,7 +29,12 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         full_name=user.full_name
     )
     db.add(db_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request registered the same email while we were hashing
+        db.rollback()
+        return db.query(UserModel).filter(UserModel.email == user.email).one()
     db.refresh(db_user)
     return db_user
 
@@ -1,97 +1,211 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.models.biometric_data import BiometricData, BiometricType
-from app.core.config import settings
-from cryptography.fernet import Fernet
-import json
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
+from app.models.biometric_data import BiometricData, BiometricType, TemplateKind
+import asyncio
+import contextlib
 import datetime
-import random
-import re
-from app.services.face_embedding import compute_embedding
+from app.services.face_embedding import embed_face
+from app.services.voice_embedding import embed_voice
+from app.services.inference import InferenceBusyError
+from app.services.templates import encrypt_template
+from app.services.template_format import MOCK_MODEL, VOICE_MODEL
+from app.services.mock_descriptors import mock_face_descriptor, mock_voice_descriptor
+from app.services.template_cache import template_cache
+from app.services.scoring import aggregate
+from app.services.vector_index import face_index
+from app.services.uploads import read_upload, spool_upload, check_decodable, looks_like_image, looks_like_audio
+from app.core.config import settings
 
 router = APIRouter()
 
-def get_cipher_suite():
-    key = settings.ENCRYPTION_KEY
-    if isinstance(key, str):
-        key = key.encode()
-    return Fernet(key)
-
 @router.post("/face")
-async def enroll_face(file: UploadFile = File(...), user_id: int = Form(...), db: Session = Depends(get_db)):
+async def enroll_face(file: UploadFile = File(...), user_id: int = Form(...), db: AsyncSession = Depends(get_async_db)):
+    image_data = await read_upload(file, settings.UPLOAD_MAX_IMAGE_BYTES)
+    decodable = check_decodable(looks_like_image(image_data[:16]), "image")
     try:
-        image_data = await file.read()
         descriptor = None
+        model = None
         used_mock = False
 
-        # Compute embedding using the centralized service (DeepFace > ORB)
+        # Compute embedding using the centralized service (face model > ORB)
         try:
-            descriptor = compute_embedding(image_data)
+            if decodable:
+                # Templates are always built with the first (most accurate) tier
+                embedding = await embed_face(image_data, degrade=False)
+                if embedding is not None:
+                    descriptor, model = embedding.vector, embedding.model
+        except InferenceBusyError:
+            raise
         except Exception:
             pass
 
         # Fallback to mock if absolutely everything fails (should be rare)
         if descriptor is None:
-            filename = file.filename.lower() if file.filename else ""
-            match = re.match(r"([a-zA-Z0-9]+)_", filename)
-            if match:
-                seed_key = match.group(1)
-            else:
-                import zlib
-                seed_key = str(zlib.crc32(image_data))
-            random.seed(seed_key)
-            descriptor = [random.uniform(-1.0, 1.0) for _ in range(128)]
+            descriptor = mock_face_descriptor(file.filename, image_data)
+            model = MOCK_MODEL
             used_mock = True
 
-        cipher = get_cipher_suite()
-        encrypted_descriptor = cipher.encrypt(json.dumps(descriptor).encode())
+        encrypted_descriptor = encrypt_template(descriptor, BiometricType.FACE, model)
 
         biometric_entry = BiometricData(
             user_id=user_id,
             modality=BiometricType.FACE,
             encrypted_descriptor=encrypted_descriptor,
-            created_at=datetime.datetime.now().isoformat(),
+            created_at=datetime.datetime.now(),
             device_info="web_upload"
         )
         db.add(biometric_entry)
-        db.commit()
-        db.refresh(biometric_entry)
+        await db.commit()
+        template_cache.invalidate(user_id, BiometricType.FACE)
+        if settings.FACE_INDEX_ENABLED:
+            face_index.add(biometric_entry.id, user_id, descriptor, model)
 
         return {
             "message": "Face enrolled successfully", 
             "biometric_id": biometric_entry.id, 
             "mock_used": used_mock
         }
+    except InferenceBusyError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/voice")
-async def enroll_voice(file: UploadFile = File(...), user_id: int = Form(...), db: Session = Depends(get_db)):
-    audio_data = await file.read()
+async def enroll_voice(file: UploadFile = File(...), user_id: int = Form(...), db: AsyncSession = Depends(get_async_db)):
     used_mock = False
     descriptor = None
-    try:
-        from app.services.voice_embedding import compute_embedding as compute_voice_embedding
-        descriptor = compute_voice_embedding(audio_data)
-    except Exception:
-        descriptor = None
+    async with spool_upload(file, settings.UPLOAD_MAX_AUDIO_BYTES) as upload:
+        decodable = check_decodable(looks_like_audio(upload.head), "audio")
+        try:
+            if decodable:
+                descriptor = await embed_voice(upload.source, upload.digest)
+        except InferenceBusyError:
+            raise
+        except Exception:
+            descriptor = None
     if descriptor is None:
-        import zlib
-        seed_key = str(zlib.crc32(audio_data))
-        random.seed(seed_key)
-        descriptor = [random.uniform(-1.0, 1.0) for _ in range(128)]
+        descriptor = mock_voice_descriptor(upload.crc32)
         used_mock = True
-    cipher = get_cipher_suite()
-    encrypted_descriptor = cipher.encrypt(json.dumps(descriptor).encode())
+    model = MOCK_MODEL if used_mock else VOICE_MODEL
+    encrypted_descriptor = encrypt_template(descriptor, BiometricType.VOICE, model)
     biometric_entry = BiometricData(
         user_id=user_id,
         modality=BiometricType.VOICE,
         encrypted_descriptor=encrypted_descriptor,
-        created_at=datetime.datetime.now().isoformat(),
+        created_at=datetime.datetime.now(),
         device_info="web_upload"
     )
     db.add(biometric_entry)
-    db.commit()
-    db.refresh(biometric_entry)
+    await db.commit()
+    template_cache.invalidate(user_id, BiometricType.VOICE)
     return {"message": "Voice enrolled successfully", "biometric_id": biometric_entry.id, "mock_used": used_mock}
+
+def _check_samples(files: list[UploadFile], aggregation: str):
+    if aggregation not in ("mean", "medoid"):
+        raise HTTPException(status_code=400, detail="aggregation must be 'mean' or 'medoid'")
+    if not files or len(files) > settings.ENROLL_MAX_SAMPLES:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {settings.ENROLL_MAX_SAMPLES} samples")
+
+def _usable_embeddings(results) -> tuple[str | None, list]:
+    """Keeps the embeddings of the model that produced most samples."""
+    by_model = {}
+    for result in results:
+        if isinstance(result, InferenceBusyError):
+            raise result
+        if result is None or isinstance(result, BaseException):
+            continue
+        vector, model = result[0], result[1]
+        by_model.setdefault(model, []).append(vector)
+    if not by_model:
+        return None, []
+    model = max(by_model, key=lambda m: len(by_model[m]))
+    return model, by_model[model]
+
+async def _store_aggregate(db: AsyncSession, user_id: int, modality: BiometricType, model: str, vectors: list, aggregation: str, store_samples: bool):
+    # Mock descriptors are compared by raw Euclidean distance, so never average them
+    template = vectors[0] if model == MOCK_MODEL else aggregate(vectors, aggregation)
+    now = datetime.datetime.now()
+    entry = BiometricData(
+        user_id=user_id,
+        modality=modality,
+        encrypted_descriptor=encrypt_template(template, modality, model),
+        created_at=now,
+        device_info="web_upload",
+        kind=TemplateKind.AGGREGATE if len(vectors) > 1 else TemplateKind.SINGLE,
+        sample_count=len(vectors)
+    )
+    db.add(entry)
+    samples = []
+    if store_samples and len(vectors) > 1:
+        samples = [
+            BiometricData(
+                user_id=user_id,
+                modality=modality,
+                encrypted_descriptor=encrypt_template(vector, modality, model),
+                created_at=now,
+                device_info="web_upload",
+                kind=TemplateKind.SAMPLE,
+                sample_count=1
+            )
+            for vector in vectors
+        ]
+        db.add_all(samples)
+    await db.commit()
+    template_cache.invalidate(user_id, modality)
+    if modality == BiometricType.FACE and settings.FACE_INDEX_ENABLED:
+        face_index.add(entry.id, user_id, template, model)
+    return entry, [sample.id for sample in samples]
+
+@router.post("/face/multi")
+async def enroll_face_multi(files: list[UploadFile] = File(...), user_id: int = Form(...), aggregation: str = Form("mean"), store_samples: bool = Form(False), db: AsyncSession = Depends(get_async_db)):
+    _check_samples(files, aggregation)
+    samples = [await read_upload(f, settings.UPLOAD_MAX_IMAGE_BYTES) for f in files]
+    # Concurrent requests share micro-batches, so N samples cost roughly one forward pass
+    results = await asyncio.gather(
+        *(embed_face(data, degrade=False) for data in samples if check_decodable(looks_like_image(data[:16]), "image")),
+        return_exceptions=True
+    )
+    model, vectors = _usable_embeddings(results)
+    used_mock = model is None
+    if used_mock:
+        model, vectors = MOCK_MODEL, [mock_face_descriptor(files[0].filename, samples[0])]
+    entry, sample_ids = await _store_aggregate(db, user_id, BiometricType.FACE, model, vectors, aggregation, store_samples)
+    return {
+        "message": "Face enrolled successfully",
+        "biometric_id": entry.id,
+        "samples_received": len(samples),
+        "samples_used": len(vectors),
+        "sample_ids": sample_ids,
+        "mock_used": used_mock
+    }
+
+@router.post("/voice/multi")
+async def enroll_voice_multi(files: list[UploadFile] = File(...), user_id: int = Form(...), aggregation: str = Form("mean"), store_samples: bool = Form(False), db: AsyncSession = Depends(get_async_db)):
+    _check_samples(files, aggregation)
+    async with contextlib.AsyncExitStack() as stack:
+        samples = [
+            await stack.enter_async_context(spool_upload(f, settings.UPLOAD_MAX_AUDIO_BYTES)) for f in files
+        ]
+        vectors = await asyncio.gather(
+            *(
+                embed_voice(upload.source, upload.digest)
+                for upload in samples if check_decodable(looks_like_audio(upload.head), "audio")
+            ),
+            return_exceptions=True
+        )
+    model, vectors = _usable_embeddings(
+        v if isinstance(v, BaseException) or v is None else (v, VOICE_MODEL) for v in vectors
+    )
+    used_mock = model is None
+    if used_mock:
+        model, vectors = MOCK_MODEL, [mock_voice_descriptor(samples[0].crc32)]
+    entry, sample_ids = await _store_aggregate(db, user_id, BiometricType.VOICE, model, vectors, aggregation, store_samples)
+    return {
+        "message": "Voice enrolled successfully",
+        "biometric_id": entry.id,
+        "samples_received": len(samples),
+        "samples_used": len(vectors),
+        "sample_ids": sample_ids,
+        "mock_used": used_mock
+    }
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Form, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from fastapi import APIRouter, Form, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal, get_async_db
+from app.models.biometric_data import BiometricType
 from app.models.exam_session import ExamSession, ExamStatus, ScheduleType
-from app.models.verification_event import VerificationEvent
+from app.models.verification_event import VerificationEvent, VerificationPhase
+import asyncio
 import datetime
+import json
 from app.core.config import settings
+from app.services.session_events import (
+    EVENT_FIELDS, RESYNC, TooManySubscribersError, event_payload, session_events, sse_message
+)
+from app.services.session_metrics import session_metrics as metrics_cache
 
 router = APIRouter()
 
 @router.post("/session/start")
-def start_session(user_id: int = Form(...), duration_minutes: int | None = Form(None), schedule_type: str = Form("start_end"), interval_minutes: int | None = Form(None), liveness_ok: bool = Form(False), liveness_score: float | None = Form(None), db: Session = Depends(get_db)):
-    now = datetime.datetime.now().isoformat()
+async def start_session(user_id: int = Form(...), duration_minutes: int | None = Form(None), schedule_type: str = Form("start_end"), interval_minutes: int | None = Form(None), liveness_ok: bool = Form(False), liveness_score: float | None = Form(None), db: AsyncSession = Depends(get_async_db)):
+    now = datetime.datetime.now()
     try:
         sched = ScheduleType(schedule_type)
     except Exception:
@@ -27,49 +36,177 @@ def start_session(user_id: int = Form(...), duration_minutes: int | None = Form(
         interval_minutes=interval_minutes
     )
     db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.commit()
     return {"session_id": session.id, "status": session.status.value}
 
 @router.post("/session/submit")
-def submit_session(session_id: int = Form(...), user_id: int = Form(...), db: Session = Depends(get_db)):
-    session = db.query(ExamSession).filter(ExamSession.id == session_id, ExamSession.user_id == user_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    if session.status == ExamStatus.COMPLETED:
-        return {"session_id": session.id, "status": session.status.value}
-    session.ended_at = datetime.datetime.now().isoformat()
-    session.status = ExamStatus.COMPLETED
-    db.add(session)
-    db.commit()
-    db.refresh(session)
-    return {"session_id": session.id, "status": session.status.value}
+async def submit_session(session_id: int = Form(...), user_id: int = Form(...), db: AsyncSession = Depends(get_async_db)):
+    # A single conditional UPDATE: on SQLite, writing after a read in the same transaction
+    # fails with "database is locked" if another request committed in between
+    result = await db.execute(
+        update(ExamSession)
+        .where(ExamSession.id == session_id, ExamSession.user_id == user_id, ExamSession.status != ExamStatus.COMPLETED)
+        .values(ended_at=datetime.datetime.now(), status=ExamStatus.COMPLETED)
+    )
+    await db.commit()
+    if result.rowcount == 0:
+        status = (await db.execute(
+            select(ExamSession.status).where(ExamSession.id == session_id, ExamSession.user_id == user_id)
+        )).scalar()
+        if status is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, "status": ExamStatus.COMPLETED.value}
 
 @router.get("/metrics/session/{session_id}")
-def session_metrics(session_id: int, db: Session = Depends(get_db)):
-    events = db.query(VerificationEvent).filter(VerificationEvent.session_id == session_id).all()
-    if not events:
-        return {"session_id": session_id, "events": 0, "frr": None, "far": None}
-    total = len(events)
-    failures = sum(1 for e in events if not e.match)
-    frr = failures / total if total > 0 else None
-    far = None
-    return {"session_id": session_id, "events": total, "frr": frr, "far": far}
+async def session_metrics(session_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    rollup = await metrics_cache.get(session_id, db)
+    # no-cache: clients revalidate every poll, unchanged sessions answer 304 without a body
+    headers = {"ETag": metrics_cache.etag(rollup), "Cache-Control": "no-cache"}
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(rollup.to_dict(), headers=headers)
+
+def _event_fields(fields: str | None) -> tuple[str, ...]:
+    if not fields:
+        return EVENT_FIELDS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - set(EVENT_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # id is always returned: it is the pagination cursor
+    return ("id", *[f for f in dict.fromkeys(requested) if f != "id"])
+
+def _details_query(session_id: int, fields, after_id: int, limit: int, modality, phase):
+    # Column-only select: rows are tuples, no ORM identity map or entity objects
+    query = select(*(getattr(VerificationEvent, f) for f in fields)).where(
+        VerificationEvent.session_id == session_id, VerificationEvent.id > after_id
+    )
+    if modality is not None:
+        query = query.where(VerificationEvent.modality == modality)
+    if phase is not None:
+        query = query.where(VerificationEvent.phase == phase)
+    return query.order_by(VerificationEvent.id).limit(limit)
 
 @router.get("/session/{session_id}/details")
-def session_details(session_id: int, db: Session = Depends(get_db)):
-    events = db.query(VerificationEvent).filter(VerificationEvent.session_id == session_id).all()
-    data = []
-    for e in events:
-        data.append({
-            "id": e.id,
-            "modality": e.modality,
-            "phase": e.phase,
-            "match": e.match,
-            "score": e.score,
-            "threshold": e.threshold,
-            "metric": e.metric,
-            "mock_used": e.mock_used,
-            "created_at": e.created_at
-        })
-    return {"session_id": session_id, "log": data}
+async def session_details(
+    session_id: int,
+    after_id: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1),
+    fields: str | None = None,
+    modality: BiometricType | None = None,
+    phase: VerificationPhase | None = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Events of a session in id order. JSON pages hold up to `limit` events;
+    pass `next_after_id` back as `after_id` for the next page. `format=ndjson`
+    streams every matching event (up to `limit` when given) as one JSON
+    object per line, reading one keyset page at a time.
+    """
+    columns = _event_fields(fields)
+    if format == "ndjson":
+        return StreamingResponse(
+            _ndjson_events(session_id, columns, after_id, limit, modality, phase),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="session_{session_id}_events.ndjson"'},
+        )
+
+    limit = min(limit or settings.SESSION_DETAILS_PAGE_SIZE, settings.SESSION_DETAILS_MAX_PAGE_SIZE)
+    rows = (await db.execute(_details_query(session_id, columns, after_id, limit + 1, modality, phase))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "session_id": session_id,
+        "log": [event_payload(row, columns) for row in rows],
+        "next_after_id": rows[-1].id if has_more else None,
+    }
+
+async def _ndjson_events(session_id: int, columns, after_id: int, limit: int | None, modality, phase):
+    remaining = limit
+    page_size = settings.SESSION_DETAILS_MAX_PAGE_SIZE
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        # A short session per page: no connection or transaction is held while the client reads
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(_details_query(session_id, columns, after_id, size, modality, phase))).all()
+        if not rows:
+            break
+        yield "".join(json.dumps(event_payload(row, columns), separators=(",", ":")) + "\n" for row in rows)
+        after_id = rows[-1].id
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            break
+
+@router.get("/session/{session_id}/events")
+async def session_event_stream(session_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Server-sent events: `verification` for every new event (the SSE id is the
+    event id) and `metrics` with the session rollup after each write. A
+    reconnecting client sends Last-Event-ID and first receives what it missed.
+    """
+    exists = (await db.execute(select(ExamSession.id).where(ExamSession.id == session_id))).scalar()
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        # Subscribed before reading the backlog, so nothing committed meanwhile is missed
+        subscription = session_events.subscribe(session_id)
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    try:
+        await session_events.start_polling(db)
+        initial, last_sent = [], 0
+        last_event_id = request.headers.get("last-event-id", "")
+        if last_event_id.isdigit():
+            last_sent = int(last_event_id)
+            missed = (await db.execute(
+                select(VerificationEvent)
+                .where(VerificationEvent.session_id == session_id, VerificationEvent.id > last_sent)
+                .order_by(VerificationEvent.id)
+                .limit(settings.SESSION_STREAM_REPLAY_LIMIT + 1)
+            )).scalars().all()
+            if len(missed) > settings.SESSION_STREAM_REPLAY_LIMIT:
+                initial.append(sse_message(RESYNC, {"session_id": session_id}))
+            else:
+                initial.extend(sse_message("verification", event_payload(e), e.id) for e in missed)
+            if missed:
+                last_sent = missed[-1].id
+        rollup = await metrics_cache.get(session_id, db)
+        initial.append(sse_message("metrics", rollup.to_dict()))
+        # Give the pooled connection back now: the stream may stay open for hours
+        await db.close()
+    except BaseException:
+        subscription.close()
+        raise
+
+    async def stream():
+        # The broker publishes each event once but, with other workers' events
+        # polled, not always in id order: only the replayed backlog is skipped
+        replayed = last_sent
+        try:
+            yield "retry: 3000\n\n"
+            for message in initial:
+                yield message
+            while True:
+                try:
+                    event_id, message = await asyncio.wait_for(subscription.queue.get(), settings.SESSION_STREAM_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is RESYNC:
+                    message = sse_message(RESYNC, {"session_id": session_id})
+                elif event_id is not None and event_id <= replayed:
+                    continue
+                yield message
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
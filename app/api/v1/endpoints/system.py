@@ -0,0 +1,42 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.inference import inference
+from app.services.model_registry import face_models
+from app.services.face_embedding import face_batcher
+from app.services.face_detection import face_stage_stats
+from app.services.face_tiers import face_tiers
+from app.services.template_cache import template_cache
+from app.services.embedding_cache import embedding_cache
+from app.services.vector_index import face_index
+from app.services.event_writer import event_writer
+from app.services.session_events import session_events
+from app.services.session_metrics import session_metrics
+
+router = APIRouter()
+
+@router.get("/inference")
+async def inference_stats():
+    return {**inference.stats(), "face_batcher": face_batcher.stats(), "face_stages": face_stage_stats.snapshot(), "face_tiers": face_tiers.stats()}
+
+@router.get("/caches")
+async def cache_stats():
+    return {"templates": template_cache.stats(), "embeddings": embedding_cache.stats(), "face_index": face_index.stats()}
+
+@router.get("/events")
+async def event_writer_stats():
+    return {**event_writer.stats(), "session_metrics": session_metrics.stats(), "streams": session_events.stats()}
+
+@router.get("/ready")
+async def readiness():
+    status = face_models.status()
+    if status["ready"] and face_models.sidecar_socket:
+        # Face requests would fall back to ORB, which matches no model template, while the sidecar is down
+        status["sidecar_reachable"] = await asyncio.to_thread(face_models.sidecar_reachable)
+        status["ready"] = status["sidecar_reachable"] is not False
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@router.post("/warmup")
+async def warmup():
+    await asyncio.to_thread(face_models.load_and_warmup)
+    return face_models.status()
@@ -1,216 +1,210 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.models.biometric_data import BiometricData, BiometricType
-from app.models.verification_event import VerificationEvent, VerificationPhase
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
+from app.models.biometric_data import BiometricType
+from app.models.verification_event import VerificationPhase
 from app.models.exam_session import ExamSession
 from app.core.config import settings
-from cryptography.fernet import Fernet
-import json
-import math
-import random
 from io import BytesIO
-import re
-import numpy as np
 import datetime
-import cv2
-from app.services.face_embedding import compute_embedding
+from app.services.face_embedding import embed_face
+from app.services.face_tiers import face_tiers
+from app.services.voice_embedding import embed_voice
+from app.services.inference import inference, InferenceBusyError, CPU_POOL
+from app.services.templates import load_template_async, load_templates_async
+from app.services.vector_index import face_index
+from app.services.scoring import compare, fuse, policy_for
+from app.services.template_format import MOCK_MODEL, VOICE_MODEL
+from app.services.mock_descriptors import mock_face_descriptor, mock_voice_descriptor
+from app.services.event_writer import event_writer
+from app.services.liveness import check_liveness, LivenessResult
+from app.services.metrics import metrics
+from app.services.uploads import read_upload, spool_upload, check_decodable, looks_like_image, looks_like_audio
+import asyncio
 
 router = APIRouter()
 
-def get_cipher_suite():
-    key = settings.ENCRYPTION_KEY
-    if isinstance(key, str):
-        key = key.encode()
-    return Fernet(key)
-
-def euclidean_distance(v1, v2):
-    return math.sqrt(sum((a - b) ** 2 for a, b in zip(v1, v2)))
-
-def _log_event(db: Session, session_id: int, user_id: int, modality: BiometricType, phase: VerificationPhase, match: bool, score: float, threshold: float, metric: str, mock_used: bool):
-    now = datetime.datetime.now().isoformat()
-    ev = VerificationEvent(
-        session_id=session_id,
-        user_id=user_id,
-        modality=modality,
-        phase=phase,
-        match=match,
-        score=score,
-        threshold=threshold,
-        metric=metric,
-        mock_used=mock_used,
-        created_at=now
-    )
-    db.add(ev)
-    db.commit()
-    db.refresh(ev)
-    return ev
+def _event_values(session_id: int, user_id: int, modality: BiometricType, phase: VerificationPhase, match: bool, score: float, threshold: float, metric: str, mock_used: bool, face_tier: str | None = None) -> dict:
+    return {
+        "session_id": session_id,
+        "user_id": user_id,
+        "modality": modality,
+        "phase": phase,
+        "match": match,
+        "score": score,
+        "threshold": threshold,
+        "metric": metric,
+        "mock_used": mock_used,
+        "face_tier": face_tier,
+        "created_at": datetime.datetime.now()
+    }
 
-@router.post("/authenticate/face")
-async def verify_face(file: UploadFile = File(...), user_id: int = Form(...), db: Session = Depends(get_db)):
-    biometric_entry = db.query(BiometricData).filter(
-        BiometricData.user_id == user_id,
-        BiometricData.modality == BiometricType.FACE
-    ).first()
+async def _log_event(session_id: int, user_id: int, modality: BiometricType, phase: VerificationPhase, match: bool, score: float, threshold: float, metric: str, mock_used: bool, face_tier: str | None = None):
+    # Batched with concurrent requests by the event writer (see EVENT_WRITER_DURABILITY)
+    with metrics.stage("event_log"):
+        await event_writer.submit(**_event_values(session_id, user_id, modality, phase, match, score, threshold, metric, mock_used, face_tier))
 
-    if not biometric_entry:
-        raise HTTPException(status_code=404, detail="No biometric data found for user")
+def _check_face_tier(name: str | None):
+    try:
+        face_tiers.get(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    image_data = await file.read()
-    input_descriptor = None
-    used_mock = False
-    
-    # Compute embedding using the centralized service (DeepFace > ORB)
+async def _face_probe(image_data: bytes, filename: str | None, tier: str | None = None) -> tuple[list[float], str, bool, str | None]:
+    """
+    Probe embedding, model (face model > ORB) and pipeline tier, or a mock
+    descriptor (no tier) when none can be computed.
+    """
+    decodable = check_decodable(looks_like_image(image_data[:16]), "image")
     try:
-        input_descriptor = compute_embedding(image_data)
+        if decodable:
+            embedding = await embed_face(image_data, tier)
+            if embedding is not None:
+                return embedding.vector, embedding.model, False, embedding.tier
+    except InferenceBusyError:
+        raise
     except Exception:
-        pass
-    
-    # Fallback to mock
-    if input_descriptor is None:
-        filename = file.filename.lower() if file.filename else ""
-        match = re.match(r"([a-zA-Z0-9]+)_", filename)
-        if match:
-            seed_key = match.group(1)
-        else:
-            import zlib
-            seed_key = str(zlib.crc32(image_data))
-
-        random.seed(seed_key)
-        input_descriptor = [random.uniform(-1.0, 1.0) for _ in range(128)]
-        used_mock = True
-
-    cipher = get_cipher_suite()
+        metrics.inc("model_errors_total", modality="face")
+
+    metrics.inc("mock_used_total", modality="face")
+    return mock_face_descriptor(filename, image_data), MOCK_MODEL, True, None
+
+async def _voice_probe(upload) -> tuple[list[float], str, bool]:
+    decodable = check_decodable(looks_like_audio(upload.head), "audio")
+    try:
+        if decodable:
+            with metrics.stage("voice_embed"):
+                descriptor = await embed_voice(upload.source, upload.digest)
+            if descriptor is not None:
+                return descriptor, VOICE_MODEL, False
+    except InferenceBusyError:
+        raise
+    except Exception:
+        metrics.inc("model_errors_total", modality="voice")
+    metrics.inc("mock_used_total", modality="voice")
+    return mock_voice_descriptor(upload.crc32), MOCK_MODEL, True
+
+@router.post("/authenticate/face")
+async def verify_face(file: UploadFile = File(...), user_id: int = Form(...), face_tier: str | None = Form(None), db: AsyncSession = Depends(get_async_db)):
+    _check_face_tier(face_tier)
     try:
-        encrypted_blob = biometric_entry.encrypted_descriptor
-        if isinstance(encrypted_blob, memoryview):
-            encrypted_blob = encrypted_blob.tobytes()
-        stored_descriptor_json = cipher.decrypt(bytes(encrypted_blob))
-        stored_descriptor = json.loads(stored_descriptor_json.decode())
+        stored_template = await load_template_async(db, user_id, BiometricType.FACE)
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to decrypt biometric data")
 
-    score = None
-    metric = "euclidean"
-    threshold = settings.FACE_EUCLIDEAN_THRESHOLD
-    
-    # Handle different descriptor lengths (dlib=128, ORB=512, VGG-Face=4096/2622)
-    # dlib (128) typically uses Euclidean distance < 0.6
-    # DeepFace (2622/4096) and ORB (512) typically use Cosine Similarity
-    if len(stored_descriptor) == 128:
-        score = euclidean_distance(input_descriptor, stored_descriptor)
-        match = score < threshold
-    else:
-        metric = "cosine"
-        a = np.array(input_descriptor, dtype=np.float32)
-        b = np.array(stored_descriptor, dtype=np.float32)
-        # Ensure dimensions match before dot product
-        if a.shape != b.shape:
-             # This happens if user enrolled with one method (e.g. ORB) and verifies with another (e.g. DeepFace)
-             # or if models changed. We cannot compare validly.
-             # Fallback to a fail or handle gracefully.
-             # For POC, we'll just fail the match to avoid crash
-             score = 0.0
-             match = False
-        else:
-            denom = (np.linalg.norm(a) * np.linalg.norm(b)) + 1e-8
-            score = float(np.dot(a, b) / denom)
-            threshold = settings.FACE_COSINE_THRESHOLD
-            match = score >= threshold
+    if stored_template is None:
+        raise HTTPException(status_code=404, detail="No biometric data found for user")
+
+    image_data = await read_upload(file, settings.UPLOAD_MAX_IMAGE_BYTES)
+    input_descriptor, input_model, used_mock, tier = await _face_probe(image_data, file.filename, face_tier)
+
+    # Metric and threshold follow the stored template's model (see scoring.policy_for)
+    with metrics.stage("score"):
+        score, match, metric, threshold = compare(input_descriptor, input_model, stored_template)
 
     return {
         "match": match, 
         "score": score, 
         "threshold": threshold,
         "metric": metric,
-        "mock_used": used_mock
+        "mock_used": used_mock,
+        "tier": tier
     }
 
 @router.post("/authenticate/face/start")
-async def verify_face_start(file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), db: Session = Depends(get_db)):
-    res = await verify_face(file=file, user_id=user_id, db=db)
-    _log_event(db, session_id, user_id, BiometricType.FACE, VerificationPhase.START, res["match"], res["score"], res["threshold"], res["metric"], res["mock_used"])
+async def verify_face_start(file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), face_tier: str | None = Form(None), db: AsyncSession = Depends(get_async_db)):
+    res = await verify_face(file=file, user_id=user_id, face_tier=face_tier, db=db)
+    await _log_event(session_id, user_id, BiometricType.FACE, VerificationPhase.START, res["match"], res["score"], res["threshold"], res["metric"], res["mock_used"], res["tier"])
     return {"session_id": session_id, **res}
 
 @router.post("/authenticate/face/end")
-async def verify_face_end(file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), db: Session = Depends(get_db)):
-    res = await verify_face(file=file, user_id=user_id, db=db)
-    _log_event(db, session_id, user_id, BiometricType.FACE, VerificationPhase.END, res["match"], res["score"], res["threshold"], res["metric"], res["mock_used"])
+async def verify_face_end(file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), face_tier: str | None = Form(None), db: AsyncSession = Depends(get_async_db)):
+    res = await verify_face(file=file, user_id=user_id, face_tier=face_tier, db=db)
+    await _log_event(session_id, user_id, BiometricType.FACE, VerificationPhase.END, res["match"], res["score"], res["threshold"], res["metric"], res["mock_used"], res["tier"])
     return {"session_id": session_id, **res}
 
 @router.post("/authenticate/face/liveness")
-async def verify_face_liveness(file1: UploadFile = File(...), file2: UploadFile = File(...)):
-    img1 = await file1.read()
-    img2 = await file2.read()
-    score = 0.0
-    liveness = False
+async def verify_face_liveness(
+    file1: UploadFile | None = File(None),
+    file2: UploadFile | None = File(None),
+    frames: list[UploadFile] | None = File(None),
+):
+    # file1/file2 is the original two-frame form; `frames` carries a longer sequence in capture order
+    uploads = [f for f in (file1, file2) if f is not None] + list(frames or [])
+    if len(uploads) < 2:
+        raise HTTPException(status_code=400, detail="At least two frames are required")
+    if len(uploads) > settings.LIVENESS_MAX_FRAMES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.LIVENESS_MAX_FRAMES} frames are accepted")
+    data = [await read_upload(f, settings.UPLOAD_MAX_IMAGE_BYTES) for f in uploads]
+
+    result = LivenessResult(False, 0.0, 0, False, None)
     try:
-        a = cv2.imdecode(np.frombuffer(img1, np.uint8), cv2.IMREAD_COLOR)
-        b = cv2.imdecode(np.frombuffer(img2, np.uint8), cv2.IMREAD_COLOR)
-        if a is not None and b is not None:
-            ga = cv2.cvtColor(a, cv2.COLOR_BGR2GRAY)
-            gb = cv2.cvtColor(b, cv2.COLOR_BGR2GRAY)
-            ga = cv2.GaussianBlur(ga, (5,5), 0)
-            gb = cv2.GaussianBlur(gb, (5,5), 0)
-            d = cv2.absdiff(ga, gb)
-            score = float(np.mean(d))
-            liveness = score > settings.LIVENESS_MOTION_THRESHOLD
+        with metrics.stage("liveness"):
+            result = await inference.run(CPU_POOL, check_liveness, data)
+    except InferenceBusyError:
+        raise
     except Exception:
-        liveness = False
-
-    return {"liveness": liveness, "score": score, "threshold": settings.LIVENESS_MOTION_THRESHOLD}
+        pass
 
-@router.post("/authenticate/voice")
-async def verify_voice(file: UploadFile = File(...), user_id: int = Form(...), db: Session = Depends(get_db)):
-    biometric_entry = db.query(BiometricData).filter(
-        BiometricData.user_id == user_id,
-        BiometricData.modality == BiometricType.VOICE
-    ).first()
+    return {
+        "liveness": result.live,
+        "score": result.score,
+        "threshold": settings.LIVENESS_MOTION_THRESHOLD,
+        "frames_received": len(data),
+        "frames_used": result.frames_used,
+        "early_exit": result.early_exit,
+    }
 
-    if not biometric_entry:
-        raise HTTPException(status_code=404, detail="No biometric data found for user")
+@router.post("/identify/face")
+async def identify_face(file: UploadFile = File(...), top_k: int = Form(5)):
+    if not settings.FACE_INDEX_ENABLED:
+        raise HTTPException(status_code=404, detail="Face identification is disabled")
+    if not face_index.ready:
+        raise HTTPException(status_code=503, detail="Face index is still loading", headers={"Retry-After": "5"})
 
-    audio_data = await file.read()
-    input_descriptor = None
-    used_mock = False
-    
+    image_data = await read_upload(file, settings.UPLOAD_MAX_IMAGE_BYTES)
+    decodable = check_decodable(looks_like_image(image_data[:16]), "image")
     try:
-        input_descriptor = compute_voice_embedding(audio_data)
+        embedding = await embed_face(image_data) if decodable else None
+    except InferenceBusyError:
+        raise
     except Exception:
-        pass
-    
-    if input_descriptor is None:
-        import zlib
-        seed_key = str(zlib.crc32(audio_data))
-        random.seed(seed_key)
-        input_descriptor = [random.uniform(-1.0, 1.0) for _ in range(128)]
-        used_mock = True
-
-    cipher = get_cipher_suite()
+        embedding = None
+    if embedding is None:
+        raise HTTPException(status_code=422, detail="Could not compute a face embedding")
+
+    input_descriptor, model = embedding.vector, embedding.model
+    if face_index.refresh_due():
+        await asyncio.to_thread(face_index.refresh)
+    hits = await asyncio.to_thread(face_index.search, input_descriptor, model, max(1, min(top_k, 50)))
+    metric, threshold = policy_for(BiometricType.FACE, model)
+    candidates = [
+        {"user_id": user_id, "biometric_id": row_id, "score": score, "match": score >= threshold}
+        for row_id, user_id, score in hits
+    ]
+    return {
+        "model": model,
+        "metric": metric,
+        "threshold": threshold,
+        "candidates": candidates
+    }
+
+@router.post("/authenticate/voice")
+async def verify_voice(file: UploadFile = File(...), user_id: int = Form(...), db: AsyncSession = Depends(get_async_db)):
     try:
-        encrypted_blob = biometric_entry.encrypted_descriptor
-        if isinstance(encrypted_blob, memoryview):
-            encrypted_blob = encrypted_blob.tobytes()
-        stored_descriptor_json = cipher.decrypt(bytes(encrypted_blob))
-        stored_descriptor = json.loads(stored_descriptor_json.decode())
+        stored_template = await load_template_async(db, user_id, BiometricType.VOICE)
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to decrypt biometric data")
 
-    score = 0.0
-    metric = "cosine"
-    threshold = settings.VOICE_COSINE_THRESHOLD
-    
-    # Cosine Similarity for Voice (MFCC/Librosa vectors)
-    a = np.array(input_descriptor, dtype=np.float32)
-    b = np.array(stored_descriptor, dtype=np.float32)
-    
-    if a.shape != b.shape:
-        score = 0.0
-        match = False
-    else:
-        denom = (np.linalg.norm(a) * np.linalg.norm(b)) + 1e-8
-        score = float(np.dot(a, b) / denom)
-        match = score >= threshold
+    if stored_template is None:
+        raise HTTPException(status_code=404, detail="No biometric data found for user")
+
+    # Large recordings are spooled to disk and decoded from the file in blocks
+    async with spool_upload(file, settings.UPLOAD_MAX_AUDIO_BYTES) as upload:
+        input_descriptor, input_model, used_mock = await _voice_probe(upload)
+
+    with metrics.stage("score"):
+        score, match, metric, threshold = compare(input_descriptor, input_model, stored_template)
 
     return {
         "match": match, 
@@ -221,13 +215,70 @@ async def verify_voice(file: UploadFile = File(...), user_id: int = Form(...), d
     }
 
 @router.post("/authenticate/voice/start")
-async def verify_voice_start(file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), db: Session = Depends(get_db)):
+async def verify_voice_start(file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), db: AsyncSession = Depends(get_async_db)):
     res = await verify_voice(file=file, user_id=user_id, db=db)
-    _log_event(db, session_id, user_id, BiometricType.VOICE, VerificationPhase.START, res["match"], res["score"], res["threshold"], res["metric"], res["mock_used"])
+    await _log_event(session_id, user_id, BiometricType.VOICE, VerificationPhase.START, res["match"], res["score"], res["threshold"], res["metric"], res["mock_used"])
     return {"session_id": session_id, **res}
 
 @router.post("/authenticate/voice/end")
-async def verify_voice_end(file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), db: Session = Depends(get_db)):
+async def verify_voice_end(file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), db: AsyncSession = Depends(get_async_db)):
     res = await verify_voice(file=file, user_id=user_id, db=db)
-    _log_event(db, session_id, user_id, BiometricType.VOICE, VerificationPhase.END, res["match"], res["score"], res["threshold"], res["metric"], res["mock_used"])
+    await _log_event(session_id, user_id, BiometricType.VOICE, VerificationPhase.END, res["match"], res["score"], res["threshold"], res["metric"], res["mock_used"])
     return {"session_id": session_id, **res}
+
+def _comparison_dict(comparison, mock_used: bool) -> dict:
+    return {
+        "match": comparison.match,
+        "score": comparison.score,
+        "threshold": comparison.threshold,
+        "metric": comparison.metric,
+        "mock_used": mock_used
+    }
+
+@router.post("/authenticate/multimodal/{phase}")
+async def verify_multimodal(phase: VerificationPhase, face_file: UploadFile = File(...), voice_file: UploadFile = File(...), user_id: int = Form(...), session_id: int = Form(...), face_tier: str | None = Form(None), db: AsyncSession = Depends(get_async_db)):
+    """
+    Face and voice check in one request: both templates in one query, both
+    embeddings computed concurrently, scores fused per FUSION_MODE. The two
+    per-modality events and the fused event are written in one transaction.
+    """
+    _check_face_tier(face_tier)
+    try:
+        templates = await load_templates_async(db, user_id, (BiometricType.FACE, BiometricType.VOICE))
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to decrypt biometric data")
+    missing = [modality.value for modality, template in templates.items() if template is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"No {' and '.join(missing)} biometric data found for user")
+
+    image_data = await read_upload(face_file, settings.UPLOAD_MAX_IMAGE_BYTES)
+    async with spool_upload(voice_file, settings.UPLOAD_MAX_AUDIO_BYTES) as upload:
+        # Both finish before the spooled recording is removed, even if one of them fails
+        probes = await asyncio.gather(_face_probe(image_data, face_file.filename, face_tier), _voice_probe(upload), return_exceptions=True)
+    for probe in probes:
+        if isinstance(probe, BaseException):
+            raise probe
+    (face_descriptor, face_model, face_mock, tier), (voice_descriptor, voice_model, voice_mock) = probes
+
+    with metrics.stage("score"):
+        face = compare(face_descriptor, face_model, templates[BiometricType.FACE])
+        voice = compare(voice_descriptor, voice_model, templates[BiometricType.VOICE])
+        try:
+            fused = fuse([face, voice], [settings.FUSION_FACE_WEIGHT, settings.FUSION_VOICE_WEIGHT], settings.FUSION_MODE, settings.FUSION_THRESHOLD)
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    mock_used = face_mock or voice_mock
+
+    with metrics.stage("event_log"):
+        await event_writer.submit_many([
+            _event_values(session_id, user_id, BiometricType.FACE, phase, face.match, face.score, face.threshold, face.metric, face_mock, tier),
+            _event_values(session_id, user_id, BiometricType.VOICE, phase, voice.match, voice.score, voice.threshold, voice.metric, voice_mock),
+            _event_values(session_id, user_id, BiometricType.MULTIMODAL, phase, fused.match, fused.score, fused.threshold, fused.metric, mock_used, tier),
+        ])
+    return {
+        "session_id": session_id,
+        "phase": phase.value,
+        **_comparison_dict(fused, mock_used),
+        "face": {**_comparison_dict(face, face_mock), "tier": tier},
+        "voice": _comparison_dict(voice, voice_mock)
+    }
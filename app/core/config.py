@@ -5,6 +5,18 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Multimodal Biometric Access"
     API_V1_STR: str = "/api/v1"
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+    # Async endpoints use this URL; by default derived from DATABASE_URL (sqlite+aiosqlite, postgresql+asyncpg)
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")
+    # Connection pool (per engine, per process)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # SQLite pragmas applied on every new connection
+    SQLITE_WAL: bool = os.getenv("SQLITE_WAL", "true").lower() == "true"
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
     SECRET_KEY: str = os.getenv("SECRET_KEY", "changethis_secret_key_for_jwt")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -15,6 +27,113 @@ class Settings(BaseSettings):
     VOICE_EUCLIDEAN_THRESHOLD: float = float(os.getenv("VOICE_EUCLIDEAN_THRESHOLD", "0.6"))
     VOICE_COSINE_THRESHOLD: float = float(os.getenv("VOICE_COSINE_THRESHOLD", "0.3"))
     LIVENESS_MOTION_THRESHOLD: float = float(os.getenv("LIVENESS_MOTION_THRESHOLD", "5.0"))
+    # Liveness frames are decoded at up to 1/LIVENESS_MAX_REDUCTION scale while the long side stays >= LIVENESS_MIN_SIDE
+    LIVENESS_MAX_REDUCTION: int = int(os.getenv("LIVENESS_MAX_REDUCTION", "4"))
+    LIVENESS_MIN_SIDE: int = int(os.getenv("LIVENESS_MIN_SIDE", "160"))
+    # Measure motion inside the face box (grown by the margin) found on the first frame
+    LIVENESS_ROI_ENABLED: bool = os.getenv("LIVENESS_ROI_ENABLED", "false").lower() == "true"
+    LIVENESS_ROI_MARGIN: float = float(os.getenv("LIVENESS_ROI_MARGIN", "0.25"))
+    # Stop decoding frames once a pair scores above threshold * factor
+    LIVENESS_EARLY_EXIT_FACTOR: float = float(os.getenv("LIVENESS_EARLY_EXIT_FACTOR", "1.5"))
+    LIVENESS_MAX_FRAMES: int = int(os.getenv("LIVENESS_MAX_FRAMES", "8"))
+    # Inference executor (keeps CPU-bound embedding work off the event loop)
+    INFERENCE_THREAD_WORKERS: int = int(os.getenv("INFERENCE_THREAD_WORKERS", "2"))
+    INFERENCE_PROCESS_WORKERS: int = int(os.getenv("INFERENCE_PROCESS_WORKERS", "2"))
+    INFERENCE_MAX_QUEUE: int = int(os.getenv("INFERENCE_MAX_QUEUE", "32"))
+    INFERENCE_PROCESS_START_METHOD: str = os.getenv("INFERENCE_PROCESS_START_METHOD", "spawn")
+    # Face model registry: "deepface", "onnx" (CPU via onnxruntime) or "none" (ORB only)
+    FACE_MODEL_BACKEND: str = os.getenv("FACE_MODEL_BACKEND", "deepface")
+    FACE_MODEL_NAME: str = os.getenv("FACE_MODEL_NAME", "VGG-Face")
+    FACE_ONNX_MODEL_PATH: str = os.getenv("FACE_ONNX_MODEL_PATH", "models/vgg_face.onnx")
+    FACE_MODEL_PRELOAD: bool = os.getenv("FACE_MODEL_PRELOAD", "true").lower() == "true"
+    # Unix socket of a shared face model sidecar (app.scripts.model_sidecar); "" = load the model in-process
+    FACE_MODEL_SIDECAR_SOCKET: str = os.getenv("FACE_MODEL_SIDECAR_SOCKET", "")
+    FACE_MODEL_SIDECAR_WAIT_SECONDS: float = float(os.getenv("FACE_MODEL_SIDECAR_WAIT_SECONDS", "120"))
+    FACE_MODEL_SIDECAR_TIMEOUT_SECONDS: float = float(os.getenv("FACE_MODEL_SIDECAR_TIMEOUT_SECONDS", "30"))
+    ONNX_INTRA_OP_THREADS: int = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    ONNX_INTER_OP_THREADS: int = int(os.getenv("ONNX_INTER_OP_THREADS", "0"))
+    # Haar face detection ("" = cascade shipped with the app); larger frames are downscaled first
+    FACE_CASCADE_PATH: str = os.getenv("FACE_CASCADE_PATH", "")
+    FACE_DETECT_MAX_SIDE: int = int(os.getenv("FACE_DETECT_MAX_SIDE", "640"))
+    # Face pipeline tiers, most accurate first: name:detector:max_side:model:budget_ms
+    # (detector haar|center, max_side 0 = frame as decoded, model model|orb, budget 0 = none);
+    # requests are only degraded to tiers with the first tier's detector and model
+    FACE_PIPELINE_TIERS: str = os.getenv(
+        "FACE_PIPELINE_TIERS", "full:haar:0:model:800,reduced:haar:320:model:400,minimal:haar:240:model:0"
+    )
+    # Requests move one tier down per this many queued face tasks (0 disables); skipped tiers are retried after
+    FACE_TIER_QUEUE_STEP: int = int(os.getenv("FACE_TIER_QUEUE_STEP", "8"))
+    FACE_TIER_RETRY_SECONDS: float = float(os.getenv("FACE_TIER_RETRY_SECONDS", "10"))
+    # Micro-batching of face forward passes across concurrent requests (1 disables)
+    FACE_BATCH_MAX_SIZE: int = int(os.getenv("FACE_BATCH_MAX_SIZE", "16"))
+    FACE_BATCH_MAX_WAIT_MS: float = float(os.getenv("FACE_BATCH_MAX_WAIT_MS", "5"))
+    # Decrypted template cache (0 entries or 0 TTL disables)
+    TEMPLATE_CACHE_MAX_ENTRIES: int = int(os.getenv("TEMPLATE_CACHE_MAX_ENTRIES", "10000"))
+    TEMPLATE_CACHE_TTL_SECONDS: float = float(os.getenv("TEMPLATE_CACHE_TTL_SECONDS", "600"))
+    TEMPLATE_CACHE_ZERO_ON_EVICT: bool = os.getenv("TEMPLATE_CACHE_ZERO_ON_EVICT", "true").lower() == "true"
+    # Probe embeddings keyed by a hash of the uploaded bytes, so re-submitted captures skip the model (0 entries disables)
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2048"))
+    EMBEDDING_CACHE_TTL_SECONDS: float = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "300"))
+    # Entries evicted from memory move to memory-mapped scratch files in this directory ("" disables)
+    EMBEDDING_CACHE_SPILL_DIR: str = os.getenv("EMBEDDING_CACHE_SPILL_DIR", "")
+    EMBEDDING_CACHE_SPILL_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_SPILL_ENTRIES", "50000"))
+    # Storage precision of new templates: float32, float16 or int8
+    TEMPLATE_STORAGE_DTYPE: str = os.getenv("TEMPLATE_STORAGE_DTYPE", "float32")
+    # Multi-sample enrollment
+    ENROLL_MAX_SAMPLES: int = int(os.getenv("ENROLL_MAX_SAMPLES", "10"))
+    # 1:N face identification index (exact below the IVF threshold, IVF above it)
+    FACE_INDEX_ENABLED: bool = os.getenv("FACE_INDEX_ENABLED", "true").lower() == "true"
+    FACE_INDEX_PATH: str = os.getenv("FACE_INDEX_PATH", "face_index.bin")
+    FACE_INDEX_IVF_THRESHOLD: int = int(os.getenv("FACE_INDEX_IVF_THRESHOLD", "20000"))
+    FACE_INDEX_NLIST: int = int(os.getenv("FACE_INDEX_NLIST", "0"))
+    FACE_INDEX_NPROBE: int = int(os.getenv("FACE_INDEX_NPROBE", "8"))
+    # /identify first adds face rows stored by other workers or imports once this old (0 = only at startup)
+    FACE_INDEX_REFRESH_SECONDS: float = float(os.getenv("FACE_INDEX_REFRESH_SECONDS", "30"))
+    # Ids below the highest one scanned that every catch-up reads again: PostgreSQL assigns ids
+    # before commit, so a row can become visible after a higher one (0 = only above it, enough for SQLite)
+    FACE_INDEX_RESCAN_WINDOW: int = int(os.getenv("FACE_INDEX_RESCAN_WINDOW", "1000"))
+    # Voice features: "lean" (fast path) or "exact" (bit-compatible with the librosa pipeline)
+    VOICE_FEATURE_MODE: str = os.getenv("VOICE_FEATURE_MODE", "lean")
+    # Trim leading/trailing silence quieter than VOICE_VAD_TOP_DB below the peak before pooling
+    VOICE_VAD_ENABLED: bool = os.getenv("VOICE_VAD_ENABLED", "false").lower() == "true"
+    VOICE_VAD_TOP_DB: float = float(os.getenv("VOICE_VAD_TOP_DB", "60"))
+    # Verification event writer: batched inserts; "sync" waits for the commit, "async" is fire-and-forget
+    EVENT_WRITER_BATCH_SIZE: int = int(os.getenv("EVENT_WRITER_BATCH_SIZE", "200"))
+    EVENT_WRITER_FLUSH_MS: float = float(os.getenv("EVENT_WRITER_FLUSH_MS", "10"))
+    EVENT_WRITER_MAX_QUEUE: int = int(os.getenv("EVENT_WRITER_MAX_QUEUE", "10000"))
+    EVENT_WRITER_DURABILITY: str = os.getenv("EVENT_WRITER_DURABILITY", "sync")
+    # Multimodal verification: "weighted" (weighted mean of threshold-normalised scores), "either" or "both"
+    FUSION_MODE: str = os.getenv("FUSION_MODE", "weighted")
+    FUSION_FACE_WEIGHT: float = float(os.getenv("FUSION_FACE_WEIGHT", "0.5"))
+    FUSION_VOICE_WEIGHT: float = float(os.getenv("FUSION_VOICE_WEIGHT", "0.5"))
+    FUSION_THRESHOLD: float = float(os.getenv("FUSION_THRESHOLD", "0.5"))
+    # Per-session metric rollups kept in memory (LRU); evicted sessions are rebuilt from the events table
+    SESSION_METRICS_CACHE_SIZE: int = int(os.getenv("SESSION_METRICS_CACHE_SIZE", "10000"))
+    # Rollups only see this worker's writes: older ones are rebuilt from the events table on read (0 = never)
+    SESSION_METRICS_TTL_SECONDS: float = float(os.getenv("SESSION_METRICS_TTL_SECONDS", "5"))
+    # Session details: default and maximum page size (keyset pagination on event id)
+    SESSION_DETAILS_PAGE_SIZE: int = int(os.getenv("SESSION_DETAILS_PAGE_SIZE", "500"))
+    SESSION_DETAILS_MAX_PAGE_SIZE: int = int(os.getenv("SESSION_DETAILS_MAX_PAGE_SIZE", "5000"))
+    # Server-sent session event streams: subscribers per session, per-subscriber buffer, keep-alive interval
+    SESSION_STREAM_MAX_SUBSCRIBERS: int = int(os.getenv("SESSION_STREAM_MAX_SUBSCRIBERS", "20"))
+    SESSION_STREAM_QUEUE_SIZE: int = int(os.getenv("SESSION_STREAM_QUEUE_SIZE", "256"))
+    SESSION_STREAM_HEARTBEAT_S: float = float(os.getenv("SESSION_STREAM_HEARTBEAT_S", "15"))
+    SESSION_STREAM_REPLAY_LIMIT: int = int(os.getenv("SESSION_STREAM_REPLAY_LIMIT", "1000"))
+    # Streams also poll the events table for other workers' events at this interval (0 = this worker's only)
+    SESSION_STREAM_POLL_S: float = float(os.getenv("SESSION_STREAM_POLL_S", "1"))
+    # Ids below the highest one polled that every poll reads again, like FACE_INDEX_RESCAN_WINDOW
+    SESSION_STREAM_RESCAN_WINDOW: int = int(os.getenv("SESSION_STREAM_RESCAN_WINDOW", "1000"))
+    # Upload limits; audio above the spill size is spooled to a temp file and decoded from disk
+    UPLOAD_MAX_IMAGE_BYTES: int = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+    UPLOAD_MAX_AUDIO_BYTES: int = int(os.getenv("UPLOAD_MAX_AUDIO_BYTES", str(50 * 1024 * 1024)))
+    UPLOAD_MAX_REQUEST_BYTES: int = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(110 * 1024 * 1024)))
+    UPLOAD_SPILL_BYTES: int = int(os.getenv("UPLOAD_SPILL_BYTES", str(1024 * 1024)))
+    # Reject payloads that are not a known image/audio format with 415 instead of using the mock fallback
+    UPLOAD_STRICT_DECODE: bool = os.getenv("UPLOAD_STRICT_DECODE", "false").lower() == "true"
+    # Per-stage latency histograms and counters served at /metrics (Prometheus text format)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Add a Server-Timing header with the stage durations of each request
+    METRICS_TIMING_HEADERS: bool = os.getenv("METRICS_TIMING_HEADERS", "false").lower() == "true"
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,198 @@
+"""
+Schema revisions for databases created before a model change.
+
+`Base.metadata.create_all` only creates missing tables, so columns and
+indexes added to existing tables are applied here. Every migration has a DDL
+step (idempotent, cheap, run at startup) and optionally a backfill that
+rewrites existing rows in keyset batches; backfills are resumable and run
+with `python -m app.scripts.migrate_schema`, next to a live server.
+Applied versions are recorded in the `schema_migrations` table.
+"""
+import datetime
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, text
+
+from app.models.biometric_data import BiometricData
+from app.models.exam_session import ExamSession
+from app.models.verification_event import VerificationEvent
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass
+class Migration:
+    version: str
+    description: str
+    ddl: Callable
+    # backfill(engine, batch_size, sleep) -> rows rewritten
+    backfill: Callable | None = None
+    # pending(conn) -> rows the backfill still has to rewrite
+    pending: Callable | None = None
+
+
+def _columns(conn, table: str) -> dict:
+    return {c["name"]: c for c in inspect(conn).get_columns(table)}
+
+
+def _add_missing_column(conn, column):
+    table = column.table.name
+    if column.name in _columns(conn, table):
+        return
+    # Native enum types (PostgreSQL) must exist before a column can use them
+    if hasattr(column.type, "create"):
+        column.type.create(conn, checkfirst=True)
+    ddl_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {ddl_type}"))
+    logger.info(f"Added column {table}.{column.name}")
+
+
+def _create_missing_indexes(conn, table):
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _template_kind(conn):
+    _add_missing_column(conn, BiometricData.__table__.c.kind)
+    _add_missing_column(conn, BiometricData.__table__.c.sample_count)
+
+
+def _query_indexes(conn):
+    for model in (BiometricData, VerificationEvent, ExamSession):
+        _create_missing_indexes(conn, model.__table__)
+
+
+# Timestamp columns that used to hold isoformat() strings
+_TIMESTAMP_COLUMNS = [
+    (VerificationEvent.__tablename__, "created_at"),
+    (BiometricData.__tablename__, "created_at"),
+    (ExamSession.__tablename__, "started_at"),
+    (ExamSession.__tablename__, "ended_at"),
+]
+
+
+def _datetime_columns(conn):
+    if conn.dialect.name == "sqlite":
+        # SQLite has no column types to change: its DateTime values are text,
+        # so only the stored format is normalised (see the backfill)
+        return
+    for table, column in _TIMESTAMP_COLUMNS:
+        if not isinstance(_columns(conn, table)[column]["type"], DateTime):
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE TIMESTAMP USING {column}::timestamp"
+            ))
+
+
+def _iso_rows(column: str) -> str:
+    # isoformat() wrote "YYYY-MM-DDTHH:MM:SS.ffffff"; DateTime stores "YYYY-MM-DD HH:MM:SS.ffffff"
+    return f"substr({column}, 11, 1) = 'T'"
+
+
+def _datetime_pending(conn) -> int:
+    if conn.dialect.name != "sqlite":
+        return 0
+    return sum(
+        conn.execute(text(f"SELECT count(*) FROM {table} WHERE {_iso_rows(column)}")).scalar()
+        for table, column in _TIMESTAMP_COLUMNS
+    )
+
+
+def _datetime_backfill(engine, batch_size: int, sleep: float) -> int:
+    """Rewrites ISO 'T' timestamps to the DateTime text format, one id range per transaction."""
+    if engine.dialect.name != "sqlite":
+        return 0
+    rewritten = 0
+    for table, column in _TIMESTAMP_COLUMNS:
+        with engine.connect() as conn:
+            max_id = conn.execute(text(f"SELECT max(id) FROM {table}")).scalar() or 0
+        low = 0
+        while low < max_id:
+            with engine.begin() as conn:
+                result = conn.execute(
+                    text(
+                        f"UPDATE {table} SET {column} = substr({column}, 1, 10) || ' ' || substr({column}, 12) "
+                        f"WHERE id > :low AND id <= :high AND {_iso_rows(column)}"
+                    ),
+                    {"low": low, "high": low + batch_size},
+                )
+                rewritten += result.rowcount
+            low += batch_size
+            if sleep:
+                time.sleep(sleep)
+        logger.info(f"Normalised {table}.{column}")
+    return rewritten
+
+
+def _multimodal_events(conn):
+    # SQLite stores enums as plain strings; PostgreSQL's native type needs the new label
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TYPE biometrictype ADD VALUE IF NOT EXISTS 'MULTIMODAL'"))
+
+
+def _face_tier(conn):
+    _add_missing_column(conn, VerificationEvent.__table__.c.face_tier)
+
+
+MIGRATIONS = [
+    Migration("0001", "biometric_data.kind and sample_count (multi-sample enrollment)", _template_kind),
+    Migration("0002", "indexes for session, event and template lookups", _query_indexes),
+    Migration("0003", "native DateTime timestamps", _datetime_columns, _datetime_backfill, _datetime_pending),
+    Migration("0004", "multimodal verification events", _multimodal_events),
+    Migration("0005", "verification_events.face_tier", _face_tier),
+]
+
+
+def applied_versions(conn) -> set[str]:
+    schema_migrations.create(conn, checkfirst=True)
+    return {row[0] for row in conn.execute(schema_migrations.select())}
+
+
+def upgrade(engine) -> list[str]:
+    """Applies the DDL of every migration not yet recorded; returns their versions."""
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+        applied = []
+        for migration in MIGRATIONS:
+            if migration.version in done:
+                continue
+            migration.ddl(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.version, applied_at=datetime.datetime.now()
+            ))
+            applied.append(migration.version)
+    if applied:
+        logger.info(f"Applied schema migrations {', '.join(applied)}")
+    return applied
+
+
+def backfill(engine, batch_size: int = 5000, sleep: float = 0.0) -> dict[str, int]:
+    """Runs every data backfill; safe to interrupt and rerun."""
+    return {
+        migration.version: migration.backfill(engine, batch_size, sleep)
+        for migration in MIGRATIONS if migration.backfill is not None
+    }
+
+
+def status(engine) -> list[dict]:
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+        return [
+            {
+                "version": m.version,
+                "description": m.description,
+                "applied": m.version in done,
+                "pending_rows": m.pending(conn) if m.pending is not None else 0,
+            }
+            for m in MIGRATIONS
+        ]
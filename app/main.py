@@ -1,19 +1,60 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from app.api.v1.endpoints import auth, enrollment, verification, exam
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+from app.api.v1.endpoints import auth, enrollment, verification, exam, system
 from app.core.config import settings
 from app.db.base import Base
-from app.db.session import engine
+from app.db import migrations
+from app.db.session import engine, async_engine
+from app.services.inference import inference, InferenceBusyError, InferenceUnavailableError
+from app.services.model_registry import face_models
+from app.services.face_embedding import face_batcher
+from app.services.face_detection import face_detector
+from app.services.event_writer import event_writer
+from app.services.vector_index import face_index
+from app.services.uploads import RequestSizeLimitMiddleware
+from app.services.metrics import metrics, MetricsMiddleware
+from app.services.template_cache import template_cache
+from app.services.embedding_cache import embedding_cache
 from fastapi.middleware.cors import CORSMiddleware
 
-# Create tables (for dev only - use Alembic in prod)
+# Create tables and apply schema migrations (dev only - run
+# `python -m app.scripts.migrate_schema` in prod)
 if settings.DEBUG:
     Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resolve the Haar cascade now rather than on the first face request
+    face_detector.load()
+    # Load and warm the face model in the background so /health answers while
+    # it loads; /api/v1/system/ready reports 503 until it is done.
+    warmup_task = None
+    if settings.FACE_MODEL_PRELOAD:
+        warmup_task = asyncio.create_task(asyncio.to_thread(face_models.load_and_warmup))
+    index_task = None
+    if settings.FACE_INDEX_ENABLED:
+        index_task = asyncio.create_task(asyncio.to_thread(face_index.load_or_build))
+    yield
+    for task in (warmup_task, index_task):
+        if task is not None and not task.done():
+            task.cancel()
+    if face_index.ready:
+        face_index.save()
+    # Drain queued verification events before the process exits
+    await event_writer.close()
+    await async_engine.dispose()
+    face_batcher.close()
+    inference.shutdown()
+    embedding_cache.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -23,14 +64,21 @@ origins = ["*"] if settings.DEBUG else [
     "http://127.0.0.1:8000"
 ]
 
+# Added first so CORS headers are still set on 413 responses
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=settings.UPLOAD_MAX_REQUEST_BYTES)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Outermost, so the request histogram covers every other middleware
+app.add_middleware(MetricsMiddleware, metrics=metrics, timing_headers=settings.METRICS_TIMING_HEADERS)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -38,6 +86,49 @@ app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["aut
 app.include_router(enrollment.router, prefix=f"{settings.API_V1_STR}/enroll", tags=["enrollment"])
 app.include_router(verification.router, prefix=f"{settings.API_V1_STR}/verify", tags=["verification"])
 app.include_router(exam.router, prefix=f"{settings.API_V1_STR}/exam", tags=["exam"])
+app.include_router(system.router, prefix=f"{settings.API_V1_STR}/system", tags=["system"])
+
+@app.exception_handler(InferenceUnavailableError)
+async def inference_unavailable_handler(request: Request, exc: InferenceUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(InferenceBusyError)
+async def inference_busy_handler(request: Request, exc: InferenceBusyError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # Gauges and counters kept by other components are sampled at scrape time
+    for name, pool in inference.stats().items():
+        metrics.set("inference_in_flight", pool["in_flight"], pool=name)
+        metrics.set("inference_queue_depth", pool["queue_depth"], pool=name)
+        metrics.set("inference_workers", pool["workers"], pool=name)
+        metrics.set("inference_rejected_total", pool["rejected"], pool=name)
+        metrics.set("inference_pool_restarts_total", pool["restarts"], pool=name)
+    writer = event_writer.stats()
+    metrics.set("event_writer_queue_depth", writer["queue_depth"])
+    metrics.set("event_writer_written_total", writer["written"])
+    cache = template_cache.stats()
+    metrics.set("template_cache_hits_total", cache["hits"])
+    metrics.set("template_cache_misses_total", cache["misses"])
+    embeddings = embedding_cache.stats()
+    metrics.set("embedding_cache_entries", embeddings["entries"], tier="memory")
+    metrics.set("embedding_cache_entries", embeddings["spilled"], tier="disk")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/")
 def read_root():
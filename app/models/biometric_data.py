@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, LargeBinary, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, LargeBinary, Enum, Index, DateTime
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 import enum
@@ -6,9 +6,19 @@ import enum
 class BiometricType(str, enum.Enum):
     FACE = "face"
     VOICE = "voice"
+    MULTIMODAL = "multimodal"  # fused face+voice verification events only, never a template
+
+class TemplateKind(str, enum.Enum):
+    SINGLE = "single"        # one sample, one row
+    AGGREGATE = "aggregate"  # mean/medoid of several samples
+    SAMPLE = "sample"        # individual sample kept next to an aggregate
 
 class BiometricData(Base):
     __tablename__ = "biometric_data"
+    # Verification reads the newest non-sample row of (user_id, modality)
+    __table_args__ = (
+        Index("ix_biometric_data_user_modality_id", "user_id", "modality", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -18,7 +28,9 @@ class BiometricData(Base):
     encrypted_descriptor = Column(LargeBinary, nullable=False)
     
     # Metadata for better traceability
-    created_at = Column(String, nullable=False) # Store ISO timestamp
+    created_at = Column(DateTime, nullable=False)
     device_info = Column(String, nullable=True)
+    kind = Column(Enum(TemplateKind), nullable=True, default=TemplateKind.SINGLE)
+    sample_count = Column(Integer, nullable=True, default=1)
 
     user = relationship("User", backref="biometrics")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, ForeignKey, Enum, DateTime
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 import enum
@@ -15,9 +15,9 @@ class ExamSession(Base):
     __tablename__ = "exam_sessions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    started_at = Column(String, nullable=False)
-    ended_at = Column(String, nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=True)
     duration_minutes = Column(Integer, nullable=True)
     status = Column(Enum(ExamStatus), nullable=False, default=ExamStatus.ACTIVE)
     schedule_type = Column(Enum(ScheduleType), nullable=False, default=ScheduleType.START_END)
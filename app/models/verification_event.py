@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Boolean, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Boolean, Float, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from app.models.biometric_data import BiometricType
@@ -11,6 +11,10 @@ class VerificationPhase(str, enum.Enum):
 
 class VerificationEvent(Base):
     __tablename__ = "verification_events"
+    # Session metrics/details read all events of one session in id order
+    __table_args__ = (
+        Index("ix_verification_events_session_id_id", "session_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("exam_sessions.id"), nullable=False)
@@ -22,7 +26,9 @@ class VerificationEvent(Base):
     threshold = Column(Float, nullable=False)
     metric = Column(String, nullable=False)
     mock_used = Column(Boolean, nullable=False)
-    created_at = Column(String, nullable=False)
+    # Face pipeline tier that produced the probe (see face_tiers); NULL for voice and mock probes
+    face_tier = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
 
     session = relationship("ExamSession", backref="verification_events")
     user = relationship("User", backref="verification_events")
@@ -0,0 +1,374 @@
+"""
+Bulk enrollment of a cohort from a directory or archive (.zip, .tar, .tar.gz)
+of face images / voice recordings and a manifest mapping user emails to files.
+
+Embeddings are computed in a process pool, and the encrypted templates are
+inserted in batched transactions. Every row is tagged with
+`device_info="bulk_import:<job>"`: running the same command again after a
+crash resumes the import, skipping (user, modality) pairs the job already
+stored. Several files for one user and modality are aggregated into one
+template, as `/enroll/*/multi` does. Usage:
+
+    python -m app.scripts.import_enrollments SOURCE --manifest cohort.csv [--workers 4] [--batch-size 200]
+        [--job NAME] [--aggregation mean|medoid] [--create-users] [--failures failures.csv]
+
+The manifest is a CSV with `email,modality,file` columns (an empty modality is
+detected from the file content) or a JSON object
+{"email": {"face": ["a.jpg", ...], "voice": ["a.wav", ...]}}. File paths are
+relative to SOURCE.
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import secrets
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.biometric_data import BiometricData, BiometricType, TemplateKind
+from app.models.user import User
+from app.services.inference import _warm_worker
+from app.services.scoring import aggregate
+from app.services.templates import encrypt_template, get_cipher_suite
+from app.services.uploads import looks_like_audio, looks_like_image
+
+_MAX_BYTES = {
+    BiometricType.FACE: settings.UPLOAD_MAX_IMAGE_BYTES,
+    BiometricType.VOICE: settings.UPLOAD_MAX_AUDIO_BYTES,
+}
+
+
+def _detect_modality(path: str) -> BiometricType | None:
+    with open(path, "rb") as f:
+        head = f.read(16)
+    if looks_like_image(head):
+        return BiometricType.FACE
+    if looks_like_audio(head):
+        return BiometricType.VOICE
+    return None
+
+
+def _modality(value: str) -> BiometricType | str | None:
+    # Unknown values are kept as given and reported per file by the importer
+    value = value.strip().lower()
+    if not value:
+        return None
+    try:
+        return BiometricType(value)
+    except ValueError:
+        return value
+
+
+def load_manifest(path: str, root: str) -> dict[tuple[str, BiometricType | str | None], list[str]]:
+    """
+    (email, modality) -> files, in manifest order. A None modality is detected
+    per file; files that cannot be sniffed stay under None, and unknown
+    modality names are kept as strings, so the importer reports both.
+    """
+    units = {}
+    if path.endswith(".json"):
+        with open(path) as f:
+            for email, by_modality in json.load(f).items():
+                for modality, files in by_modality.items():
+                    units.setdefault((email.strip().lower(), _modality(modality)), []).extend(files)
+    else:
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                key = (row["email"].strip().lower(), _modality(row.get("modality") or ""))
+                units.setdefault(key, []).append(row["file"].strip())
+    # Files without a modality are grouped once their content has been sniffed
+    for (email, modality), files in list(units.items()):
+        if modality is not None:
+            continue
+        del units[(email, None)]
+        for name in files:
+            try:
+                detected = _detect_modality(_resolve(root, name))
+            except (OSError, ValueError):
+                detected = None
+            units.setdefault((email, detected), []).append(name)
+    return units
+
+
+def _resolve(root: str, name: str) -> str:
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([path, root]) != root:
+        raise ValueError(f"{name} is outside the import directory")
+    return path
+
+
+def _embed_file(modality: str, path: str) -> tuple[list[float], str]:
+    # Runs in a pool worker; imports stay local so the parent does not load the models
+    from app.services.face_embedding import compute_tagged_embedding
+    from app.services.template_format import VOICE_MODEL
+    from app.services.voice_embedding import compute_embedding as compute_voice_embedding
+
+    with open(path, "rb") as f:
+        head = f.read(16)
+    if modality == BiometricType.FACE.value:
+        if not looks_like_image(head):
+            raise ValueError("not a supported image format")
+        with open(path, "rb") as f:
+            result = compute_tagged_embedding(f.read())
+        if result is None:
+            raise ValueError("image could not be decoded")
+        return result
+    if not looks_like_audio(head):
+        raise ValueError("not a supported audio format")
+    vector = compute_voice_embedding(path)
+    if vector is None:
+        raise ValueError("recording too short or undecodable")
+    return vector, VOICE_MODEL
+
+
+def _template(vectors_by_model: dict, aggregation: str):
+    # Keep the model that produced most samples; embeddings of different models are not comparable
+    model = max(vectors_by_model, key=lambda m: len(vectors_by_model[m]))
+    vectors = vectors_by_model[model]
+    vector = vectors[0] if len(vectors) == 1 else aggregate(vectors, aggregation)
+    return vector, model, len(vectors)
+
+
+class Importer:
+    def __init__(self, root: str, units: dict, job: str, workers: int, batch_size: int, aggregation: str,
+                 create_users: bool):
+        self.root = root
+        self.units = units
+        self.tag = f"bulk_import:{job}"
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.aggregation = aggregation
+        self.create_users = create_users
+        self.failures = []
+        self.report = {
+            "templates": 0, "skipped": 0, "failed_users": 0,
+            "files": 0, "files_failed": 0, "batches": 0, "seconds": 0.0,
+        }
+        self._batch = []
+
+    def _fail(self, email: str, modality, name: str, reason: str):
+        self.failures.append((email, getattr(modality, "value", modality) or "", name, reason))
+
+    def _resolve_users(self) -> dict[str, int]:
+        emails = sorted({email for email, modality in self.units if modality in _MAX_BYTES})
+        db = SessionLocal()
+        try:
+            users = {}
+            for offset in range(0, len(emails), 500):
+                chunk = emails[offset:offset + 500]
+                users.update(db.query(User.email, User.id).filter(User.email.in_(chunk)).all())
+            missing = [email for email in emails if email not in users]
+            if missing and self.create_users:
+                # Imported users have no usable password until one is set
+                from app.api.v1.endpoints.auth import get_password_hash
+
+                created = [User(email=email, hashed_password=get_password_hash(secrets.token_urlsafe(32)))
+                           for email in missing]
+                db.add_all(created)
+                db.commit()
+                users.update((user.email, user.id) for user in created)
+            return users
+        finally:
+            db.close()
+
+    def _already_imported(self) -> set:
+        db = SessionLocal()
+        try:
+            rows = db.query(BiometricData.user_id, BiometricData.modality).filter(
+                BiometricData.device_info == self.tag
+            ).distinct()
+            return set(rows.all())
+        finally:
+            db.close()
+
+    def _flush(self):
+        if not self._batch:
+            return
+        db = SessionLocal()
+        try:
+            db.add_all(self._batch)
+            db.commit()
+        finally:
+            db.close()
+        self.report["templates"] += len(self._batch)
+        self.report["batches"] += 1
+        self._batch = []
+
+    def _finish_unit(self, user_id: int, modality: BiometricType, email: str, results: dict):
+        if not results:
+            self.report["failed_users"] += 1
+            self._fail(email, modality, "", "no usable sample")
+            return
+        vector, model, count = _template(results, self.aggregation)
+        self._batch.append(BiometricData(
+            user_id=user_id,
+            modality=modality,
+            encrypted_descriptor=encrypt_template(vector, modality, model),
+            created_at=datetime.datetime.now(),
+            device_info=self.tag,
+            kind=TemplateKind.AGGREGATE if count > 1 else TemplateKind.SINGLE,
+            sample_count=count,
+        ))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+            self._progress()
+
+    def _progress(self):
+        elapsed = time.perf_counter() - self._started
+        rate = self.report["files"] / elapsed if elapsed else 0.0
+        print(f"... {self.report['templates']} templates stored, {self.report['files']} files "
+              f"({self.report['files_failed']} failed), {rate:.1f} files/s")
+
+    def _check_file(self, modality: BiometricType | None, name: str) -> str:
+        path = _resolve(self.root, name)
+        if not os.path.isfile(path):
+            raise ValueError("file not found")
+        if modality is not None and os.path.getsize(path) > _MAX_BYTES[modality]:
+            raise ValueError("file too large")
+        return path
+
+    def _fail_files(self, email: str, modality, names: list[str], reason: str | None = None):
+        """Reports every file of a unit; without `reason`, the file's own problem is used."""
+        for name in names:
+            why = reason
+            if why is None:
+                try:
+                    self._check_file(None, name)
+                    why = "unrecognised file content"
+                except ValueError as e:
+                    why = str(e)
+            self._fail(email, modality, name, why)
+        self.report["files"] += len(names)
+        self.report["files_failed"] += len(names)
+
+    def _jobs(self, users: dict, done: set):
+        """Yields (unit key, user_id, file path) and marks units with nothing to embed."""
+        for (email, modality), names in self.units.items():
+            user_id = users.get(email)
+            if modality is None:
+                self._fail_files(email, None, names)
+                continue
+            if modality not in _MAX_BYTES:
+                self._fail_files(email, modality, names,
+                                 f"unknown modality {getattr(modality, 'value', modality)!r}")
+                continue
+            if user_id is None:
+                self.report["failed_users"] += 1
+                self._fail(email, modality, "", "unknown user (use --create-users)")
+                continue
+            if (user_id, modality) in done:
+                self.report["skipped"] += 1
+                continue
+            paths = []
+            for name in names:
+                try:
+                    path = self._check_file(modality, name)
+                except ValueError as e:
+                    self._fail_files(email, modality, [name], str(e))
+                    continue
+                paths.append((name, path))
+            yield (email, modality), user_id, paths
+
+    def run(self) -> dict:
+        self._started = time.perf_counter()
+        get_cipher_suite()  # fail on a bad ENCRYPTION_KEY before any embedding work
+        users = self._resolve_users()
+        done = self._already_imported()
+        ctx = multiprocessing.get_context(settings.INFERENCE_PROCESS_START_METHOD)
+        # Bounded submission window: memory stays flat for any cohort size
+        window = self.workers * 4
+        pending = {}
+        state = {}
+        with ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_warm_worker) as pool:
+            def drain(block: bool):
+                finished, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key, name = pending.pop(future)
+                    user_id, results, remaining = state[key]
+                    self.report["files"] += 1
+                    try:
+                        vector, model = future.result()
+                        results.setdefault(model, []).append(vector)
+                    except Exception as e:
+                        self.report["files_failed"] += 1
+                        self._fail(key[0], key[1], name, str(e) or type(e).__name__)
+                    remaining -= 1
+                    state[key] = (user_id, results, remaining)
+                    if remaining == 0:
+                        del state[key]
+                        self._finish_unit(user_id, key[1], key[0], results)
+
+            for key, user_id, paths in self._jobs(users, done):
+                if not paths:
+                    self._finish_unit(user_id, key[1], key[0], {})
+                    continue
+                state[key] = (user_id, {}, len(paths))
+                for name, path in paths:
+                    while len(pending) >= window:
+                        drain(block=True)
+                    pending[pool.submit(_embed_file, key[1].value, path)] = (key, name)
+            while pending:
+                drain(block=True)
+        self._flush()
+        self.report["seconds"] = round(time.perf_counter() - self._started, 2)
+        elapsed = self.report["seconds"] or 1e-9
+        self.report["files_per_second"] = round(self.report["files"] / elapsed, 2)
+        self.report["templates_per_second"] = round(self.report["templates"] / elapsed, 2)
+        return self.report
+
+
+def _default_job(manifest: str) -> str:
+    with open(manifest, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:8]
+    return f"{os.path.splitext(os.path.basename(manifest))[0]}-{digest}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="directory or .zip/.tar/.tar.gz archive")
+    parser.add_argument("--manifest", required=True, help="CSV (email,modality,file) or JSON manifest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=200, help="templates per transaction")
+    parser.add_argument("--job", help="resume key (default: manifest name and content hash)")
+    parser.add_argument("--aggregation", choices=["mean", "medoid"], default="mean")
+    parser.add_argument("--create-users", action="store_true", help="create users missing from the database")
+    parser.add_argument("--failures", help="write per-file failures to this CSV")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if os.path.isdir(args.source):
+            root = os.path.realpath(args.source)
+        else:
+            # zipfile sanitises member paths itself; tar members go through the "data" filter
+            options = {} if zipfile.is_zipfile(args.source) else {"filter": "data"}
+            shutil.unpack_archive(args.source, tmp, **options)
+            root = os.path.realpath(tmp)
+        units = load_manifest(args.manifest, root)
+        importer = Importer(root, units, args.job or _default_job(args.manifest), args.workers,
+                            args.batch_size, args.aggregation, args.create_users)
+        print(f"Importing {sum(len(f) for f in units.values())} files for {len(units)} user/modality pairs "
+              f"as {importer.tag}")
+        report = importer.run()
+
+    for email, modality, name, reason in importer.failures[:20]:
+        print(f"failed: {email} {modality} {name}: {reason}")
+    if len(importer.failures) > 20:
+        print(f"... and {len(importer.failures) - 20} more failures")
+    if args.failures:
+        with open(args.failures, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["email", "modality", "file", "reason"])
+            writer.writerows(importer.failures)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
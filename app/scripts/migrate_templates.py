@@ -0,0 +1,78 @@
+"""
+Rewrites legacy JSON-in-Fernet templates into the binary template format.
+
+Works in id order with one transaction per batch, so it can run next to a
+live server and be interrupted and restarted at any time (already migrated
+rows are skipped). Usage:
+
+    python -m app.scripts.migrate_templates [--batch-size 500] [--dtype float32] [--sleep 0.1] [--dry-run]
+"""
+import argparse
+import time
+
+from app.db.session import SessionLocal
+from app.models.biometric_data import BiometricData
+from app.models.user import User  # noqa: F401  (resolves the BiometricData.user relationship)
+from app.services.template_format import encode_template
+from app.services.templates import decrypt_template, get_cipher_suite
+
+
+def migrate(batch_size: int, dtype: str, sleep: float, dry_run: bool) -> dict:
+    cipher = get_cipher_suite()
+    report = {"scanned": 0, "migrated": 0, "skipped": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+    started = time.perf_counter()
+    while True:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(BiometricData)
+                .filter(BiometricData.id > last_id)
+                .order_by(BiometricData.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                last_id = row.id
+                report["scanned"] += 1
+                try:
+                    template = decrypt_template(row.encrypted_descriptor, row.modality)
+                except Exception as e:
+                    report["failed"] += 1
+                    print(f"row {row.id}: cannot decode ({e})")
+                    continue
+                if template.version > 0:
+                    report["skipped"] += 1
+                    continue
+                blob = cipher.encrypt(encode_template(template.vector, row.modality, template.model, dtype))
+                report["bytes_before"] += len(row.encrypted_descriptor)
+                report["bytes_after"] += len(blob)
+                report["migrated"] += 1
+                if not dry_run:
+                    row.encrypted_descriptor = blob
+            if not dry_run:
+                db.commit()
+        finally:
+            db.close()
+        print(f"... {report['scanned']} rows scanned, {report['migrated']} migrated (last id {last_id})")
+        if sleep:
+            time.sleep(sleep)
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--sleep", type=float, default=0.0, help="pause between batches (seconds)")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    report = migrate(args.batch_size, args.dtype, args.sleep, args.dry_run)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Runs the face model sidecar: loads the face model once (FACE_MODEL_BACKEND)
+and serves forward passes to the API workers over a Unix socket (see
+app/services/model_sidecar.py). gunicorn.conf.py starts it when
+FACE_MODEL_SIDECAR_SOCKET is set; it can also run on its own, under a
+process supervisor. Usage:
+
+    python -m app.scripts.model_sidecar [--socket /run/biometric/face-model.sock]
+"""
+import argparse
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services.model_sidecar import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=settings.FACE_MODEL_SIDECAR_SOCKET,
+                        help="Unix socket path (default: FACE_MODEL_SIDECAR_SOCKET)")
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("no socket path: pass --socket or set FACE_MODEL_SIDECAR_SOCKET")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MODALITIES = ("face", "voice")
+
+
+def content_digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def content_hasher():
+    """Incremental form of content_digest, for uploads read in chunks."""
+    return hashlib.blake2b(digest_size=16)
+
+
+class _SpillFile:
+    """Fixed-width float32 rows in a memory-mapped scratch file; slots are reused through a free list."""
+
+    def __init__(self, path: str, rows: int, dim: int):
+        self.path = path
+        self.rows = np.memmap(path, dtype=np.float32, mode="w+", shape=(rows, dim))
+        self.free = list(range(rows - 1, -1, -1))
+
+    def close(self):
+        del self.rows
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of probe embeddings: (modality, pipeline, digest of
+    the uploaded bytes) -> (vector, model). `pipeline` names the model and the
+    settings that shape its output, so a model or mode change never serves
+    stale vectors. A bounded LRU of float32 arrays is kept in memory; with a
+    spill directory, entries evicted from it move to memory-mapped scratch
+    files (one per vector width, created sparse) that the OS pages in and out.
+    Entries expire after the TTL and are zeroed when they leave either tier.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, spill_dir: str = "", spill_entries: int = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.spill_dir = spill_dir
+        self.spill_entries = spill_entries if spill_dir else 0
+        self._entries = OrderedDict()
+        self._spilled = OrderedDict()
+        self._spill_files = {}
+        self._lock = threading.Lock()
+        self.hits = {modality: 0 for modality in MODALITIES}
+        self.spill_hits = {modality: 0 for modality in MODALITIES}
+        self.misses = {modality: 0 for modality in MODALITIES}
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def _spill_file(self, dim: int) -> _SpillFile:
+        spill = self._spill_files.get(dim)
+        if spill is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"embedding-cache-{os.getpid()}-{dim}.f32")
+            spill = self._spill_files[dim] = _SpillFile(path, self.spill_entries, dim)
+        return spill
+
+    def _release(self, key):
+        dim, slot, _, _ = self._spilled.pop(key)
+        spill = self._spill_files[dim]
+        spill.rows[slot] = 0
+        spill.free.append(slot)
+
+    def _spill(self, key, vector: np.ndarray, model: str, expires_at: float):
+        if self.spill_entries <= 0:
+            return
+        while len(self._spilled) >= self.spill_entries:
+            self._release(next(iter(self._spilled)))
+        try:
+            spill = self._spill_file(len(vector))
+        except OSError as e:
+            logger.warning(f"Embedding cache spill disabled: {e}")
+            self.spill_entries = 0
+            return
+        slot = spill.free.pop()
+        spill.rows[slot] = vector
+        self._spilled[key] = (len(vector), slot, model, expires_at)
+
+    def _evict_oldest(self):
+        key, (vector, model, expires_at) = self._entries.popitem(last=False)
+        if expires_at > time.monotonic():
+            self._spill(key, vector, model, expires_at)
+        vector.fill(0)
+        self.evictions += 1
+
+    def get(self, modality: str, pipeline: str, digest: bytes) -> tuple[list[float], str] | None:
+        if not self.enabled:
+            return None
+        key = (modality, pipeline, digest)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                self._entries.pop(key)[0].fill(0)
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits[modality] += 1
+                tier = "memory"
+                vector, model = entry[0].tolist(), entry[1]
+            else:
+                spilled = self._spilled.get(key)
+                if spilled is None or spilled[3] <= now:
+                    if spilled is not None:
+                        self._release(key)
+                        self.expirations += 1
+                    self.misses[modality] += 1
+                    metrics.inc("embedding_cache_misses_total", modality=modality)
+                    return None
+                dim, slot, model, expires_at = spilled
+                array = np.array(self._spill_files[dim].rows[slot])
+                self._release(key)
+                self._store(key, array, model, expires_at)
+                self.spill_hits[modality] += 1
+                tier = "disk"
+                vector = array.tolist()
+        metrics.inc("embedding_cache_hits_total", modality=modality, tier=tier)
+        return vector, model
+
+    def _store(self, key, vector: np.ndarray, model: str, expires_at: float):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            old[0].fill(0)
+        self._entries[key] = (vector, model, expires_at)
+        while len(self._entries) > self.max_entries:
+            self._evict_oldest()
+
+    def put(self, modality: str, pipeline: str, digest: bytes, vector, model: str):
+        if not self.enabled:
+            return
+        key = (modality, pipeline, digest)
+        array = np.array(vector, dtype=np.float32)
+        with self._lock:
+            if key in self._spilled:
+                self._release(key)
+            self._store(key, array, model, time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            for vector, _, _ in self._entries.values():
+                vector.fill(0)
+            self._entries.clear()
+            for key in list(self._spilled):
+                self._release(key)
+
+    def close(self):
+        """Clears both tiers and removes the spill files."""
+        self.clear()
+        with self._lock:
+            for spill in self._spill_files.values():
+                spill.close()
+            self._spill_files.clear()
+
+    def stats(self) -> dict:
+        per_modality = {}
+        for modality in MODALITIES:
+            hits = self.hits[modality] + self.spill_hits[modality]
+            lookups = hits + self.misses[modality]
+            per_modality[modality] = {
+                "hits": self.hits[modality],
+                "spill_hits": self.spill_hits[modality],
+                "misses": self.misses[modality],
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+            }
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "spilled": len(self._spilled),
+            "spill_entries": self.spill_entries,
+            "spill_files": len(self._spill_files),
+            "ttl_seconds": self.ttl,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            **per_modality,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    settings.EMBEDDING_CACHE_TTL_SECONDS,
+    settings.EMBEDDING_CACHE_SPILL_DIR,
+    settings.EMBEDDING_CACHE_SPILL_ENTRIES,
+)
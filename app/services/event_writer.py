@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.models.verification_event import VerificationEvent
+from app.services.session_events import session_events
+from app.services.session_metrics import session_metrics
+
+logger = logging.getLogger(__name__)
+
+SYNC = "sync"
+ASYNC = "async"
+_STOP = object()
+
+
+class EventWriter:
+    """
+    Batches VerificationEvent inserts from concurrent requests into one
+    transaction per `max_batch_size` events or `flush_ms` milliseconds, written
+    from a background task, so requests no longer take turns on SQLite's
+    write lock.
+
+    With "sync" durability `submit()` returns once the batch holding the
+    event is committed; with "async" it returns as soon as the event is
+    queued (events still queued when the process is killed are lost, a clean
+    shutdown drains the queue).
+    """
+
+    def __init__(self, max_batch_size: int, flush_ms: float, max_queue: int, durability: str):
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self.max_queue = max(1, max_queue)
+        self.durability = durability
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.flush_total = 0.0
+        self.flush_max = 0.0
+        self.last_flush_ms = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(self.max_queue)
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, wait: bool | None = None, **values):
+        """Queues one event (VerificationEvent column values); waits for the commit in sync mode."""
+        await self.submit_many([values], wait)
+
+    async def submit_many(self, rows: list[dict], wait: bool | None = None):
+        """Queues several events that are always written in the same transaction."""
+        self._ensure_started()
+        wait = self.durability == SYNC if wait is None else wait
+        future = asyncio.get_running_loop().create_future() if wait else None
+        # A full queue applies backpressure to the request instead of growing without bound
+        await self._queue.put((rows, future))
+        if future is not None:
+            await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            items = [item]
+            size = len(item[0])
+            deadline = loop.time() + self.flush_interval
+            while size < self.max_batch_size:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                items.append(item)
+                size += len(item[0])
+            await self._flush(items)
+
+    async def _flush(self, items):
+        started = time.perf_counter()
+        rows = [values for group, _ in items for values in group]
+        try:
+            events = await self._write(rows)
+        except Exception as e:
+            self.failed += len(rows)
+            logger.error(f"Failed to write {len(rows)} verification events: {e}")
+            for _, future in items:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - started
+        try:
+            session_metrics.record(events)
+            session_events.publish(events)
+        except Exception as e:
+            logger.error(f"Failed to publish {len(events)} verification events: {e}")
+        self.written += len(rows)
+        self.batches += 1
+        self.max_batch_seen = max(self.max_batch_seen, len(rows))
+        self.flush_total += elapsed
+        self.flush_max = max(self.flush_max, elapsed)
+        self.last_flush_ms = round(elapsed * 1000, 3)
+        for _, future in items:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    @staticmethod
+    async def _write(rows: list[dict]) -> list[VerificationEvent]:
+        from app.db.session import AsyncSessionLocal
+
+        events = [VerificationEvent(**row) for row in rows]
+        async with AsyncSessionLocal() as db:
+            db.add_all(events)
+            await db.commit()
+        return events
+
+    async def close(self):
+        """Writes whatever is still queued, then stops the background task."""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "durability": self.durability,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "flush_avg_ms": round(self.flush_total / self.batches * 1000, 3) if self.batches else None,
+            "flush_max_ms": round(self.flush_max * 1000, 3) if self.batches else None,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+event_writer = EventWriter(
+    settings.EVENT_WRITER_BATCH_SIZE,
+    settings.EVENT_WRITER_FLUSH_MS,
+    settings.EVENT_WRITER_MAX_QUEUE,
+    settings.EVENT_WRITER_DURABILITY,
+)
@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CASCADE_FILE = "haarcascade_frontalface_default.xml"
+
+
+def resolve_cascade_path() -> str | None:
+    """FACE_CASCADE_PATH, else the copy shipped with the app, else OpenCV's own."""
+    candidates = [
+        settings.FACE_CASCADE_PATH,
+        os.path.join(os.path.dirname(__file__), CASCADE_FILE),
+        os.path.join(getattr(getattr(cv2, "data", None), "haarcascades", ""), CASCADE_FILE),
+    ]
+    for path in candidates:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+class FaceDetector:
+    """
+    Haar cascade face detector. The cascade file is resolved and parsed once
+    per process (`load()` runs at startup and in every worker); each thread
+    then gets its own CascadeClassifier and ORB instance, since OpenCV
+    detectors are not safe to share across threads. Frames larger than
+    `max_side` are downscaled for detection and the box is mapped back.
+    """
+
+    def __init__(self, max_side: int):
+        self.max_side = max_side
+        self.path = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def load(self) -> bool:
+        with self._lock:
+            if not self._loaded:
+                self.path = resolve_cascade_path()
+                if self.path is None:
+                    logger.warning("No Haar cascade found; face detection is disabled (whole frame is used)")
+                self._loaded = True
+        return self.path is not None
+
+    def _cascade(self):
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            self.load()
+            cascade = cv2.CascadeClassifier(self.path) if self.path else None
+            if cascade is not None and cascade.empty():
+                logger.warning(f"Could not parse Haar cascade {self.path}")
+                cascade = None
+            self._local.cascade = cascade or False
+        return cascade or None
+
+    def orb(self):
+        orb = getattr(self._local, "orb", None)
+        if orb is None:
+            orb = cv2.ORB_create(nfeatures=1024, scaleFactor=1.2, nlevels=8)
+            self._local.orb = orb
+        return orb
+
+    def detect(self, image_bgr, min_size: int = 0) -> tuple[int, int, int, int] | None:
+        """
+        Largest face as (x, y, w, h) in the coordinates of `image_bgr` (BGR or
+        already grayscale). `min_size` (pixels of `image_bgr`) skips the
+        cascade's smaller scales when the face is known to fill the frame.
+        """
+        cascade = self._cascade()
+        if cascade is None:
+            return None
+        gray = image_bgr if image_bgr.ndim == 2 else cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape
+        scale = 1.0
+        if self.max_side > 0 and max(h, w) > self.max_side:
+            scale = self.max_side / max(h, w)
+            gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+        side = round(min_size * scale)
+        faces = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(side, side))
+        if len(faces) == 0:
+            return None
+        x, y, bw, bh = max(faces, key=lambda b: b[2] * b[3])
+        if scale == 1.0:
+            return int(x), int(y), int(bw), int(bh)
+        x0, y0 = int(x / scale), int(y / scale)
+        x1, y1 = min(w, int(np.ceil((x + bw) / scale))), min(h, int(np.ceil((y + bh) / scale)))
+        return x0, y0, x1 - x0, y1 - y0
+
+    def crop(self, image_bgr):
+        """Largest face crop, or the whole frame when no face is found."""
+        box = self.detect(image_bgr)
+        if box is None:
+            return image_bgr
+        x, y, w, h = box
+        return image_bgr[y:y + h, x:x + w]
+
+
+class StageTimings:
+    """Wall time per pipeline stage of one request, in seconds."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+class StageStats:
+    """Per-process aggregate of StageTimings (count, average and max per stage)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, stages: dict[str, float]):
+        metrics.record_stages(stages, prefix="face_")
+        with self._lock:
+            for name, seconds in stages.items():
+                count, total, peak = self._stats.get(name, (0, 0.0, 0.0))
+                self._stats[name] = (count + 1, total + seconds, max(peak, seconds))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {"count": count, "avg_ms": round(total / count * 1000, 3), "max_ms": round(peak * 1000, 3)}
+                for name, (count, total, peak) in self._stats.items()
+            }
+
+
+face_detector = FaceDetector(settings.FACE_DETECT_MAX_SIDE)
+face_stage_stats = StageStats()
@@ -1,96 +1,319 @@
+import asyncio
 import cv2
 import numpy as np
-import os
+import time
 import logging
+from typing import NamedTuple
+from app.core.config import settings
+from app.services.inference import inference, InferenceBusyError, MODEL_POOL, CPU_POOL
+from app.services.model_registry import face_models, preprocess_face
+from app.services.face_detection import face_detector, face_stage_stats, StageTimings
+from app.services.metrics import metrics
+from app.services.template_format import ORB_MODEL
+from app.services.embedding_cache import embedding_cache, content_digest
+from app.services.face_tiers import face_tiers, FaceTier
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-HAS_DEEPFACE = False
-try:
-    from deepface import DeepFace
-    HAS_DEEPFACE = True
-except ImportError:
-    pass
+class FaceEmbedding(NamedTuple):
+    vector: list[float]
+    model: str
+    tier: str
+
+def _decode_image(image_bytes: bytes, max_side: int = 0):
+    img_array = np.frombuffer(image_bytes, np.uint8)
+    img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    if img is not None and max_side > 0 and max(img.shape[:2]) > max_side:
+        scale = max_side / max(img.shape[:2])
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return img
 
 def _detect_face(image_bgr):
-    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
-    cascade_url = "https://raw.githubusercontent.com/opencv/opencv/master/data/haarcascades/haarcascade_frontalface_default.xml"
-    cascade_path = os.path.join(os.path.dirname(__file__), "haarcascade_frontalface_default.xml")
-    if not os.path.exists(cascade_path):
-        try:
-            import requests
-            r = requests.get(cascade_url, timeout=10)
-            if r.ok:
-                with open(cascade_path, "wb") as f:
-                    f.write(r.content)
-        except Exception:
-            pass
-    face_cascade = cv2.CascadeClassifier(cascade_path) if os.path.exists(cascade_path) else cv2.CascadeClassifier()
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
-    if len(faces) == 0:
-        return image_bgr
-    x, y, w, h = max(faces, key=lambda b: b[2] * b[3])
-    return image_bgr[y:y+h, x:x+w]
+    return face_detector.crop(image_bgr)
 
-def compute_embedding(image_bytes: bytes) -> list[float]:
+def _crop(img, tier: FaceTier):
+    if tier.detector == "center":
+        h, w = img.shape[:2]
+        side = min(h, w)
+        y, x = (h - side) // 2, (w - side) // 2
+        return img[y:y + side, x:x + side]
+    return face_detector.crop(img)
+
+def _orb_embedding(img, timings: StageTimings | None = None, tier: FaceTier | None = None) -> list[float]:
+    timings = timings or StageTimings()
+    with timings.stage("detect"):
+        face = _crop(img, tier or face_tiers.default)
+    with timings.stage("orb"):
+        face_gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        face_gray = cv2.resize(face_gray, (224, 224), interpolation=cv2.INTER_AREA)
+        keypoints, descriptors = face_detector.orb().detectAndCompute(face_gray, None)
+        vec = np.zeros((512,), dtype=np.float32)
+        if descriptors is not None and descriptors.size > 0:
+            flat = descriptors.flatten().astype(np.float32)
+            if flat.size >= 512:
+                vec[:] = flat[:512]
+            else:
+                vec[:flat.size] = flat
+        else:
+            vec[:] = face_gray.flatten().astype(np.float32)[:512]
+
+        norm = np.linalg.norm(vec)
+        if norm > 1e-6:
+            vec = vec / norm
+    return vec.tolist()
+
+def compute_tagged_embedding(image_bytes: bytes, tier: FaceTier | None = None) -> tuple[list[float], str] | None:
     """
-    Computes a face embedding.
+    Computes a face embedding and the name of the model that produced it,
+    with the given pipeline tier (default: the first configured one).
     Priority:
-    1. DeepFace (VGG-Face) - High Accuracy
+    1. Face model (VGG-Face via DeepFace or ONNX Runtime) - High Accuracy
     2. OpenCV ORB - Low Accuracy (Fallback)
     """
-    # Decode image
-    img_array = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    tier = tier or face_tiers.default
+    timings = StageTimings()
+    try:
+        with timings.stage("decode"):
+            img = _decode_image(image_bytes, tier.max_side)
+        if img is None:
+            return None
+
+        # Try the process-resident face model (loaded once, see model_registry)
+        if tier.model == "model" and face_models.available():
+            try:
+                with timings.stage("detect"):
+                    face = _crop(img, tier)
+                with timings.stage("preprocess"):
+                    batch = preprocess_face(face, face_models.input_size)[np.newaxis]
+                with timings.stage("embed"):
+                    return face_models.embed(batch)[0].tolist(), face_models.model_name
+            except InferenceBusyError:
+                raise
+            except Exception as e:
+                metrics.inc("model_errors_total", modality="face")
+                logger.warning(f"Face model failed: {e}")
+
+        # Fallback: ORB (Legacy/POC method)
+        if tier.model == "model":
+            metrics.inc("face_orb_fallback_total")
+        return _orb_embedding(img, timings, tier), ORB_MODEL
+    finally:
+        face_stage_stats.record(timings.stages)
+
+def compute_embedding(image_bytes: bytes) -> list[float]:
+    result = compute_tagged_embedding(image_bytes)
+    return result[0] if result is not None else None
+
+def _orb_embedding_timed(image_bytes: bytes, tier: FaceTier | None = None) -> tuple[list[float] | None, dict]:
+    # Runs on the CPU pool (another process): timings are returned, not recorded
+    tier = tier or face_tiers.default
+    timings = StageTimings()
+    with timings.stage("decode"):
+        img = _decode_image(image_bytes, tier.max_side)
     if img is None:
-        return None
+        return None, timings.stages
+    return _orb_embedding(img, timings, tier), timings.stages
 
-    # Try DeepFace
-    if HAS_DEEPFACE:
+def compute_orb_embedding(image_bytes: bytes) -> list[float] | None:
+    return _orb_embedding_timed(image_bytes)[0]
+
+def _prepare_face_input_timed(
+    image_bytes: bytes, input_size: tuple[int, int], tier: FaceTier | None = None
+) -> tuple[np.ndarray | None, dict]:
+    tier = tier or face_tiers.default
+    timings = StageTimings()
+    with timings.stage("decode"):
+        img = _decode_image(image_bytes, tier.max_side)
+    if img is None:
+        return None, timings.stages
+    with timings.stage("detect"):
+        face = _crop(img, tier)
+    with timings.stage("preprocess"):
+        face_input = preprocess_face(face, input_size)
+    return face_input, timings.stages
+
+def prepare_face_input(image_bytes: bytes, input_size: tuple[int, int]) -> np.ndarray | None:
+    """Decode, crop and preprocess one image into a model input (no forward pass)."""
+    return _prepare_face_input_timed(image_bytes, input_size)[0]
+
+
+class FaceBatcher:
+    """
+    Collects preprocessed crops from concurrent requests for up to
+    `max_wait_ms` (or until `max_batch_size` is reached) and runs them through
+    the face model as one batch on the model pool. While every model worker is
+    busy new crops keep accumulating, so batches grow with load.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        workers = inference.pools[MODEL_POOL].workers
+        self.max_pending = self.max_batch_size * (workers + settings.INFERENCE_MAX_QUEUE)
+        self._workers = workers
+        self._slots = None
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self._workers)
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._collect())
+
+    async def embed(self, face_input: np.ndarray) -> np.ndarray:
+        self._ensure_started()
+        if self._queue.qsize() >= self.max_pending:
+            raise InferenceBusyError("face-batcher", inference.pools[MODEL_POOL].retry_after())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((face_input, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch_size:
+                if not self._queue.empty():
+                    items.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            loop.create_task(self._dispatch(items))
+
+    async def _dispatch(self, items):
         try:
-            # DeepFace expects path or numpy array (BGR is fine for opencv backend, but DeepFace usually prefers RGB)
-            # DeepFace.represent returns a list of dicts
-            # enforce_detection=False allows it to process the image even if it can't find a clear face (it uses the whole img)
-            # but for security we might want enforce_detection=True. 
-            # However, _detect_face above is a Haar cascade which is fast. 
-            # Let's let DeepFace handle detection if possible, or skip it.
-            
-            # Convert BGR to RGB for DeepFace
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            embeddings = DeepFace.represent(
-                img_path=img_rgb,
-                model_name="VGG-Face",
-                enforce_detection=False,
-                detector_backend="opencv"
-            )
-            
-            if embeddings and len(embeddings) > 0:
-                # Return the first face's embedding
-                return embeddings[0]["embedding"]
+            batch = np.stack([face_input for face_input, _ in items])
+            vectors = await inference.run(MODEL_POOL, face_models.embed, batch)
         except Exception as e:
-            logger.warning(f"DeepFace failed: {e}")
-            pass
-
-    # Fallback: ORB (Legacy/POC method)
-    face = _detect_face(img)
-    face_gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-    face_gray = cv2.resize(face_gray, (224, 224), interpolation=cv2.INTER_AREA)
-    orb = cv2.ORB_create(nfeatures=1024, scaleFactor=1.2, nlevels=8)
-    keypoints, descriptors = orb.detectAndCompute(face_gray, None)
-    vec = np.zeros((512,), dtype=np.float32)
-    if descriptors is not None and descriptors.size > 0:
-        flat = descriptors.flatten().astype(np.float32)
-        if flat.size >= 512:
-            vec[:] = flat[:512]
-        else:
-            vec[:flat.size] = flat
-    else:
-        vec[:] = face_gray.flatten().astype(np.float32)[:512]
-    
-    norm = np.linalg.norm(vec)
-    if norm > 1e-6:
-        vec = vec / norm
-    return vec.tolist()
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        self.batches += 1
+        self.items += len(items)
+        self.max_seen = max(self.max_seen, len(items))
+        for (_, future), vector in zip(items, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_seen": self.max_seen,
+        }
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+face_batcher = FaceBatcher(settings.FACE_BATCH_MAX_SIZE, settings.FACE_BATCH_MAX_WAIT_MS)
+
+def _face_pipeline(tier: FaceTier) -> tuple[str, str] | None:
+    """(cache namespace, model expected from it) for `tier` with the model serving now; None while loading."""
+    if tier.model == "orb" or face_models.state == "unavailable":
+        return f"{ORB_MODEL}:{tier.key}", ORB_MODEL
+    if face_models.state == "ready":
+        return f"{face_models.model_name}:{face_models.backend}:{tier.key}", face_models.model_name
+    return None
+
+# Face requests being embedded in this process. CPU_POOL also runs voice and
+# liveness tasks, so its own queue depth says little about the face pipeline.
+_face_in_flight = 0
+
+def _queue_depth(tier: FaceTier) -> int:
+    """Face requests waiting for a worker of the pool that `tier` starts on."""
+    batched = tier.model == "model" and face_batcher.max_batch_size > 1 and face_models.state == "ready"
+    pool = CPU_POOL if batched or tier.model == "orb" else MODEL_POOL
+    return max(0, _face_in_flight - inference.pools[pool].workers)
+
+async def embed_face(image_bytes: bytes, tier_name: str | None = None, degrade: bool = True) -> FaceEmbedding | None:
+    """
+    Async entry point used by the endpoints; returns (embedding, model name,
+    tier name). The request starts at tier `tier_name` (default: the first)
+    and, unless `degrade` is off, may be moved to a cheaper one (see
+    FaceTierSelector); only those requests feed the tier latencies, so bulk
+    enrollment does not push verification off the first tier. Identical
+    uploads are answered from the embedding cache.
+    """
+    global _face_in_flight
+    tier = face_tiers.get(tier_name)
+    tier = face_tiers.select(tier.name, _queue_depth(tier), degrade)
+    pipeline = _face_pipeline(tier) if embedding_cache.enabled else None
+    if pipeline is not None:
+        namespace, expected_model = pipeline
+        digest = content_digest(image_bytes)
+        cached = embedding_cache.get("face", namespace, digest)
+        if cached is not None:
+            return FaceEmbedding(*cached, tier.name)
+    started = time.perf_counter()
+    _face_in_flight += 1
+    try:
+        result = await _embed_face(image_bytes, tier)
+    finally:
+        _face_in_flight -= 1
+    if degrade:
+        face_tiers.record(tier, time.perf_counter() - started)
+    if result is None:
+        return None
+    # ORB fallbacks after a model error are not cached, so the next attempt retries the model
+    if pipeline is not None and result[1] == expected_model:
+        embedding_cache.put("face", namespace, digest, *result)
+    return FaceEmbedding(*result, tier.name)
+
+async def _embed_face(image_bytes: bytes, tier: FaceTier) -> tuple[list[float], str] | None:
+    """
+    Once the face model is loaded,
+    decoding/cropping runs on the CPU pool and the forward pass goes through
+    the micro-batcher; otherwise the whole pipeline runs on the model pool.
+    """
+    if tier.model == "orb":
+        vector, stages = await inference.run(CPU_POOL, _orb_embedding_timed, image_bytes, tier)
+        face_stage_stats.record(stages)
+        return (vector, ORB_MODEL) if vector is not None else None
+    if face_batcher.max_batch_size <= 1 or face_models.state != "ready":
+        return await inference.run(MODEL_POOL, compute_tagged_embedding, image_bytes, tier)
+    face_input, stages = await inference.run(
+        CPU_POOL, _prepare_face_input_timed, image_bytes, face_models.input_size, tier
+    )
+    if face_input is None:
+        face_stage_stats.record(stages)
+        return None
+    try:
+        started = time.perf_counter()
+        vector = await face_batcher.embed(face_input)
+        face_stage_stats.record({**stages, "embed": time.perf_counter() - started})
+        return vector.tolist(), face_models.model_name
+    except InferenceBusyError:
+        raise
+    except Exception as e:
+        metrics.inc("model_errors_total", modality="face")
+        logger.warning(f"Face model failed: {e}")
+    metrics.inc("face_orb_fallback_total")
+    vector, orb_stages = await inference.run(CPU_POOL, _orb_embedding_timed, image_bytes, tier)
+    face_stage_stats.record(orb_stages)
+    return (vector, ORB_MODEL) if vector is not None else None
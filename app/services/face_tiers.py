@@ -0,0 +1,182 @@
+import threading
+import time
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.services.metrics import metrics
+
+# "haar": Haar cascade (see face_detection); "center": central square of the frame, no detection
+DETECTORS = ("haar", "center")
+# "model": the loaded face model (ORB while it is unavailable); "orb": ORB descriptors only
+MODELS = ("model", "orb")
+
+
+@dataclass(frozen=True)
+class FaceTier:
+    """
+    One face pipeline configuration. Frames are downscaled to `max_side`
+    (long side, 0 = as decoded) before detection and embedding. `budget_ms`
+    is the latency the tier should stay under, queue wait included (0 = none).
+    """
+    name: str
+    detector: str
+    max_side: int
+    model: str
+    budget_ms: float
+
+    @property
+    def key(self) -> str:
+        """Everything that changes the embedding of a given image (embedding cache namespace)."""
+        return f"{self.detector}:{self.max_side}:{self.model}"
+
+
+def parse_tiers(spec: str) -> list[FaceTier]:
+    """Parses `name:detector:max_side:model:budget_ms` entries, comma separated, most accurate first."""
+    tiers = []
+    for entry in (part.strip() for part in spec.split(",")):
+        if not entry:
+            continue
+        fields = entry.split(":")
+        if len(fields) != 5:
+            raise ValueError(f"Invalid face tier '{entry}': expected name:detector:max_side:model:budget_ms")
+        name, detector, max_side, model, budget_ms = fields
+        if detector not in DETECTORS:
+            raise ValueError(f"Unknown face detector '{detector}' in tier '{name}'")
+        if model not in MODELS:
+            raise ValueError(f"Unknown face model '{model}' in tier '{name}'")
+        tiers.append(FaceTier(name, detector, int(max_side), model, float(budget_ms)))
+    if not tiers:
+        raise ValueError("At least one face pipeline tier is required")
+    if len({tier.name for tier in tiers}) != len(tiers):
+        raise ValueError("Face pipeline tier names must be unique")
+    return tiers
+
+
+class FaceTierSelector:
+    """
+    Chooses the tier of each face request. A request starts at the first tier
+    (or the one it asks for) and moves to cheaper, later tiers:
+    - one tier per `queue_step` face tasks queued;
+    - past every tier whose recent latency (EWMA) is over its budget.
+    Requests only move to tiers with the first tier's detector and model:
+    templates are enrolled with the first tier, and a different crop or model
+    gives embeddings that do not match them. Other tiers serve only requests
+    that name them.
+    Only requests that may degrade are timed (`record`), and the first one of
+    each tier is not counted: it pays one-off costs (pool worker start,
+    per-thread detector set-up).
+    A tier skipped for its budget gets one request again after
+    `retry_seconds`; that request's latency replaces the average, so the tier
+    comes back as soon as it is fast enough. The last tier a request can
+    reach is never skipped.
+    """
+
+    def __init__(self, tiers: list[FaceTier], queue_step: int, retry_seconds: float, alpha: float = 0.2):
+        self.tiers = tiers
+        self.queue_step = queue_step
+        self.retry_seconds = retry_seconds
+        self.alpha = alpha
+        self._index = {tier.name: i for i, tier in enumerate(tiers)}
+        self._paths = [[i] + [j for j in range(i + 1, len(tiers)) if self._template_compatible(tiers[j])]
+                       for i in range(len(tiers))]
+        self._lock = threading.Lock()
+        self._latency_ms = [None] * len(tiers)
+        self._retry_at = [0.0] * len(tiers)
+        self._probing = [False] * len(tiers)
+        self._samples = [0] * len(tiers)
+        self.selected = [0] * len(tiers)
+        self.degraded = {"queue": 0, "budget": 0}
+
+    @property
+    def default(self) -> FaceTier:
+        return self.tiers[0]
+
+    def _template_compatible(self, tier: FaceTier) -> bool:
+        return tier.detector == self.default.detector and tier.model == self.default.model
+
+    def get(self, name: str | None) -> FaceTier:
+        if name is None:
+            return self.default
+        if name not in self._index:
+            raise ValueError(f"Unknown face tier '{name}'; configured: {', '.join(self._index)}")
+        return self.tiers[self._index[name]]
+
+    def _skip(self, i: int, now: float) -> bool:
+        latency, budget = self._latency_ms[i], self.tiers[i].budget_ms
+        if budget <= 0 or latency is None or latency <= budget:
+            return False
+        if now < self._retry_at[i]:
+            return True
+        # This request retries the tier; the others keep skipping it until it reports back
+        self._retry_at[i] = now + self.retry_seconds
+        self._probing[i] = True
+        return False
+
+    def select(self, name: str | None = None, queue_depth: int = 0, degrade: bool = True) -> FaceTier:
+        path = self._paths[self._index[self.get(name).name]]
+        step = 0
+        reason = None
+        if degrade:
+            last = len(path) - 1
+            if self.queue_step > 0 and queue_depth >= self.queue_step:
+                step = min(last, queue_depth // self.queue_step)
+                reason = "queue" if step > 0 else None
+            now = time.monotonic()
+            with self._lock:
+                while step < last and self._skip(path[step], now):
+                    step += 1
+                    reason = "budget"
+        i = path[step]
+        with self._lock:
+            self.selected[i] += 1
+            if reason is not None:
+                self.degraded[reason] += 1
+        if reason is not None:
+            metrics.inc("face_tier_degraded_total", reason=reason)
+        metrics.inc("face_tier_total", tier=self.tiers[i].name)
+        return self.tiers[i]
+
+    def record(self, tier: FaceTier, seconds: float):
+        """Folds in the latency of one request served by `tier`."""
+        i = self._index.get(tier.name)
+        if i is None:
+            return
+        ms = seconds * 1000
+        now = time.monotonic()
+        with self._lock:
+            self._samples[i] += 1
+            if self._samples[i] == 1:
+                return
+            latency = self._latency_ms[i]
+            if latency is None or self._probing[i]:
+                latency = ms
+                self._probing[i] = False
+            else:
+                latency += self.alpha * (ms - latency)
+            self._latency_ms[i] = latency
+            if tier.budget_ms > 0 and latency > tier.budget_ms:
+                self._retry_at[i] = now + self.retry_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tiers": [
+                    {
+                        "name": tier.name,
+                        "detector": tier.detector,
+                        "max_side": tier.max_side,
+                        "model": tier.model,
+                        "budget_ms": tier.budget_ms,
+                        "latency_ms": round(latency, 2) if latency is not None else None,
+                        "selected": selected,
+                    }
+                    for tier, latency, selected in zip(self.tiers, self._latency_ms, self.selected)
+                ],
+                "queue_step": self.queue_step,
+                "degraded": dict(self.degraded),
+            }
+
+
+face_tiers = FaceTierSelector(
+    parse_tiers(settings.FACE_PIPELINE_TIERS), settings.FACE_TIER_QUEUE_STEP, settings.FACE_TIER_RETRY_SECONDS
+)
@@ -0,0 +1,199 @@
+import asyncio
+import contextvars
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import settings
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pool names used by the endpoints:
+# - "model": bounded thread pool for the face model (TensorFlow releases the GIL
+#   and keeps a single copy of the weights per process)
+# - "cpu":   process pool for librosa / OpenCV work that holds the GIL
+MODEL_POOL = "model"
+CPU_POOL = "cpu"
+
+
+class InferenceBusyError(Exception):
+    """Raised when an inference pool has no room left in its queue."""
+
+    def __init__(self, pool: str, retry_after: int, message: str | None = None):
+        super().__init__(message or f"Inference pool '{pool}' is at capacity, retry later")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class InferenceUnavailableError(InferenceBusyError):
+    """
+    Raised when a process pool broke (a worker died) and broke again after
+    being replaced. A subclass of InferenceBusyError, so every caller that
+    lets busy errors through instead of falling back does the same here.
+    """
+
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(pool, retry_after, f"Inference pool '{pool}' is unavailable, retry later")
+
+
+def _timed_call(fn, args):
+    # Runs inside the worker; the start timestamp lets the caller split the
+    # total latency into queue wait and execution time.
+    started = time.monotonic()
+    return started, fn(*args)
+
+
+def _warm_worker():
+    # Import the heavy audio stack and parse the face cascade once per worker
+    # process instead of on the first request that lands on it.
+    import app.services.voice_embedding  # noqa: F401
+    from app.services.face_detection import face_detector
+
+    face_detector.load()
+
+
+class InferencePool:
+    def __init__(self, name: str, kind: str, workers: int, max_queue: int):
+        self.name = name
+        self.kind = kind if workers > 0 else "thread"
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latency_ewma = 0.0
+        self._wait_total = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                ctx = multiprocessing.get_context(settings.INFERENCE_PROCESS_START_METHOD)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=ctx, initializer=_warm_worker
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=f"inference-{self.name}"
+                )
+        return self._executor
+
+    def _replace(self, executor):
+        # Every pending task of a broken executor fails with it; the first one to notice starts a new one
+        if self._executor is not executor:
+            return
+        self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.restarts += 1
+        logger.warning(f"Inference pool '{self.name}' lost a worker process; starting a new pool")
+
+    async def _submit(self, loop, call):
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, *call)
+        except BrokenProcessPool:
+            self._replace(executor)
+        # The task may be what killed the worker, so it gets one more try, not more
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, *call)
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise InferenceUnavailableError(self.name, self.retry_after())
+
+    def retry_after(self) -> int:
+        # Rough time for the current backlog to drain, never less than a second.
+        per_task = self._latency_ewma or 1.0
+        return max(1, math.ceil(per_task * (self.queue_depth + 1) / self.workers))
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise InferenceBusyError(self.name, self.retry_after())
+        self.in_flight += 1
+        submitted = time.monotonic()
+        loop = asyncio.get_running_loop()
+        call = (_timed_call, fn, args)
+        if self.kind == "thread":
+            # Stage timings recorded in the worker thread land in the caller's request trace
+            call = (contextvars.copy_context().run, *call)
+        try:
+            started, result = await self._submit(loop, call)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        finished = time.monotonic()
+        latency = finished - submitted
+        self.completed += 1
+        self._latency_total += latency
+        self._latency_max = max(self._latency_max, latency)
+        self._latency_ewma = latency if self.completed == 1 else 0.8 * self._latency_ewma + 0.2 * latency
+        self._wait_total += max(0.0, started - submitted)
+        metrics.observe("inference_wait_seconds", max(0.0, started - submitted), pool=self.name)
+        metrics.observe("inference_run_seconds", latency, pool=self.name)
+        return result
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "avg_latency_ms": round(self._latency_total / done * 1000, 3),
+            "max_latency_ms": round(self._latency_max * 1000, 3),
+            "avg_wait_ms": round(self._wait_total / done * 1000, 3),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class InferenceExecutor:
+    def __init__(self):
+        self.pools = {
+            MODEL_POOL: InferencePool(
+                MODEL_POOL, "thread", settings.INFERENCE_THREAD_WORKERS, settings.INFERENCE_MAX_QUEUE
+            ),
+            CPU_POOL: InferencePool(
+                CPU_POOL, "process", settings.INFERENCE_PROCESS_WORKERS, settings.INFERENCE_MAX_QUEUE
+            ),
+        }
+
+    async def run(self, pool: str, fn, *args):
+        return await self.pools[pool].run(fn, *args)
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+
+
+inference = InferenceExecutor()
@@ -0,0 +1,243 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from app.core.config import settings
+
+PREFIX = "biometric_"
+# Seconds: from template cache hits and scoring (sub-millisecond) up to cold model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stage durations of the current request, when timing headers are on (see MetricsMiddleware)
+_trace: contextvars.ContextVar[dict | None] = contextvars.ContextVar("metrics_trace", default=None)
+
+_DESCRIPTIONS = {
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route template"),
+    "stage_duration_seconds": ("histogram", "Wall time of one verification pipeline stage"),
+    "inference_wait_seconds": ("histogram", "Time a task waited for an inference pool worker"),
+    "inference_run_seconds": ("histogram", "Inference pool task latency, queue wait included"),
+    "mock_used_total": ("counter", "Probes answered with a mock descriptor"),
+    "face_orb_fallback_total": ("counter", "Face embeddings computed with the ORB fallback"),
+    "face_tier_total": ("counter", "Face probes by the pipeline tier that served them"),
+    "face_tier_degraded_total": ("counter", "Face probes moved to a cheaper tier, by reason (queue or budget)"),
+    "model_errors_total": ("counter", "Embedding model failures"),
+    "decrypt_failures_total": ("counter", "Templates that could not be decrypted or decoded"),
+    "inference_in_flight": ("gauge", "Tasks running or queued on an inference pool"),
+    "inference_queue_depth": ("gauge", "Tasks queued on an inference pool"),
+    "inference_workers": ("gauge", "Workers of an inference pool"),
+    "inference_rejected_total": ("counter", "Tasks rejected with 429 because a pool was full"),
+    "inference_pool_restarts_total": ("counter", "Process pools replaced after losing a worker"),
+    "event_writer_queue_depth": ("gauge", "Verification events waiting to be written"),
+    "event_writer_written_total": ("counter", "Verification events written"),
+    "template_cache_hits_total": ("counter", "Template cache hits"),
+    "template_cache_misses_total": ("counter", "Template cache misses"),
+    "embedding_cache_hits_total": ("counter", "Probe embeddings answered from the embedding cache"),
+    "embedding_cache_misses_total": ("counter", "Probe embeddings computed after an embedding cache miss"),
+    "embedding_cache_entries": ("gauge", "Embeddings held by the embedding cache"),
+}
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record_stage(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """
+    Process-local histograms, counters and gauges rendered in the Prometheus
+    text format. Everything is a no-op when disabled; stage timers then cost
+    one attribute check unless the request asked for timing headers.
+    Series are keyed by name and label values, so label values must come
+    from small fixed sets (stage names, pools, route templates).
+    """
+
+    def __init__(self, enabled: bool, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._values = {}
+
+    def observe(self, name: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            histogram.counts[index] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        """Sets a gauge, or a counter maintained elsewhere (read at scrape time)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[(name, _labels(labels))] = value
+
+    def stage(self, name: str):
+        """Context manager timing one pipeline stage into `stage_duration_seconds` and the request trace."""
+        if self.enabled or _trace.get() is not None:
+            return _Stage(self, name)
+        return _NOOP_STAGE
+
+    def record_stage(self, name: str, seconds: float):
+        self.observe("stage_duration_seconds", seconds, stage=name)
+        trace = _trace.get()
+        if trace is not None:
+            trace[name] = trace.get(name, 0.0) + seconds
+
+    def record_stages(self, stages: dict[str, float], prefix: str = ""):
+        for name, seconds in stages.items():
+            self.record_stage(prefix + name, seconds)
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            values = dict(self._values)
+        series = {}
+        for name, labels in [*histograms, *values]:
+            series.setdefault(name, []).append(labels)
+        lines = []
+        for name in sorted(series):
+            kind, text = _DESCRIPTIONS.get(name, ("untyped", name))
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for labels in sorted(series[name]):
+                if (name, labels) in histograms:
+                    counts, total, count = histograms[(name, labels)]
+                    cumulative = 0
+                    for bound, bucket in zip(self.buckets, counts):
+                        cumulative += bucket
+                        lines.append(f"{full}_bucket{_format_labels(labels, (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{full}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+                    lines.append(f"{full}_sum{_format_labels(labels)} {repr(total)}")
+                    lines.append(f"{full}_count{_format_labels(labels)} {count}")
+                else:
+                    lines.append(f"{full}{_format_labels(labels)} {_format_value(values[(name, labels)])}")
+        return "\n".join(lines) + "\n"
+
+
+def server_timing(stages: dict[str, float], total: float) -> bytes:
+    """`Server-Timing` header value (durations in milliseconds)."""
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries).encode()
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the matched route, e.g. /api/v1/exam/session/{session_id}/events.
+    Requests that matched no API route (static files, 404s) share one label.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Newer FastAPI releases resolve included routers lazily and leave the
+    # un-prefixed route in scope["route"]; the full path is on the route context
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    return getattr(context, "path", None) or route.path
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request into `http_request_duration_seconds` (labelled by
+    route template, not raw path) and, with `timing_headers`, collects the
+    stages timed while handling it into a `Server-Timing` response header.
+    """
+
+    def __init__(self, app, metrics: Metrics, timing_headers: bool):
+        self.app = app
+        self.metrics = metrics
+        self.timing_headers = timing_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (self.metrics.enabled or self.timing_headers):
+            return await self.app(scope, receive, send)
+        trace = {} if self.timing_headers else None
+        token = _trace.set(trace)
+        started = time.perf_counter()
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    header = (b"server-timing", server_timing(trace, time.perf_counter() - started))
+                    message = {**message, "headers": [*message.get("headers", []), header]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _trace.reset(token)
+            self.metrics.observe(
+                "http_request_duration_seconds", time.perf_counter() - started,
+                method=scope["method"], route=route_template(scope), status=str(status),
+            )
+
+
+metrics = Metrics(settings.METRICS_ENABLED)
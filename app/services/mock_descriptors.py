@@ -0,0 +1,25 @@
+import random
+import re
+import zlib
+
+
+def mock_face_descriptor(filename: str | None, image_data: bytes) -> list[float]:
+    """
+    Deterministic stand-in when no face embedding can be computed: seeded by
+    the filename prefix before "_" (so "alice_1.jpg" and "alice_2.jpg" match),
+    else by the payload's CRC32.
+    """
+    filename = filename.lower() if filename else ""
+    match = re.match(r"([a-zA-Z0-9]+)_", filename)
+    if match:
+        seed_key = match.group(1)
+    else:
+        seed_key = str(zlib.crc32(image_data))
+    random.seed(seed_key)
+    return [random.uniform(-1.0, 1.0) for _ in range(128)]
+
+
+def mock_voice_descriptor(crc32: int) -> list[float]:
+    """Deterministic stand-in when no voice embedding can be computed, seeded by the payload's CRC32."""
+    random.seed(str(crc32))
+    return [random.uniform(-1.0, 1.0) for _ in range(128)]
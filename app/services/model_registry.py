@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Embeddings come from the service's own pipeline (Haar crop, preprocess_face,
+# one forward pass). DeepFace.represent detected and aligned faces its own way,
+# so its vectors for the same model are not comparable with these; the tag
+# keeps templates of the two pipelines apart.
+PIPELINE_TAG = "haar"
+
+
+def pipeline_model_name(model: str) -> str:
+    """Name recorded for embeddings of `model` computed by this service's pipeline."""
+    return f"{model}/{PIPELINE_TAG}"
+
+
+def preprocess_face(face_bgr, target_size: tuple[int, int]) -> np.ndarray:
+    """
+    Prepares a face crop the way DeepFace does before a forward pass:
+    RGB, aspect-preserving resize with zero padding, scaled to [0, 1].
+    """
+    target_h, target_w = target_size
+    face = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2RGB)
+    h, w = face.shape[:2]
+    factor = min(target_h / h, target_w / w)
+    new_size = (max(1, int(w * factor)), max(1, int(h * factor)))
+    face = cv2.resize(face, new_size, interpolation=cv2.INTER_AREA)
+    pad_h = target_h - face.shape[0]
+    pad_w = target_w - face.shape[1]
+    face = np.pad(
+        face,
+        ((pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)),
+        mode="constant",
+    )
+    if face.shape[:2] != (target_h, target_w):
+        face = cv2.resize(face, (target_w, target_h))
+    return face.astype(np.float32) / 255.0
+
+
+class FaceModelRegistry:
+    """
+    Process-resident face model. Loaded once (at startup when preloading is
+    enabled) and shared by every inference thread. With `sidecar_socket` set
+    the weights stay in the model sidecar (see model_sidecar) and forward
+    passes are sent to it.
+    """
+
+    def __init__(self, sidecar_socket: str = ""):
+        self.sidecar_socket = sidecar_socket
+        self.model_name = pipeline_model_name(settings.FACE_MODEL_NAME)
+        self.backend = None
+        self.input_size = (224, 224)
+        self.state = "cold"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._model = None
+        self._input_name = None
+        self._channels_first = False
+        self._lock = threading.Lock()
+
+    def _load_onnx(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if settings.ONNX_INTRA_OP_THREADS > 0:
+            options.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS
+        if settings.ONNX_INTER_OP_THREADS > 0:
+            options.inter_op_num_threads = settings.ONNX_INTER_OP_THREADS
+        session = ort.InferenceSession(
+            settings.FACE_ONNX_MODEL_PATH, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        model_input = session.get_inputs()[0]
+        shape = model_input.shape
+        # Keras exports are NHWC; accept NCHW graphs as well
+        if len(shape) == 4 and shape[1] == 3:
+            self._channels_first = True
+            dims = shape[2:4]
+        else:
+            dims = shape[1:3]
+        if all(isinstance(d, int) for d in dims):
+            self.input_size = (dims[0], dims[1])
+        self._input_name = model_input.name
+        return session
+
+    def _load_deepface(self):
+        from deepface import DeepFace
+
+        model = DeepFace.build_model(model_name=settings.FACE_MODEL_NAME)
+        shape = getattr(model, "input_shape", None)
+        if shape:
+            self.input_size = tuple(shape)
+        return model
+
+    def _load_sidecar(self):
+        from app.services.model_sidecar import SidecarClient
+
+        client = SidecarClient(self.sidecar_socket, settings.FACE_MODEL_SIDECAR_TIMEOUT_SECONDS)
+        info = client.wait_ready(settings.FACE_MODEL_SIDECAR_WAIT_SECONDS)
+        if info.get("state") != "ready":
+            logger.warning(f"Face model sidecar at {self.sidecar_socket} has no model ({info.get('state')})")
+            return None
+        self.model_name = info["model"]
+        self.input_size = tuple(info["input_size"])
+        return client
+
+    def load(self) -> bool:
+        with self._lock:
+            if self.state in ("ready", "unavailable"):
+                return self._model is not None
+            self.state = "loading"
+            started = time.perf_counter()
+            backend = "sidecar" if self.sidecar_socket else settings.FACE_MODEL_BACKEND
+            try:
+                if backend == "sidecar":
+                    self._model = self._load_sidecar()
+                elif backend == "onnx":
+                    self._model = self._load_onnx()
+                elif backend == "deepface":
+                    self._model = self._load_deepface()
+                else:
+                    self._model = None
+            except ImportError as e:
+                logger.warning(f"Face model backend '{backend}' not installed: {e}")
+                self._model = None
+            except Exception as e:
+                logger.error(f"Failed to load face model: {e}")
+                self.error = str(e)
+                self._model = None
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            if self._model is None:
+                # Serve with the ORB fallback rather than retrying on every call
+                self.state = "unavailable"
+                return False
+            # Through the sidecar, embeddings (and cache namespaces) are those of its backend
+            self.backend = self._model.backend if backend == "sidecar" else backend
+            self.state = "ready"
+            logger.info(f"Loaded face model {self.model_name} ({backend}) in {self.load_seconds}s")
+            return True
+
+    def available(self) -> bool:
+        if self.state not in ("ready", "unavailable"):
+            self.load()
+        return self._model is not None
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        """Embeds a (N, H, W, 3) float32 batch; returns L2-normalised (N, D) vectors."""
+        if not self.available():
+            raise RuntimeError("Face model is not loaded")
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if self.sidecar_socket:
+            return self._model.embed(batch)
+        if self.backend == "onnx":
+            if self._channels_first:
+                batch = batch.transpose(0, 3, 1, 2)
+            out = self._model.run(None, {self._input_name: batch})[0]
+        else:
+            out = self._model.forward(batch)
+        out = np.asarray(out, dtype=np.float32).reshape(batch.shape[0], -1)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-8)
+
+    def warmup(self):
+        if not self.available():
+            return
+        started = time.perf_counter()
+        h, w = self.input_size
+        self.embed(np.zeros((1, h, w, 3), dtype=np.float32))
+        self.warmup_seconds = round(time.perf_counter() - started, 3)
+
+    def load_and_warmup(self):
+        self.load()
+        self.warmup()
+
+    def sidecar_reachable(self) -> bool | None:
+        """Whether the sidecar answers a status request now; None without a loaded sidecar."""
+        if not self.sidecar_socket or self._model is None:
+            return None
+        from app.services.model_sidecar import SidecarError
+
+        try:
+            self._model.info()
+        except (OSError, SidecarError) as e:
+            logger.warning(f"Face model sidecar at {self.sidecar_socket} unreachable: {e}")
+            return False
+        return True
+
+    @property
+    def ready(self) -> bool:
+        # Ready once loading finished, even if the service runs on the ORB fallback
+        return self.state in ("ready", "unavailable")
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "model": self.model_name,
+            "backend": self.backend,
+            "sidecar": self.sidecar_socket or None,
+            "input_size": list(self.input_size),
+            "fallback": self.state == "unavailable",
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+face_models = FaceModelRegistry(settings.FACE_MODEL_SIDECAR_SOCKET)
@@ -0,0 +1,254 @@
+"""
+Face model sidecar: one process holds the face model and runs forward passes
+for every API worker on the host, so `gunicorn -w N` keeps one copy of the
+weights instead of N.
+
+Workers connect over a Unix socket (FACE_MODEL_SIDECAR_SOCKET). Each message
+is a fixed little-endian header followed by raw float32 data, with no
+serialisation step on the hot path:
+
+    request   magic "FS", version, op, n (u32), h, w, c (u16)   + n*h*w*c float32 (op EMBED)
+    response  magic "FS", version, status, a (u32), b (u32)      + payload
+
+An EMBED response carries n = a vectors of b float32 values. INFO returns the
+model status as JSON (a = payload length). BUSY means the sidecar queue is
+full (a = Retry-After seconds). ERROR carries a UTF-8 message (a = length).
+Crops from all connections go through the sidecar's FaceBatcher, so
+concurrent workers share forward passes.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from app.services.inference import InferenceBusyError
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FS"
+VERSION = 1
+REQUEST = struct.Struct("<2sBBIHHH")
+RESPONSE = struct.Struct("<2sBBII")
+OP_INFO, OP_EMBED = 1, 2
+STATUS_OK, STATUS_ERROR, STATUS_BUSY = 0, 1, 2
+MAX_BATCH = 1024
+
+# Open connections (handler task -> writer), closed on shutdown so the handlers end on EOF
+_connections = {}
+
+
+class SidecarError(RuntimeError):
+    """The sidecar answered with an error, or the connection broke."""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        chunk = sock.recv_into(view[received:])
+        if chunk == 0:
+            raise ConnectionError("Face model sidecar closed the connection")
+        received += chunk
+    return bytes(buf)
+
+
+class SidecarClient:
+    """
+    Blocking client used from the model pool threads. Each thread keeps its
+    own connection; a broken connection is reopened once per call (both
+    operations are safe to repeat), a timed-out one is not.
+    """
+
+    def __init__(self, path: str, timeout: float):
+        self.path = path
+        self.timeout = timeout
+        self.backend = None
+        self._local = threading.local()
+
+    def _socket(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _exchange(self, op: int, header: bytes, body) -> tuple[int, int, int, bytes]:
+        sock = self._socket()
+        sock.sendall(header)
+        if op == OP_EMBED:
+            sock.sendall(body)
+        magic, version, status, a, b = RESPONSE.unpack(_recv_exact(sock, RESPONSE.size))
+        if magic != MAGIC or version != VERSION:
+            self._drop()
+            raise SidecarError(f"Unexpected face model sidecar protocol {magic!r} v{version}")
+        if status == STATUS_BUSY:
+            size = 0
+        elif status == STATUS_OK and op == OP_EMBED:
+            size = a * b * 4
+        else:
+            size = a
+        return status, a, b, _recv_exact(sock, size) if size else b""
+
+    def _call(self, op: int, shape: tuple[int, int, int, int], body=b"") -> tuple[int, int, int, bytes]:
+        header = REQUEST.pack(MAGIC, VERSION, op, *shape)
+        try:
+            return self._exchange(op, header, body)
+        except TimeoutError:
+            self._drop()
+            raise
+        except OSError:
+            # The sidecar restarted or dropped the connection: reconnect once
+            self._drop()
+            try:
+                return self._exchange(op, header, body)
+            except OSError:
+                self._drop()
+                raise
+
+    def info(self) -> dict:
+        status, _, _, payload = self._call(OP_INFO, (0, 0, 0, 0))
+        if status != STATUS_OK:
+            raise SidecarError(payload.decode(errors="replace"))
+        info = json.loads(payload)
+        self.backend = info.get("backend")
+        return info
+
+    def wait_ready(self, timeout: float) -> dict:
+        """Model status once the sidecar accepts connections (it binds only after loading the model)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.info()
+            except OSError as e:
+                if time.monotonic() >= deadline:
+                    raise SidecarError(f"Face model sidecar at {self.path} not reachable: {e}")
+                time.sleep(0.5)
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        status, a, b, payload = self._call(OP_EMBED, batch.shape, batch.data)
+        if status == STATUS_BUSY:
+            raise InferenceBusyError("face-sidecar", a)
+        if status != STATUS_OK:
+            raise SidecarError(payload.decode(errors="replace"))
+        return np.frombuffer(payload, dtype=np.float32).reshape(a, b)
+
+
+def _response(status: int, a: int = 0, b: int = 0) -> bytes:
+    return RESPONSE.pack(MAGIC, VERSION, status, a, b)
+
+
+def _error(message: str) -> bytes:
+    body = message.encode()
+    return _response(STATUS_ERROR, len(body)) + body
+
+
+async def _embed(batch: np.ndarray) -> np.ndarray:
+    from app.services.face_embedding import face_batcher
+    from app.services.inference import inference, MODEL_POOL
+    from app.services.model_registry import face_models
+
+    if face_batcher.max_batch_size <= 1:
+        return await inference.run(MODEL_POOL, face_models.embed, batch)
+    return np.stack(await asyncio.gather(*(face_batcher.embed(item) for item in batch)))
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    from app.services.model_registry import face_models
+
+    task = asyncio.current_task()
+    _connections[task] = writer
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(REQUEST.size)
+            except asyncio.IncompleteReadError:
+                break
+            magic, version, op, n, h, w, c = REQUEST.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                writer.write(_error(f"Unsupported protocol {magic!r} v{version}"))
+                break
+            if op == OP_INFO:
+                body = json.dumps(face_models.status()).encode()
+                writer.write(_response(STATUS_OK, len(body)) + body)
+            elif op == OP_EMBED:
+                if n > MAX_BATCH or (h, w) != tuple(face_models.input_size) or c != 3:
+                    writer.write(_error(f"Expected at most {MAX_BATCH} crops of {face_models.input_size}x3"))
+                    break
+                batch = np.frombuffer(await reader.readexactly(n * h * w * c * 4), dtype=np.float32)
+                try:
+                    vectors = await _embed(batch.reshape(n, h, w, c))
+                except InferenceBusyError as e:
+                    writer.write(_response(STATUS_BUSY, e.retry_after))
+                except Exception as e:
+                    logger.warning(f"Face model sidecar: forward pass failed: {e}")
+                    writer.write(_error(str(e)))
+                else:
+                    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+                    writer.write(_response(STATUS_OK, *vectors.shape))
+                    writer.write(vectors.data)
+            else:
+                writer.write(_error(f"Unknown operation {op}"))
+                break
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+        _connections.pop(task, None)
+
+
+async def serve(path: str):
+    """Loads and warms the face model, then serves it on `path` until SIGTERM/SIGINT."""
+    from app.services.face_embedding import face_batcher
+    from app.services.inference import inference
+    from app.services.model_registry import face_models
+
+    # This process owns the model, whatever the environment says about sidecars
+    face_models.sidecar_socket = ""
+    await asyncio.to_thread(face_models.load_and_warmup)
+    if os.path.exists(path):
+        os.unlink(path)  # left behind by a previous run
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    server = await asyncio.start_unix_server(_handle, path=path)
+    os.chmod(path, 0o660)
+    logger.info(f"Face model sidecar serving {face_models.model_name} ({face_models.state}) on {path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+    for writer in list(_connections.values()):
+        writer.close()
+    if _connections:
+        await asyncio.wait(list(_connections), timeout=5)
+    face_batcher.close()
+    inference.shutdown()
+    if os.path.exists(path):
+        os.unlink(path)
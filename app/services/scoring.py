@@ -0,0 +1,135 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.biometric_data import BiometricType
+from app.services.template_format import MOCK_MODEL, Template
+
+EUCLIDEAN = "euclidean"
+COSINE = "cosine"
+
+
+class Comparison(NamedTuple):
+    score: float
+    match: bool
+    metric: str
+    threshold: float
+
+
+def policy_for(modality: BiometricType, model: str) -> tuple[str, float]:
+    """
+    Metric and threshold for templates of `model`. The 128-d mock face
+    descriptors are compared like dlib descriptors (Euclidean distance); real
+    face embeddings (VGG-Face, ORB, ...) and all voice vectors use cosine
+    similarity.
+    """
+    if modality == BiometricType.VOICE:
+        return COSINE, settings.VOICE_COSINE_THRESHOLD
+    if model == MOCK_MODEL:
+        return EUCLIDEAN, settings.FACE_EUCLIDEAN_THRESHOLD
+    return COSINE, settings.FACE_COSINE_THRESHOLD
+
+
+def normalize(vectors) -> np.ndarray:
+    """L2-normalises a vector or each row of a matrix, as float32."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-8)
+
+
+def cosine_scores(probe, templates, normalized: bool = False) -> np.ndarray:
+    """Cosine similarity of one probe against every row of `templates` in one matrix op."""
+    templates = np.atleast_2d(templates)
+    if not normalized:
+        templates = normalize(templates)
+    return templates @ normalize(probe).ravel()
+
+
+def euclidean_distances(probe, templates) -> np.ndarray:
+    templates = np.atleast_2d(np.asarray(templates, dtype=np.float32))
+    probe = np.asarray(probe, dtype=np.float32).ravel()
+    return np.linalg.norm(templates - probe, axis=1)
+
+
+def stack(templates: list[Template]) -> tuple[np.ndarray, bool]:
+    matrix = np.stack([t.vector for t in templates]).astype(np.float32, copy=False)
+    return matrix, all(t.normalized for t in templates)
+
+
+def normalized_score(comparison: Comparison) -> float:
+    """
+    Maps a score onto [0, 1] with the decision threshold at 0.5, so cosine
+    similarities and Euclidean distances can be fused.
+    """
+    score, _, metric, threshold = comparison
+    if metric == EUCLIDEAN:
+        if threshold <= 0:
+            return 0.0
+        value = 0.5 + 0.5 * (threshold - score) / threshold if score < threshold else 0.5 * threshold / score
+    elif score >= threshold:
+        value = 0.5 + 0.5 * (score - threshold) / max(1.0 - threshold, 1e-6)
+    else:
+        value = 0.5 * (score + 1.0) / max(threshold + 1.0, 1e-6)
+    return float(min(1.0, max(0.0, value)))
+
+
+def fuse(comparisons: list[Comparison], weights: list[float], mode: str, threshold: float) -> Comparison:
+    """
+    Score-level fusion. The fused score is the weighted mean of the
+    normalised scores. "weighted" accepts when it reaches `threshold`,
+    "either" when any modality matches, "both" when all of them do.
+    """
+    total = sum(weights)
+    if total <= 0:
+        raise ValueError("Fusion weights must not all be zero")
+    score = sum(w * normalized_score(c) for w, c in zip(weights, comparisons)) / total
+    if mode == "either":
+        match = any(c.match for c in comparisons)
+    elif mode == "both":
+        match = all(c.match for c in comparisons)
+    elif mode == "weighted":
+        match = score >= threshold
+    else:
+        raise ValueError(f"Unknown fusion mode '{mode}'")
+    return Comparison(float(score), match, f"fusion-{mode}", threshold)
+
+
+def compare(probe, probe_model: str | None, templates: Template | list[Template]) -> Comparison:
+    """
+    Scores a probe against one or more templates of the same user and returns
+    the best score. Templates whose model or dimension does not match the
+    probe cannot be compared and yield a non-match.
+    """
+    if isinstance(templates, Template):
+        templates = [templates]
+    probe = np.asarray(probe, dtype=np.float32).ravel()
+    reference = templates[0]
+    metric, threshold = policy_for(reference.modality, reference.model)
+    comparable = [
+        t for t in templates
+        if t.dim == probe.size and (probe_model is None or t.model == probe_model)
+    ]
+    if not comparable:
+        return Comparison(0.0, False, COSINE, policy_for(reference.modality, "")[1])
+    matrix, normalized = stack(comparable)
+    if metric == EUCLIDEAN:
+        score = float(np.min(euclidean_distances(probe, matrix)))
+        return Comparison(score, score < threshold, metric, threshold)
+    score = float(np.max(cosine_scores(probe, matrix, normalized)))
+    return Comparison(score, score >= threshold, metric, threshold)
+
+
+def aggregate(vectors, method: str = "mean") -> np.ndarray:
+    """
+    Combines several embeddings of one person into a single template:
+    "mean" averages the normalised samples, "medoid" keeps the sample with
+    the highest total similarity to the others (robust to one bad capture).
+    """
+    samples = normalize(np.atleast_2d(vectors))
+    if method == "medoid":
+        similarity = samples @ samples.T
+        return samples[int(np.argmax(similarity.sum(axis=1)))]
+    if method != "mean":
+        raise ValueError(f"Unknown aggregation method '{method}'")
+    return normalize(samples.mean(axis=0))
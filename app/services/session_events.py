@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+
+from app.core.config import settings
+from app.services.session_metrics import session_metrics
+
+logger = logging.getLogger(__name__)
+
+RESYNC = "resync"
+
+
+class TooManySubscribersError(Exception):
+    pass
+
+
+EVENT_FIELDS = ("id", "modality", "phase", "match", "score", "threshold", "metric", "mock_used", "face_tier", "created_at")
+
+
+def event_payload(event, fields=EVENT_FIELDS) -> dict:
+    """JSON-ready dict of a VerificationEvent or of a column-only row holding `fields`."""
+    payload = {}
+    for field in fields:
+        value = getattr(event, field)
+        if field in ("modality", "phase"):
+            value = getattr(value, "value", value)
+        elif field == "created_at" and value is not None:
+            value = value.isoformat()
+        payload[field] = value
+    return payload
+
+
+def sse_message(event: str, data, event_id: int | None = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+    def __init__(self, broker, session_id: int, queue_size: int):
+        self.broker = broker
+        self.session_id = session_id
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def put(self, message: str, event_id: int | None = None):
+        try:
+            self.queue.put_nowait((event_id, message))
+        except asyncio.QueueFull:
+            # A slow client loses its backlog and is told to refetch instead of
+            # holding memory or slowing the publisher down
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((None, RESYNC))
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class SessionEventBroker:
+    """
+    In-process fan-out of committed verification events to the server-sent
+    event streams of `/exam/session/{id}/events`. The event writer publishes
+    each committed batch once; every subscriber of a session gets the new
+    events plus one metrics snapshot per batch on its own bounded queue.
+
+    Other workers' events never reach this process's writer, so while
+    anyone is subscribed a poller reads the events table every
+    `poll_seconds` for subscribed sessions' rows above the highest id seen
+    (0 disables it, for a single worker). PostgreSQL assigns ids before
+    commit, so a row can become visible after a higher one was polled: each
+    poll also reads the `rescan_window` ids below that watermark again. Each
+    event id is published once, whichever path sees it first, so streams may
+    get events out of id order but never twice.
+    """
+
+    def __init__(self, max_subscribers: int, queue_size: int, poll_seconds: float = 0, rescan_window: int = 0):
+        self.max_subscribers = max(1, max_subscribers)
+        self.queue_size = max(2, queue_size)
+        self.poll_seconds = poll_seconds
+        self.rescan_window = max(0, rescan_window)
+        self._subscribers = {}
+        self._poller = None
+        self._watermark = 0
+        # Ids published or polled that a poll can still read (above the rescanned window)
+        self._published_ids = set()
+        self.published = 0
+        self.polled = 0
+
+    def subscribe(self, session_id: int) -> Subscription:
+        subscribers = self._subscribers.setdefault(session_id, set())
+        if len(subscribers) >= self.max_subscribers:
+            raise TooManySubscribersError(f"Session {session_id} already has {len(subscribers)} subscribers")
+        subscription = Subscription(self, session_id, self.queue_size)
+        subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.session_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.session_id]
+
+    async def start_polling(self, db):
+        """Starts the poller if it is enabled and not running; `db` reads its starting id."""
+        if self.poll_seconds <= 0 or (self._poller is not None and not self._poller.done()):
+            return
+        from sqlalchemy import func, select
+        from app.models.verification_event import VerificationEvent
+
+        self._watermark = (await db.execute(select(func.max(VerificationEvent.id)))).scalar() or 0
+        self._published_ids = {i for i in self._published_ids if i > self._watermark - self.rescan_window}
+        self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _poll(self):
+        from sqlalchemy import select
+        from app.db.session import AsyncSessionLocal
+        from app.models.verification_event import VerificationEvent
+
+        polled_sessions = set()
+        while self._subscribers:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                async with AsyncSessionLocal() as db:
+                    sessions = list(self._subscribers)
+                    watermark = self._watermark
+                    after = max(0, watermark - self.rescan_window)
+                    while self._subscribers:
+                        events = (await db.execute(
+                            select(VerificationEvent)
+                            .where(VerificationEvent.id > after, VerificationEvent.session_id.in_(sessions))
+                            .order_by(VerificationEvent.id)
+                            .limit(settings.SESSION_STREAM_REPLAY_LIMIT)
+                        )).scalars().all()
+                        if not events:
+                            break
+                        after = events[-1].id
+                        self._watermark = max(self._watermark, after)
+                        fresh = []
+                        for event in events:
+                            if event.id in self._published_ids:
+                                continue
+                            if event.id <= watermark and event.session_id not in polled_sessions:
+                                # A session's first poll: its rescanned rows predate its streams
+                                self._published_ids.add(event.id)
+                                continue
+                            fresh.append(event)
+                        if fresh:
+                            self.polled += len(fresh)
+                            session_metrics.record(fresh)
+                            self.publish(fresh)
+                        if len(events) < settings.SESSION_STREAM_REPLAY_LIMIT:
+                            break
+                    polled_sessions = set(sessions)
+            except Exception as e:
+                logger.warning(f"Session event poll failed: {e}")
+                continue
+            # Nothing at or below the next poll's window is read again
+            floor = self._watermark - self.rescan_window
+            self._published_ids = {i for i in self._published_ids if i > floor}
+
+    def publish(self, events):
+        """Fans committed VerificationEvent rows out to the subscribed streams."""
+        if not self._subscribers:
+            return
+        by_session = {}
+        for event in events:
+            if event.session_id in self._subscribers and event.id not in self._published_ids:
+                self._published_ids.add(event.id)
+                by_session.setdefault(event.session_id, []).append(event)
+        for session_id, session_events in by_session.items():
+            # Serialised once per session, not once per subscriber
+            messages = [(e.id, sse_message("verification", event_payload(e), e.id)) for e in session_events]
+            rollup = session_metrics.peek(session_id)
+            if rollup is not None:
+                messages.append((None, sse_message("metrics", rollup.to_dict())))
+            for subscription in self._subscribers[session_id]:
+                for event_id, message in messages:
+                    subscription.put(message, event_id)
+            self.published += len(session_events)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "max_subscribers_per_session": self.max_subscribers,
+            "published": self.published,
+            "polled": self.polled,
+            "poll_seconds": self.poll_seconds,
+            "rescan_window": self.rescan_window,
+        }
+
+
+session_events = SessionEventBroker(
+    settings.SESSION_STREAM_MAX_SUBSCRIBERS, settings.SESSION_STREAM_QUEUE_SIZE, settings.SESSION_STREAM_POLL_S,
+    settings.SESSION_STREAM_RESCAN_WINDOW,
+)
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+
+from sqlalchemy import case, func, select
+
+from app.core.config import settings
+from app.models.biometric_data import BiometricType
+from app.models.verification_event import VerificationEvent
+
+logger = logging.getLogger(__name__)
+
+
+def _value(member) -> str:
+    return getattr(member, "value", member)
+
+
+class SessionRollup:
+    """Running aggregate of one session's verification events."""
+
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.events = 0
+        self.failures = 0
+        self.mock_used = 0
+        self.score_min = None
+        self.score_max = None
+        self.score_sum = 0.0
+        self.by_modality = {}
+        self.by_phase = {}
+        self.last_event_id = 0
+        self.version = 0
+        self.loaded_at = time.monotonic()
+
+    def _merge(self, modality, phase, events, failures, mock_used, score_min, score_max, score_sum):
+        counts = self.by_modality.setdefault(_value(modality), {"events": 0, "failures": 0})
+        counts["events"] += events
+        counts["failures"] += failures
+        # Fused events repeat the face and voice checks logged next to them, on another score scale
+        if _value(modality) == BiometricType.MULTIMODAL.value:
+            return
+        self.events += events
+        self.failures += failures
+        self.mock_used += mock_used
+        self.score_sum += score_sum
+        self.score_min = score_min if self.score_min is None else min(self.score_min, score_min)
+        self.score_max = score_max if self.score_max is None else max(self.score_max, score_max)
+        phase = _value(phase)
+        self.by_phase[phase] = self.by_phase.get(phase, 0) + events
+
+    def add(self, event) -> bool:
+        """Folds in one committed event; events already counted (by id) are ignored."""
+        if event.id <= self.last_event_id:
+            return False
+        self._merge(event.modality, event.phase, 1, int(not event.match), int(event.mock_used),
+                    event.score, event.score, event.score)
+        self.last_event_id = event.id
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "events": self.events,
+            "frr": self.failures / self.events if self.events else None,
+            "far": None,
+            "failures": self.failures,
+            "mock_used": self.mock_used,
+            "by_modality": self.by_modality,
+            "by_phase": self.by_phase,
+            "score": {
+                "min": self.score_min,
+                "mean": self.score_sum / self.events if self.events else None,
+                "max": self.score_max,
+            },
+        }
+
+
+class SessionMetrics:
+    """
+    In-memory rollups behind `GET /exam/metrics/session/{id}`. The event
+    writer folds every committed batch in, so a poll is a dict lookup instead
+    of loading the session's events. A session that is not cached is built
+    once from a grouped aggregate query; events committed while that query
+    runs are buffered and folded in afterwards (deduplicated by event id).
+
+    Only this worker's writes are folded in, so with several workers a rollup
+    older than `ttl_seconds` is rebuilt from the database on its next read
+    (0 keeps rollups until they are evicted, for a single worker).
+
+    Every change gets a new version from a process-wide counter, which
+    together with a per-process token forms the ETag; a rebuild that finds
+    nothing new keeps the version, so polls still get 304.
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: float = 0):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl_seconds
+        self._token = secrets.token_hex(4)
+        self._counter = 0
+        self._rollups = OrderedDict()
+        # session_id -> (events committed during the load, future of the loaded rollup)
+        self._loading = {}
+        self.hits = 0
+        self.loads = 0
+        self.refreshes = 0
+
+    def _bump(self, rollup: SessionRollup):
+        self._counter += 1
+        rollup.version = self._counter
+
+    def etag(self, rollup: SessionRollup) -> str:
+        return f'"{self._token}-{rollup.session_id}-{rollup.version}"'
+
+    def record(self, events):
+        """Folds committed VerificationEvent rows into the cached rollups."""
+        for event in events:
+            rollup = self._rollups.get(event.session_id)
+            if rollup is not None:
+                if rollup.add(event):
+                    self._bump(rollup)
+            elif event.session_id in self._loading:
+                self._loading[event.session_id][0].append(event)
+
+    def peek(self, session_id: int) -> SessionRollup | None:
+        return self._rollups.get(session_id)
+
+    def _expired(self, rollup: SessionRollup) -> bool:
+        return self.ttl > 0 and time.monotonic() - rollup.loaded_at >= self.ttl
+
+    async def get(self, session_id: int, db) -> SessionRollup:
+        rollup = self._rollups.get(session_id)
+        previous = None
+        if rollup is not None:
+            if not self._expired(rollup):
+                self._rollups.move_to_end(session_id)
+                self.hits += 1
+                return rollup
+            # Rebuilt below; events this worker commits meanwhile are buffered like for a cold session
+            previous = self._rollups.pop(session_id)
+            self.refreshes += 1
+        if session_id in self._loading:
+            # Concurrent polls of a cold session share one aggregate query
+            return await asyncio.shield(self._loading[session_id][1])
+        future = asyncio.get_running_loop().create_future()
+        buffered = []
+        self._loading[session_id] = (buffered, future)
+        try:
+            rollup = await self._load(session_id, db)
+            for event in buffered:
+                rollup.add(event)
+            if previous is not None and previous.to_dict() == rollup.to_dict():
+                rollup.version = previous.version
+            else:
+                self._bump(rollup)
+            self._rollups[session_id] = rollup
+            while len(self._rollups) > self.max_sessions:
+                self._rollups.popitem(last=False)
+            future.set_result(rollup)
+            self.loads += 1
+            return rollup
+        except Exception as e:
+            future.set_exception(e)
+            # Marked retrieved so a future nobody else awaited does not log "exception never retrieved"
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._loading[session_id]
+
+    @staticmethod
+    async def _load(session_id: int, db) -> SessionRollup:
+        ev = VerificationEvent
+        rows = (await db.execute(
+            select(
+                ev.modality,
+                ev.phase,
+                func.count(),
+                func.sum(case((ev.match.is_(False), 1), else_=0)),
+                func.sum(case((ev.mock_used.is_(True), 1), else_=0)),
+                func.min(ev.score),
+                func.max(ev.score),
+                func.sum(ev.score),
+                func.max(ev.id),
+            ).where(ev.session_id == session_id).group_by(ev.modality, ev.phase)
+        )).all()
+        rollup = SessionRollup(session_id)
+        for modality, phase, events, failures, mock_used, score_min, score_max, score_sum, max_id in rows:
+            rollup._merge(modality, phase, events, failures, mock_used, score_min, score_max, score_sum)
+            rollup.last_event_id = max(rollup.last_event_id, max_id)
+        return rollup
+
+    def stats(self) -> dict:
+        return {
+            "cached_sessions": len(self._rollups),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "loads": self.loads,
+            "refreshes": self.refreshes,
+            "ttl_seconds": self.ttl,
+        }
+
+
+session_metrics = SessionMetrics(settings.SESSION_METRICS_CACHE_SIZE, settings.SESSION_METRICS_TTL_SECONDS)
@@ -0,0 +1,114 @@
+import dataclasses
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.template_format import Template
+
+
+class TemplateCache:
+    """
+    Bounded LRU cache of decrypted templates keyed by (user_id, modality),
+    with a TTL so that other workers' enrollments are picked up eventually.
+    Callers get read-only copies of the cached float32 vectors, so the cached
+    buffer is never referenced by an in-flight request; with `zero_on_evict`
+    it is overwritten when the entry leaves the cache.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, zero_on_evict: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.zero_on_evict = zero_on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @staticmethod
+    def _copy(template: Template) -> Template:
+        vector = np.array(template.vector, dtype=np.float32)
+        vector.setflags(write=False)
+        return dataclasses.replace(template, vector=vector)
+
+    def _drop(self, key):
+        template, _ = self._entries.pop(key)
+        if self.zero_on_evict:
+            template.vector.setflags(write=True)
+            template.vector.fill(0)
+
+    def get(self, user_id: int, modality) -> Template | None:
+        if not self.enabled:
+            return None
+        key = (user_id, modality)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            template, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(template)
+
+    def put(self, user_id: int, modality, template: Template) -> Template:
+        """Caches a private copy of `template` and returns another one to the caller."""
+        template = self._copy(template)
+        if not self.enabled:
+            return template
+        key = (user_id, modality)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (self._copy(template), time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return template
+
+    def invalidate(self, user_id: int, modality=None):
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == user_id and (modality is None or k[1] == modality)]
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+template_cache = TemplateCache(
+    settings.TEMPLATE_CACHE_MAX_ENTRIES,
+    settings.TEMPLATE_CACHE_TTL_SECONDS,
+    settings.TEMPLATE_CACHE_ZERO_ON_EVICT,
+)
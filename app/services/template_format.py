@@ -0,0 +1,134 @@
+import json
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.models.biometric_data import BiometricType
+
+# Binary template layout (little endian), encrypted as a whole with Fernet:
+#   magic    4s  b"BTPL"
+#   version  B   format version
+#   modality B   1 = face, 2 = voice
+#   dtype    B   1 = float32, 2 = float16, 3 = int8 (symmetric, per-template scale)
+#   flags    B   bit 0 = vector is L2-normalised
+#   dim      I   number of components
+#   scale    f   int8 dequantisation scale (1.0 otherwise)
+#   name_len B   followed by the UTF-8 model name
+# followed by `dim` values of `dtype`.
+MAGIC = b"BTPL"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sBBBBIfB")
+
+FLAG_NORMALIZED = 0x01
+
+_MODALITY_CODES = {BiometricType.FACE: 1, BiometricType.VOICE: 2}
+_MODALITIES = {code: modality for modality, code in _MODALITY_CODES.items()}
+_DTYPE_CODES = {"float32": 1, "float16": 2, "int8": 3}
+_DTYPES = {1: np.float32, 2: np.float16, 3: np.int8}
+
+# Names recorded for embeddings that do not come from the face model registry
+MOCK_MODEL = "mock"
+ORB_MODEL = "ORB"
+VOICE_MODEL = "MFCC"
+
+
+class TemplateFormatError(ValueError):
+    pass
+
+
+@dataclass
+class Template:
+    vector: np.ndarray
+    modality: BiometricType | None
+    model: str
+    normalized: bool
+    version: int = FORMAT_VERSION
+
+    @property
+    def dim(self) -> int:
+        return int(self.vector.shape[-1])
+
+
+def _is_normalized(vector: np.ndarray) -> bool:
+    return abs(float(np.linalg.norm(vector)) - 1.0) < 1e-3
+
+
+def infer_legacy_model(modality: BiometricType | None, dim: int, face_model: str = "VGG-Face") -> str:
+    """Best guess of the producer of a legacy JSON template from its length."""
+    if dim == 128:
+        return MOCK_MODEL
+    if modality == BiometricType.VOICE:
+        return VOICE_MODEL
+    if dim == 512:
+        return ORB_MODEL
+    return face_model
+
+
+def encode_template(vector, modality: BiometricType, model: str, dtype: str = "float32") -> bytes:
+    if dtype not in _DTYPE_CODES:
+        raise TemplateFormatError(f"Unsupported template dtype '{dtype}'")
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    scale = 1.0
+    if dtype == "int8":
+        peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        payload = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    else:
+        payload = vector.astype(_DTYPES[_DTYPE_CODES[dtype]])
+    # The flag describes what decode_template returns, so it is checked after quantisation
+    flags = FLAG_NORMALIZED if _is_normalized(payload.astype(np.float32) * np.float32(scale)) else 0
+    name = model.encode()[:255]
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, _MODALITY_CODES[modality], _DTYPE_CODES[dtype],
+        flags, vector.size, scale, len(name)
+    )
+    return header + name + payload.astype(payload.dtype.newbyteorder("<")).tobytes()
+
+
+def decode_template(data: bytes, modality: BiometricType | None = None, face_model: str = "VGG-Face") -> Template:
+    """
+    Decodes a decrypted template. Binary templates are parsed from their
+    header; legacy rows (a JSON list of floats) are read transparently with
+    version 0 and a model inferred from their length.
+    """
+    data = bytes(data)
+    if not data.startswith(MAGIC):
+        try:
+            vector = np.asarray(json.loads(data.decode()), dtype=np.float32)
+        except Exception as e:
+            raise TemplateFormatError(f"Unreadable template: {e}") from e
+        return Template(
+            vector=vector,
+            modality=modality,
+            model=infer_legacy_model(modality, vector.size, face_model),
+            normalized=_is_normalized(vector),
+            version=0,
+        )
+    if len(data) < _HEADER.size:
+        raise TemplateFormatError("Truncated template header")
+    magic, version, modality_code, dtype_code, flags, dim, scale, name_len = _HEADER.unpack_from(data)
+    if version > FORMAT_VERSION:
+        raise TemplateFormatError(f"Unsupported template version {version}")
+    if dtype_code not in _DTYPES or modality_code not in _MODALITIES:
+        raise TemplateFormatError("Corrupt template header")
+    offset = _HEADER.size
+    model = data[offset:offset + name_len].decode()
+    offset += name_len
+    dtype = np.dtype(_DTYPES[dtype_code]).newbyteorder("<")
+    if len(data) - offset != dim * dtype.itemsize:
+        raise TemplateFormatError("Template payload does not match its header")
+    vector = np.frombuffer(data, dtype=dtype, count=dim, offset=offset).astype(np.float32)
+    if dtype_code == _DTYPE_CODES["int8"]:
+        vector *= np.float32(scale)
+    normalized = bool(flags & FLAG_NORMALIZED)
+    if normalized and dtype_code != _DTYPE_CODES["float32"]:
+        # Older writers set the flag before quantising; trust it only if the values still agree
+        normalized = _is_normalized(vector)
+    return Template(
+        vector=vector,
+        modality=_MODALITIES[modality_code],
+        model=model,
+        normalized=normalized,
+        version=version,
+    )
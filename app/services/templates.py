@@ -0,0 +1,98 @@
+from cryptography.fernet import Fernet
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.metrics import metrics
+from app.models.biometric_data import BiometricData, BiometricType, TemplateKind
+from app.services.template_cache import template_cache
+from app.services.template_format import Template, decode_template, encode_template
+
+
+def get_cipher_suite():
+    key = settings.ENCRYPTION_KEY
+    if isinstance(key, str):
+        key = key.encode()
+    return Fernet(key)
+
+
+def encrypt_template(vector, modality: BiometricType, model: str) -> bytes:
+    payload = encode_template(vector, modality, model, settings.TEMPLATE_STORAGE_DTYPE)
+    return get_cipher_suite().encrypt(payload)
+
+
+def decrypt_template(encrypted_blob, modality: BiometricType | None = None) -> Template:
+    if isinstance(encrypted_blob, memoryview):
+        encrypted_blob = encrypted_blob.tobytes()
+    try:
+        with metrics.stage("template_decrypt"):
+            plaintext = get_cipher_suite().decrypt(bytes(encrypted_blob))
+        with metrics.stage("template_decode"):
+            return decode_template(plaintext, modality, settings.FACE_MODEL_NAME)
+    except Exception:
+        metrics.inc("decrypt_failures_total")
+        raise
+
+
+def is_verification_template():
+    """Rows usable as a user's template: everything except per-sample rows."""
+    return or_(BiometricData.kind.is_(None), BiometricData.kind != TemplateKind.SAMPLE)
+
+
+def _template_blob_query(user_id: int, modality: BiometricType):
+    # Served by ix_biometric_data_user_modality_id
+    return select(BiometricData.encrypted_descriptor).where(
+        BiometricData.user_id == user_id,
+        BiometricData.modality == modality,
+        is_verification_template()
+    ).order_by(BiometricData.id.desc()).limit(1)
+
+
+def _cache_decrypted(user_id: int, modality: BiometricType, blob) -> Template | None:
+    if blob is None:
+        return None
+    return template_cache.put(user_id, modality, decrypt_template(blob, modality))
+
+
+def load_template(db: Session, user_id: int, modality: BiometricType) -> Template | None:
+    """
+    Returns the user's newest decoded template for `modality` (single or
+    aggregate), or None if not enrolled. Served from the template cache when
+    possible; raises on decrypt failure.
+    """
+    cached = template_cache.get(user_id, modality)
+    if cached is not None:
+        return cached
+    with metrics.stage("template_db"):
+        blob = db.execute(_template_blob_query(user_id, modality)).scalar()
+    return _cache_decrypted(user_id, modality, blob)
+
+
+async def load_template_async(db: AsyncSession, user_id: int, modality: BiometricType) -> Template | None:
+    """`load_template` for AsyncSession (used by the async endpoints)."""
+    cached = template_cache.get(user_id, modality)
+    if cached is not None:
+        return cached
+    with metrics.stage("template_db"):
+        blob = (await db.execute(_template_blob_query(user_id, modality))).scalar()
+    return _cache_decrypted(user_id, modality, blob)
+
+
+async def load_templates_async(db: AsyncSession, user_id: int, modalities) -> dict[BiometricType, Template | None]:
+    """Newest template per modality, with one query for everything not cached."""
+    templates = {modality: template_cache.get(user_id, modality) for modality in modalities}
+    missing = [modality for modality, template in templates.items() if template is None]
+    if missing:
+        newest = select(func.max(BiometricData.id)).where(
+            BiometricData.user_id == user_id,
+            BiometricData.modality.in_(missing),
+            is_verification_template()
+        ).group_by(BiometricData.modality)
+        with metrics.stage("template_db"):
+            rows = (await db.execute(
+                select(BiometricData.modality, BiometricData.encrypted_descriptor).where(BiometricData.id.in_(newest))
+            )).all()
+        for modality, blob in rows:
+            templates[modality] = _cache_decrypted(user_id, modality, blob)
+    return templates
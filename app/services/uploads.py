@@ -0,0 +1,180 @@
+import os
+import tempfile
+import zlib
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.services.embedding_cache import content_hasher, embedding_cache
+from app.services.metrics import metrics
+
+CHUNK_SIZE = 64 * 1024
+
+_IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a", b"BM", b"II*\x00", b"MM\x00*")
+_AUDIO_SIGNATURES = (b"OggS", b"fLaC", b"ID3", b".snd", b"caff")
+
+
+def looks_like_image(head: bytes) -> bool:
+    """Cheap magic-number check for formats cv2.imdecode understands."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return True
+    return head.startswith(_IMAGE_SIGNATURES)
+
+
+def looks_like_audio(head: bytes) -> bool:
+    """Cheap magic-number check for containers libsndfile can decode."""
+    if head[:4] in (b"RIFF", b"RF64") and head[8:12] == b"WAVE":
+        return True
+    if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+        return True
+    if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0:
+        return True  # MPEG audio frame sync
+    return head.startswith(_AUDIO_SIGNATURES)
+
+
+def check_decodable(ok: bool, kind: str) -> bool:
+    """
+    Returns whether a payload is worth sending to the model. Unrecognised
+    payloads skip all model work; with UPLOAD_STRICT_DECODE they are rejected
+    with 415 instead of falling back to the mock descriptor.
+    """
+    if not ok and settings.UPLOAD_STRICT_DECODE:
+        raise HTTPException(status_code=415, detail=f"Unsupported or undecodable {kind} payload")
+    return ok
+
+
+def _too_large(max_bytes: int):
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+
+
+class SpooledUpload:
+    """
+    An upload read in chunks with its size limit enforced while reading.
+    Small payloads stay in memory; past `spill_bytes` they are written to a
+    temporary file so that decoders (and worker processes) can stream from a
+    path instead of holding the whole payload in memory.
+    """
+
+    def __init__(self, spill_bytes: int, hash_content: bool = False):
+        self.spill_bytes = spill_bytes
+        self.size = 0
+        self.crc32 = 0
+        self._hasher = content_hasher() if hash_content else None
+        self.head = b""
+        self.path = None
+        self._buffer = bytearray()
+        self._fh = None
+
+    def _write(self, chunk: bytes):
+        self.size += len(chunk)
+        self.crc32 = zlib.crc32(chunk, self.crc32)
+        if self._hasher is not None:
+            self._hasher.update(chunk)
+        if len(self.head) < 16:
+            self.head = (self.head + chunk)[:16]
+        if self._fh is None and len(self._buffer) + len(chunk) > self.spill_bytes:
+            fd, self.path = tempfile.mkstemp(prefix="upload-")
+            self._fh = os.fdopen(fd, "wb")
+            self._fh.write(self._buffer)
+            self._buffer = bytearray()
+        if self._fh is not None:
+            self._fh.write(chunk)
+        else:
+            self._buffer += chunk
+
+    def _finish(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    @property
+    def digest(self) -> bytes | None:
+        """Content hash (embedding cache key), when hashing was requested."""
+        return self._hasher.digest() if self._hasher is not None else None
+
+    @property
+    def source(self) -> bytes | str:
+        """Bytes for small payloads, a file path for spilled ones (both picklable)."""
+        return self.path if self.path is not None else bytes(self._buffer)
+
+    def close(self):
+        self._finish()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+@asynccontextmanager
+async def spool_upload(file: UploadFile, max_bytes: int, spill_bytes: int | None = None):
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+    upload = SpooledUpload(
+        settings.UPLOAD_SPILL_BYTES if spill_bytes is None else spill_bytes, hash_content=embedding_cache.enabled
+    )
+    try:
+        with metrics.stage("upload_read"):
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if upload.size + len(chunk) > max_bytes:
+                    raise _too_large(max_bytes)
+                upload._write(chunk)
+            upload._finish()
+        yield upload
+    finally:
+        upload.close()
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """Reads a small upload (e.g. an image) fully, enforcing the limit while reading."""
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+    data = bytearray()
+    with metrics.stage("upload_read"):
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(data) + len(chunk) > max_bytes:
+                raise _too_large(max_bytes)
+            data += chunk
+    return bytes(data)
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Rejects request bodies larger than `max_bytes` before they are parsed:
+    up front from Content-Length, or mid-stream for chunked uploads.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
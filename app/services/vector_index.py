@@ -0,0 +1,408 @@
+import io
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.biometric_data import BiometricData, BiometricType
+from app.services.scoring import cosine_scores, normalize
+from app.services.template_format import MOCK_MODEL
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over L2-normalised float32 vectors of one model.
+
+    Below `ivf_threshold` entries every search is an exact matrix-vector
+    product. Above it a coarse k-means quantizer (IVF) is trained and a search
+    only scores the rows of the `nprobe` closest clusters; it is retrained
+    whenever the index has doubled since the last training.
+    """
+
+    def __init__(self, dim: int, ivf_threshold: int, nlist: int = 0, nprobe: int = 8):
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.size = 0
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._row_ids = np.empty(0, dtype=np.int64)
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self.centroids = None
+        self._assign = None
+        self._trained_size = 0
+
+    @property
+    def kind(self) -> str:
+        return "ivf" if self.centroids is not None else "flat"
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        if needed <= len(self._vectors):
+            return
+        capacity = max(needed, 2 * len(self._vectors), 64)
+        for name, shape, dtype in (
+            ("_vectors", (capacity, self.dim), np.float32),
+            ("_row_ids", (capacity,), np.int64),
+            ("_user_ids", (capacity,), np.int64),
+        ):
+            grown = np.empty(shape, dtype=dtype)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+        if self._assign is not None:
+            grown = np.empty(capacity, dtype=np.int32)
+            grown[:self.size] = self._assign[:self.size]
+            self._assign = grown
+
+    def add(self, row_ids, user_ids, vectors):
+        vectors = normalize(np.atleast_2d(vectors))
+        n = len(vectors)
+        self._reserve(n)
+        start, end = self.size, self.size + n
+        self._vectors[start:end] = vectors
+        self._row_ids[start:end] = row_ids
+        self._user_ids[start:end] = user_ids
+        if self.centroids is not None:
+            self._assign[start:end] = np.argmax(vectors @ self.centroids.T, axis=1)
+        self.size = end
+        if self.size >= self.ivf_threshold and self.size >= 2 * max(self._trained_size, self.ivf_threshold // 2):
+            self.train()
+
+    def remove(self, row_id: int) -> bool:
+        positions = np.flatnonzero(self._row_ids[:self.size] == row_id)
+        if not len(positions):
+            return False
+        # The last entry moves into the freed slot, so the arrays stay dense
+        position, last = int(positions[0]), self.size - 1
+        self._vectors[position] = self._vectors[last]
+        self._row_ids[position] = self._row_ids[last]
+        self._user_ids[position] = self._user_ids[last]
+        if self._assign is not None:
+            self._assign[position] = self._assign[last]
+        self.size = last
+        return True
+
+    def train(self, iterations: int = 10, seed: int = 0):
+        """Spherical k-means over the current vectors."""
+        data = self._vectors[:self.size]
+        nlist = self.nlist or max(1, int(4 * math.sqrt(self.size)))
+        nlist = min(nlist, self.size)
+        rng = np.random.default_rng(seed)
+        sample = data[rng.choice(self.size, size=min(self.size, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = normalize(sums)
+        self.centroids = centroids
+        assign = np.empty(len(self._vectors), dtype=np.int32)
+        assign[:self.size] = np.argmax(data @ centroids.T, axis=1)
+        self._assign = assign
+        self._trained_size = self.size
+
+    def search(self, query, k: int, nprobe: int | None = None):
+        """Returns up to `k` (row_id, user_id, score) tuples, best first."""
+        if self.size == 0:
+            return []
+        query = normalize(query).ravel()
+        if self.centroids is None:
+            candidates = None
+            scores = cosine_scores(query, self._vectors[:self.size], normalized=True)
+        else:
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            candidates = np.flatnonzero(np.isin(self._assign[:self.size], probes))
+            scores = cosine_scores(query, self._vectors[candidates], normalized=True)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = top if candidates is None else candidates[top]
+        return [
+            (int(self._row_ids[p]), int(self._user_ids[p]), float(s))
+            for p, s in zip(positions, scores[top])
+        ]
+
+    def state(self) -> dict:
+        state = {
+            "vectors": self._vectors[:self.size],
+            "row_ids": self._row_ids[:self.size],
+            "user_ids": self._user_ids[:self.size],
+        }
+        if self.centroids is not None:
+            state["centroids"] = self.centroids
+            state["assign"] = self._assign[:self.size]
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict, ivf_threshold: int, nlist: int, nprobe: int) -> "VectorIndex":
+        vectors = state["vectors"]
+        index = cls(vectors.shape[1], ivf_threshold, nlist, nprobe)
+        index._vectors = np.array(vectors, dtype=np.float32)
+        index._row_ids = np.array(state["row_ids"], dtype=np.int64)
+        index._user_ids = np.array(state["user_ids"], dtype=np.int64)
+        index.size = len(vectors)
+        if "centroids" in state:
+            index.centroids = np.array(state["centroids"], dtype=np.float32)
+            index._assign = np.array(state["assign"], dtype=np.int32)
+            index._trained_size = index.size
+        return index
+
+
+class FaceIndex:
+    """
+    1:N face index: one VectorIndex per embedding model (templates from
+    different models are not comparable). Built from BiometricData at startup,
+    updated on enrollment and persisted, encrypted, for fast restarts.
+
+    Only the newest face template of each user is indexed, since it is the
+    one verification reads: a newer row replaces the user's older one, and
+    an older row arriving late is ignored.
+
+    `max_row_id` is the catch-up watermark: every face row up to it was seen
+    by a database scan. Only `_catch_up` advances it, never `add`, because
+    rows stored by imports or other workers can have ids below the ones this
+    process enrolled. On load, rows above the watermark are read again, and
+    only the newest one per user is decrypted if it is not indexed yet.
+    PostgreSQL assigns ids before commit, so a row can become visible after
+    a higher one was scanned: every catch-up also reads the `rescan_window`
+    ids below the watermark again, where only rows not seen yet count. The
+    same catch-up runs again every `refresh_seconds` (see `refresh`), so
+    enrollments made by other workers and imports reach this worker's index
+    while it runs. Every worker saves its snapshot to the same path on
+    shutdown; whichever is written last, the next start catches up on what
+    it lacks.
+    """
+
+    def __init__(self, path: str, ivf_threshold: int, nlist: int, nprobe: int, refresh_seconds: float = 0,
+                 rescan_window: int = 0):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.rescan_window = max(0, rescan_window)
+        self.ivf_threshold = ivf_threshold
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.partitions: dict[str, VectorIndex] = {}
+        self.max_row_id = 0
+        self._row_ids = set()
+        # user_id -> (row_id, model) of the template indexed for that user
+        self._current: dict[int, tuple[int, str]] = {}
+        self.ready = False
+        self.build_seconds = None
+        self._refreshed_at = 0.0
+        self._lock = threading.RLock()
+        self._refreshing = threading.Lock()
+
+    def add(self, row_id: int, user_id: int, vector, model: str):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if row_id in self._row_ids:
+                return
+            self._row_ids.add(row_id)
+            current = self._current.get(user_id)
+            if current is not None:
+                if current[0] > row_id:
+                    return
+                partition = self.partitions.get(current[1])
+                if partition is not None:
+                    partition.remove(current[0])
+            self._current[user_id] = (row_id, model)
+            # A newer mock template still retires the older one, but is not searchable itself
+            if model == MOCK_MODEL:
+                return
+            partition = self.partitions.get(model)
+            if partition is None or partition.dim != vector.size:
+                partition = VectorIndex(vector.size, self.ivf_threshold, self.nlist, self.nprobe)
+                self.partitions[model] = partition
+            partition.add([row_id], [user_id], vector)
+
+    def search(self, vector, model: str, k: int = 5):
+        """Best match per user, up to `k` users: [(row_id, user_id, score)]."""
+        with self._lock:
+            partition = self.partitions.get(model)
+            if partition is None or partition.dim != np.asarray(vector).size:
+                return []
+            hits = partition.search(vector, k * 4)
+        best = {}
+        for row_id, user_id, score in hits:
+            if user_id not in best or score > best[user_id][2]:
+                best[user_id] = (row_id, user_id, score)
+        return sorted(best.values(), key=lambda hit: -hit[2])[:k]
+
+    def _catch_up(self, db):
+        # Imported here to keep the index importable without the DB layer
+        from app.services.templates import decrypt_template, is_verification_template
+
+        rows = (
+            db.query(BiometricData.id, BiometricData.user_id, BiometricData.encrypted_descriptor)
+            .filter(
+                BiometricData.modality == BiometricType.FACE,
+                BiometricData.id > max(0, self.max_row_id - self.rescan_window),
+                is_verification_template(),
+            )
+            .order_by(BiometricData.id.desc())
+            .yield_per(1000)
+        )
+        added, scanned_to, seen_users = 0, self.max_row_id, set()
+        # Newest first: only the first row of each user can be its current template
+        for row_id, user_id, blob in rows:
+            scanned_to = max(scanned_to, row_id)
+            if user_id in seen_users:
+                continue
+            seen_users.add(user_id)
+            current = self._current.get(user_id)
+            if row_id in self._row_ids or (current is not None and current[0] > row_id):
+                continue
+            try:
+                template = decrypt_template(blob, BiometricType.FACE)
+            except Exception:
+                logger.warning(f"Skipping undecryptable face template {row_id}")
+                # Seen: a rescan of the window does not try it again
+                with self._lock:
+                    self._row_ids.add(row_id)
+                continue
+            self.add(row_id, user_id, template.vector, template.model)
+            added += 1
+        with self._lock:
+            self.max_row_id = max(self.max_row_id, scanned_to)
+        return added
+
+    def load_or_build(self):
+        from app.db.session import SessionLocal
+
+        started = time.perf_counter()
+        loaded = self.load()
+        db = SessionLocal()
+        try:
+            added = self._catch_up(db)
+        finally:
+            db.close()
+        if added or not loaded:
+            self.save()
+        self._refreshed_at = time.monotonic()
+        self.ready = True
+        self.build_seconds = round(time.perf_counter() - started, 3)
+        logger.info(f"Face index ready: {self.size} templates ({added} decrypted) in {self.build_seconds}s")
+
+    def refresh_due(self) -> bool:
+        return self.ready and self.refresh_seconds > 0 and time.monotonic() - self._refreshed_at >= self.refresh_seconds
+
+    def refresh(self) -> int:
+        """Adds the face rows stored since the last scan; a refresh already running is not repeated."""
+        from app.db.session import SessionLocal
+
+        if not self._refreshing.acquire(blocking=False):
+            return 0
+        try:
+            db = SessionLocal()
+            try:
+                added = self._catch_up(db)
+            finally:
+                db.close()
+            self._refreshed_at = time.monotonic()
+            return added
+        finally:
+            self._refreshing.release()
+
+    @property
+    def size(self) -> int:
+        return sum(p.size for p in self.partitions.values())
+
+    def save(self):
+        if not self.path:
+            return
+        from app.services.templates import get_cipher_suite
+
+        with self._lock:
+            arrays = {"max_row_id": np.array(self.max_row_id)}
+            for i, (model, partition) in enumerate(self.partitions.items()):
+                arrays[f"p{i}_model"] = np.array(model)
+                for name, value in partition.state().items():
+                    arrays[f"p{i}_{name}"] = value
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        # Embeddings are biometric data: never written to disk unencrypted
+        blob = get_cipher_suite().encrypt(buffer.getvalue())
+        # A temp file per writer: workers sharing FACE_INDEX_PATH never write into each other's file
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(self.path)}.",
+                                        dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        from app.services.templates import get_cipher_suite
+
+        try:
+            with open(self.path, "rb") as f:
+                raw = get_cipher_suite().decrypt(f.read())
+            arrays = np.load(io.BytesIO(raw), allow_pickle=False)
+            partitions = {}
+            i = 0
+            while f"p{i}_model" in arrays:
+                state = {
+                    name[len(f"p{i}_"):]: arrays[name]
+                    for name in arrays.files if name.startswith(f"p{i}_") and name != f"p{i}_model"
+                }
+                partitions[str(arrays[f"p{i}_model"])] = VectorIndex.from_state(
+                    state, self.ivf_threshold, self.nlist, self.nprobe
+                )
+                i += 1
+            max_row_id = int(arrays["max_row_id"])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable face index snapshot {self.path}: {e}")
+            return False
+        with self._lock:
+            self.partitions = partitions
+            self.max_row_id = max_row_id
+            self._row_ids = set()
+            self._current = {}
+            for model, partition in partitions.items():
+                state = partition.state()
+                for row_id, user_id in zip(state["row_ids"].tolist(), state["user_ids"].tolist()):
+                    self._row_ids.add(row_id)
+                    if user_id not in self._current or self._current[user_id][0] < row_id:
+                        self._current[user_id] = (row_id, model)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "size": self.size,
+            "max_row_id": self.max_row_id,
+            "rescan_window": self.rescan_window,
+            "build_seconds": self.build_seconds,
+            "partitions": {
+                model: {"kind": p.kind, "size": p.size, "dim": p.dim,
+                        "nlist": len(p.centroids) if p.centroids is not None else None}
+                for model, p in self.partitions.items()
+            },
+        }
+
+
+face_index = FaceIndex(
+    settings.FACE_INDEX_PATH,
+    settings.FACE_INDEX_IVF_THRESHOLD,
+    settings.FACE_INDEX_NLIST,
+    settings.FACE_INDEX_NPROBE,
+    settings.FACE_INDEX_REFRESH_SECONDS,
+    settings.FACE_INDEX_RESCAN_WINDOW,
+)
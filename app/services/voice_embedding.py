@@ -1,9 +1,239 @@
-import numpy as np
+import functools
 import io
-import soundfile as sf
+
 import librosa
+import numpy as np
+import scipy.fft
+import scipy.fftpack
+import scipy.signal
+import soundfile as sf
+import soxr
+
+from app.core.config import settings
+from app.services.embedding_cache import embedding_cache
+from app.services.inference import inference, CPU_POOL
+from app.services.template_format import VOICE_MODEL
+
+TARGET_SR = 16000
+N_MFCC = 40
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+DELTA_WIDTH = 9
+# soxr quality presets: "HQ" is what librosa.resample uses; "lean" mode trades
+# stop-band attenuation the mel features never see for speed
+EXACT_RESAMPLE_QUALITY = "HQ"
+LEAN_RESAMPLE_QUALITY = "MQ"
+# Frames decoded per block: ~1.4 s at 48 kHz, so peak memory no longer grows
+# with the length of the recording
+BLOCK_FRAMES = 65536
+
+
+@functools.lru_cache(maxsize=8)
+def _mel_basis(sr: int) -> np.ndarray:
+    return librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=1)
+def _window() -> np.ndarray:
+    return scipy.signal.get_window("hann", N_FFT, fftbins=True).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=1)
+def _dct_matrix() -> np.ndarray:
+    """(N_MFCC, N_MELS) matrix of the orthonormal type-II DCT, truncated."""
+    return scipy.fftpack.dct(np.eye(N_MELS), type=2, norm="ortho", axis=0)[:N_MFCC].astype(np.float32)
+
+
+@functools.lru_cache(maxsize=2)
+def _delta_edge_weights(order: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Time-mean of librosa.feature.delta(x, order=order) as a linear function of
+    x. The interior Savitzky-Golay kernel sums to zero, so the weights vanish
+    except on the first and last DELTA_WIDTH frames and the mean only needs
+    those frames.
+    """
+    probe = 4 * DELTA_WIDTH
+    weights = scipy.signal.savgol_filter(
+        np.eye(probe), DELTA_WIDTH, polyorder=order, deriv=order, axis=0, mode="interp"
+    ).sum(axis=0)
+    return weights[:DELTA_WIDTH].astype(np.float32), weights[-DELTA_WIDTH:].astype(np.float32)
+
+
+def _resampler(sr: int, lean: bool):
+    if sr == TARGET_SR:
+        return None
+    quality = LEAN_RESAMPLE_QUALITY if lean else EXACT_RESAMPLE_QUALITY
+    return soxr.ResampleStream(sr, TARGET_SR, 1, dtype="float32", quality=quality)
+
+
+class _MelStream:
+    """
+    Incremental mel power spectrogram, frame-for-frame identical to
+    librosa.feature.melspectrogram(center=True, pad_mode="constant"): samples
+    are pushed in arbitrary chunks and only the unconsumed tail is kept.
+    """
+
+    def __init__(self, sr: int):
+        self.mel_basis = _mel_basis(sr)
+        self.window = _window()
+        self.tail = np.zeros(N_FFT // 2, dtype=np.float32)  # centre padding
+        self.columns = []
+
+    def push(self, y: np.ndarray):
+        buf = np.concatenate([self.tail, y]) if len(self.tail) else y
+        if len(buf) >= N_FFT:
+            n = 1 + (len(buf) - N_FFT) // HOP_LENGTH
+            frames = np.lib.stride_tricks.sliding_window_view(buf, N_FFT)[::HOP_LENGTH][:n]
+            # scipy.fft keeps float32 input in single precision (~3x numpy.fft here)
+            spectrum = scipy.fft.rfft(frames * self.window, axis=1)
+            power = spectrum.real ** 2 + spectrum.imag ** 2
+            self.columns.append(self.mel_basis @ power.T.astype(np.float32))
+            buf = buf[n * HOP_LENGTH:]
+        self.tail = np.array(buf, dtype=np.float32)
+
+    def finish(self) -> np.ndarray:
+        self.push(np.zeros(N_FFT // 2, dtype=np.float32))
+        if not self.columns:
+            return np.zeros((N_MELS, 0), dtype=np.float32)
+        return np.concatenate(self.columns, axis=1)
+
+
+def _open(source: bytes | str):
+    return sf.SoundFile(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+
+def _stream_mel(source: bytes | str, lean: bool = False) -> tuple[np.ndarray, int]:
+    """Decodes `source` block by block, resampling to TARGET_SR on the fly."""
+    with _open(source) as f:
+        sr = f.samplerate
+        resampler = _resampler(sr, lean)
+        mel = _MelStream(TARGET_SR)
+        n_in = 0
+        n_out = 0
+        pending = None
+        for block in f.blocks(blocksize=BLOCK_FRAMES, dtype="float32", always_2d=True):
+            mono = block[:, 0] if block.shape[1] == 1 else np.mean(block, axis=1).astype(np.float32)
+            n_in += len(mono)
+            out = resampler.resample_chunk(mono) if resampler is not None else mono
+            # Hold back the newest output so the total can be fixed up at the end
+            if pending is not None and len(pending):
+                mel.push(pending)
+                n_out += len(pending)
+            pending = out
+        if resampler is not None:
+            flushed = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            pending = flushed if pending is None else np.concatenate([pending, flushed])
+        if pending is None:
+            pending = np.zeros(0, dtype=np.float32)
+        # Same output length as librosa.resample(fix=True)
+        expected = int(np.ceil(n_in * TARGET_SR / sr)) if resampler is not None else n_in
+        missing = expected - (n_out + len(pending))
+        if missing > 0:
+            pending = np.concatenate([pending, np.zeros(missing, dtype=np.float32)])
+        elif missing < 0:
+            pending = pending[:max(0, len(pending) + missing)]
+        mel.push(pending)
+    return mel.finish(), n_in
+
+
+def _trim_silence(mel: np.ndarray, top_db: float) -> np.ndarray:
+    """Drops leading/trailing frames more than `top_db` below the loudest one."""
+    if mel.shape[1] == 0:
+        return mel
+    energy = 10.0 * np.log10(np.maximum(mel.sum(axis=0), 1e-10))
+    voiced = np.flatnonzero(energy > energy.max() - top_db)
+    return mel[:, voiced[0]:voiced[-1] + 1]
+
+
+def _mfcc_means(log_mel: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Time means of MFCC, delta and delta-delta without materialising the deltas."""
+    frames = log_mel.shape[1]
+    dct = _dct_matrix()
+    if frames < 2 * DELTA_WIDTH:
+        mfcc = dct @ log_mel
+        return mfcc.mean(axis=1), librosa.feature.delta(mfcc).mean(axis=1), \
+            librosa.feature.delta(mfcc, order=2).mean(axis=1)
+    head = dct @ log_mel[:, :DELTA_WIDTH]
+    tail = dct @ log_mel[:, -DELTA_WIDTH:]
+    means = [dct @ log_mel.mean(axis=1)]
+    for order in (1, 2):
+        head_w, tail_w = _delta_edge_weights(order)
+        means.append((head @ head_w + tail @ tail_w) / frames)
+    return tuple(means)
+
+
+def _embedding_from_mel(mel: np.ndarray, lean: bool = False) -> list[float] | None:
+    try:
+        log_mel = librosa.power_to_db(mel)
+        if log_mel.shape[1] < DELTA_WIDTH:
+            return None
+        if lean:
+            v1, v2, v3 = _mfcc_means(log_mel)
+        else:
+            mfcc = scipy.fftpack.dct(log_mel, axis=0, type=2, norm="ortho")[:N_MFCC]
+            v1 = mfcc.mean(axis=1)
+            v2 = librosa.feature.delta(mfcc).mean(axis=1)
+            v3 = librosa.feature.delta(mfcc, order=2).mean(axis=1)
+        vec = np.concatenate([v1, v2, v3]).astype(np.float32)
+    except Exception:
+        return None
+    norm = float(np.linalg.norm(vec))
+    if norm > 1e-8:
+        vec = vec / norm
+    return vec.tolist()
+
+
+def compute_embedding(audio: bytes | str, mode: str | None = None) -> list[float] | None:
+    """
+    MFCC(40) + delta + delta-delta means, L2-normalised (120 values).
+    `audio` is the encoded payload or a path to it; it is decoded and
+    resampled in blocks so long recordings never sit in memory at once.
+
+    mode "exact" reproduces the librosa pipeline; "lean" (VOICE_FEATURE_MODE)
+    resamples at a lower soxr quality and derives the delta means from the
+    edge frames only.
+    """
+    lean = (mode or settings.VOICE_FEATURE_MODE) == "lean"
+    if not audio:
+        return None
+    try:
+        mel, n_samples = _stream_mel(audio, lean)
+    except Exception:
+        return None
+    if n_samples == 0:
+        return None
+    if settings.VOICE_VAD_ENABLED:
+        mel = _trim_silence(mel, settings.VOICE_VAD_TOP_DB)
+    return _embedding_from_mel(mel, lean)
+
+
+def _pipeline() -> str:
+    """Embedding cache namespace: everything that changes the voice vector for the same bytes."""
+    vad = f"vad{settings.VOICE_VAD_TOP_DB:g}" if settings.VOICE_VAD_ENABLED else "novad"
+    return f"{VOICE_MODEL}:{settings.VOICE_FEATURE_MODE}:{vad}"
+
+
+async def embed_voice(source: bytes | str, digest: bytes | None = None) -> list[float] | None:
+    """
+    Async entry point used by the endpoints: compute_embedding on the CPU
+    pool, answered from the embedding cache when `digest` (the content hash
+    of the upload, see SpooledUpload.digest) has been seen before.
+    """
+    if digest is None or not embedding_cache.enabled:
+        return await inference.run(CPU_POOL, compute_embedding, source)
+    pipeline = _pipeline()
+    cached = embedding_cache.get("voice", pipeline, digest)
+    if cached is not None:
+        return cached[0]
+    vector = await inference.run(CPU_POOL, compute_embedding, source)
+    if vector is not None:
+        embedding_cache.put("voice", pipeline, digest, vector, VOICE_MODEL)
+    return vector
+
 
-def compute_embedding(audio_bytes: bytes) -> list[float] | None:
+def compute_embedding_librosa(audio_bytes: bytes) -> list[float] | None:
+    """Original whole-buffer librosa implementation, kept as the reference."""
     if not audio_bytes:
         return None
     try:
@@ -14,14 +244,14 @@ def compute_embedding(audio_bytes: bytes) -> list[float] | None:
         return None
     if np.ndim(data) > 1:
         data = np.mean(data, axis=1).astype(np.float32)
-    target_sr = 16000
+    target_sr = TARGET_SR
     try:
         y = librosa.resample(data, orig_sr=sr, target_sr=target_sr)
     except Exception:
         y = data
         target_sr = sr
     try:
-        mfcc = librosa.feature.mfcc(y=y, sr=target_sr, n_mfcc=40)
+        mfcc = librosa.feature.mfcc(y=y, sr=target_sr, n_mfcc=N_MFCC)
         d1 = librosa.feature.delta(mfcc)
         d2 = librosa.feature.delta(mfcc, order=2)
         v1 = np.mean(mfcc, axis=1)
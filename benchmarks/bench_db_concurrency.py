@@ -0,0 +1,159 @@
+"""
+Database throughput under concurrent async requests.
+
+Each simulated request reads a user's newest template row and inserts one
+verification event, as the verification endpoints do. Compared:
+
+- sync:  the previous setup, a sync Session used directly from coroutines
+         (rollback journal, every query blocks the event loop). No await is
+         placed inside the sync request: a checked-out connection held across
+         an await exhausts the pool and blocks the loop until pool_timeout.
+- sync+wal: the same with the WAL/synchronous pragmas now applied on connect
+- async: AsyncSession on the aiosqlite engine with WAL (current endpoints)
+
+Besides ops/s it reports event-loop lag (how late a 5 ms ticker fires), which
+is what every other request on the worker feels while the loop is blocked.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_db_concurrency --concurrency 32 --requests 2000
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.session import _apply_sqlite_pragmas, _engine_kwargs
+from app.models import biometric_data, exam_session, user, verification_event  # noqa: F401
+from app.models.biometric_data import BiometricData, BiometricType
+from app.models.verification_event import VerificationEvent, VerificationPhase
+
+USERS = 200
+
+
+def _seed(url: str):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([
+            BiometricData(user_id=u, modality=BiometricType.FACE, encrypted_descriptor=os.urandom(2800),
+                          created_at=datetime.datetime.now(), device_info="bench")
+            for u in range(1, USERS + 1)
+        ])
+        db.commit()
+    engine.dispose()
+
+
+def _template_query(user_id: int):
+    return select(BiometricData.encrypted_descriptor).where(
+        BiometricData.user_id == user_id, BiometricData.modality == BiometricType.FACE
+    ).order_by(BiometricData.id.desc()).limit(1)
+
+
+def _event(user_id: int) -> VerificationEvent:
+    return VerificationEvent(
+        session_id=1, user_id=user_id, modality=BiometricType.FACE, phase=VerificationPhase.START,
+        match=True, score=0.9, threshold=0.3, metric="cosine", mock_used=False,
+        created_at=datetime.datetime.now()
+    )
+
+
+async def _ticker(lags: list, stop: asyncio.Event, interval: float = 0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def _drive(request, concurrency: int, total: int):
+    lags, stop = [], asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    sem = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            try:
+                await request(i % USERS + 1)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    lags = np.array(lags or [0.0]) * 1000
+    return total / elapsed, float(np.percentile(lags, 99)), float(lags.max()), errors
+
+
+async def bench_sync(url: str, wal: bool, concurrency: int, total: int):
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    if wal:
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    Session = sessionmaker(bind=engine)
+
+    async def request(user_id):
+        db = Session()
+        try:
+            db.execute(_template_query(user_id)).scalar()
+            db.add(_event(user_id))
+            db.commit()
+        finally:
+            db.close()
+
+    try:
+        return await _drive(request, concurrency, total)
+    finally:
+        engine.dispose()
+
+
+async def bench_async(url: str, concurrency: int, total: int):
+    async_url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    engine = create_async_engine(async_url, **_engine_kwargs(async_url))
+    event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def request(user_id):
+        async with Session() as db:
+            (await db.execute(_template_query(user_id))).scalar()
+            db.add(_event(user_id))
+            await db.commit()
+
+    try:
+        return await _drive(request, concurrency, total)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent")
+    print(f"{'mode':<10} {'req/s':>8} {'loop lag p99 ms':>16} {'max ms':>8} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("sync", "sync+wal", "async"):
+            url = f"sqlite:///{os.path.join(tmp, mode.replace('+', '_'))}.db"
+            _seed(url)
+            if mode == "async":
+                result = asyncio.run(bench_async(url, args.concurrency, args.requests))
+            else:
+                result = asyncio.run(bench_sync(url, mode == "sync+wal", args.concurrency, args.requests))
+            rate, lag_p99, lag_max, errors = result
+            print(f"{mode:<10} {rate:>8.0f} {lag_p99:>16.1f} {lag_max:>8.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
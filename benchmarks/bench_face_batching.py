@@ -0,0 +1,105 @@
+"""
+Face embedding throughput vs. batch size on CPU.
+
+Part 1 times raw forward passes of the resident face model at several batch
+sizes. Part 2 drives the async micro-batcher with N concurrent requests and
+reports end-to-end throughput and the batch sizes it actually formed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_face_batching
+    FACE_MODEL_BACKEND=onnx FACE_ONNX_MODEL_PATH=models/vgg_face.onnx python -m benchmarks.bench_face_batching
+"""
+import argparse
+import asyncio
+import time
+
+import cv2
+import numpy as np
+
+from app.services.face_embedding import FaceBatcher, embed_face
+from app.services import face_embedding
+from app.services.embedding_cache import embedding_cache
+from app.services.inference import inference
+from app.services.model_registry import face_models
+
+
+def synthetic_jpeg(seed: int, size=(480, 640)) -> bytes:
+    rng = np.random.default_rng(seed)
+    img = np.full((*size, 3), 200, dtype=np.uint8)
+    cv2.circle(img, (size[1] // 2, size[0] // 2), min(size) // 4, (90, 120, 180), -1)
+    img = (img + rng.integers(0, 20, img.shape)).astype(np.uint8)
+    ok, buf = cv2.imencode(".jpg", img)
+    return buf.tobytes()
+
+
+def bench_forward(batch_sizes, repeats):
+    h, w = face_models.input_size
+    print(f"\nForward pass ({face_models.model_name}, {face_models.backend})")
+    print(f"{'batch':>6} {'ms/batch':>10} {'ms/img':>8} {'img/s':>8}")
+    for size in batch_sizes:
+        batch = np.random.default_rng(size).random((size, h, w, 3), dtype=np.float32)
+        face_models.embed(batch)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            face_models.embed(batch)
+        elapsed = (time.perf_counter() - started) / repeats
+        print(f"{size:>6} {elapsed * 1000:>10.1f} {elapsed / size * 1000:>8.2f} {size / elapsed:>8.1f}")
+
+
+async def bench_batcher(batch_sizes, concurrency, requests, max_wait_ms):
+    images = [synthetic_jpeg(i) for i in range(16)]
+    # Repeated images would otherwise be answered by the embedding cache and never reach the batcher
+    cache_entries, embedding_cache.max_entries = embedding_cache.max_entries, 0
+    try:
+        await _bench_batcher(images, batch_sizes, concurrency, requests, max_wait_ms)
+    finally:
+        embedding_cache.max_entries = cache_entries
+
+
+async def _bench_batcher(images, batch_sizes, concurrency, requests, max_wait_ms):
+    print(f"\nMicro-batcher ({concurrency} concurrent clients, {requests} requests, max_wait={max_wait_ms}ms)")
+    print(f"{'max_batch':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>10}")
+    for size in batch_sizes:
+        face_embedding.face_batcher = FaceBatcher(size, max_wait_ms)
+        latencies = []
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                await embed_face(images[i % len(images)])
+                latencies.append(time.perf_counter() - t0)
+
+        await asyncio.gather(*(one(i) for i in range(min(concurrency, requests))))
+        latencies.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        stats = face_embedding.face_batcher.stats()
+        face_embedding.face_batcher.close()
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{size:>9} {requests / elapsed:>8.1f} {p50:>8.1f} {p99:>8.1f} {stats['avg_batch_size']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",")]
+
+    face_models.load_and_warmup()
+    if face_models.state != "ready":
+        raise SystemExit(f"No face model available ({face_models.status()}); set FACE_MODEL_BACKEND")
+    try:
+        bench_forward(batch_sizes, args.repeats)
+        asyncio.run(bench_batcher(batch_sizes, args.concurrency, args.requests, args.max_wait_ms))
+    finally:
+        inference.shutdown()
+
+
+if __name__ == "__main__":
+    main()
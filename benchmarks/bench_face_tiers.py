@@ -0,0 +1,79 @@
+"""
+Face pipeline tiers (FACE_PIPELINE_TIERS): latency of each tier and how its
+probes score against templates enrolled with the first tier.
+
+Every identity is enrolled once with the first tier, from a clean 640x480
+capture. Each tier then embeds fresh captures (new sensor noise, the face
+shifted a little) of the same identity (genuine) and of another identity
+(impostor). The scores are cosine similarities, as the verification
+endpoints compute them. A tier is a safe fallback if it is faster and
+keeps genuine and impostor scores on the correct sides of
+FACE_COSINE_THRESHOLD.
+
+Only a run with the real face model (FACE_MODEL_BACKEND, loaded here) says
+anything about accuracy. Without it every tier falls back to ORB, whose
+scores on drawn faces do not separate identities; the script still runs,
+for latency, but says so.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_face_tiers
+    python -m benchmarks.bench_face_tiers --identities 20 --captures 5
+    FACE_MODEL_BACKEND=onnx FACE_ONNX_MODEL_PATH=models/vgg_face.onnx python -m benchmarks.bench_face_tiers
+"""
+import argparse
+import statistics
+import time
+
+from app.core.config import settings
+from app.services.face_detection import face_detector
+from app.services.face_embedding import compute_tagged_embedding
+from app.services.face_tiers import face_tiers
+from app.services.model_registry import face_models
+from app.services.scoring import cosine_scores
+from benchmarks.common import face_jpeg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--identities", type=int, default=10)
+    parser.add_argument("--captures", type=int, default=3, help="probes per identity and tier")
+    args = parser.parse_args()
+
+    face_detector.load()
+    face_models.load_and_warmup()
+    reference = face_tiers.default
+    templates = [compute_tagged_embedding(face_jpeg(i), reference) for i in range(args.identities)]
+    probes = [
+        (i, face_jpeg(i, offset=(8 * (c % 3) - 8, 4 * c), noise_seed=10_000 + i * args.captures + c))
+        for i in range(args.identities) for c in range(args.captures)
+    ]
+    threshold = settings.FACE_COSINE_THRESHOLD
+
+    print(f"{args.identities} identities x {args.captures} captures, templates from tier '{reference.name}', "
+          f"threshold={threshold}, face model {face_models.model_name} ({face_models.state})")
+    if face_models.state != "ready":
+        print("The face model is not loaded: every tier uses ORB, so FRR/FAR below do not measure model accuracy")
+    print(f"{'tier':>10} {'key':>20} {'budget':>7} {'p50 ms':>7} {'p95 ms':>7} {'model':>8} "
+          f"{'genuine':>8} {'impostor':>9} {'FRR%':>5} {'FAR%':>5}")
+    for tier in face_tiers.tiers:
+        compute_tagged_embedding(probes[0][1], tier)
+        ms, genuine, impostor, models = [], [], [], set()
+        for identity, image in probes:
+            started = time.perf_counter()
+            vector, model = compute_tagged_embedding(image, tier)
+            ms.append((time.perf_counter() - started) * 1000)
+            models.add(model)
+            own, other = templates[identity], templates[(identity + 1) % args.identities]
+            for template, scores in ((own, genuine), (other, impostor)):
+                comparable = template[1] == model and len(template[0]) == len(vector)
+                scores.append(float(cosine_scores(vector, template[0])[0]) if comparable else 0.0)
+        ms.sort()
+        print(f"{tier.name:>10} {tier.key:>20} {tier.budget_ms:>7.0f} {ms[len(ms) // 2]:>7.2f} "
+              f"{ms[min(len(ms) - 1, int(len(ms) * 0.95))]:>7.2f} {','.join(sorted(models)):>8} "
+              f"{statistics.mean(genuine):>8.3f} {statistics.mean(impostor):>9.3f} "
+              f"{100 * statistics.mean(s < threshold for s in genuine):>5.0f} "
+              f"{100 * statistics.mean(s >= threshold for s in impostor):>5.0f}")
+
+
+if __name__ == "__main__":
+    main()
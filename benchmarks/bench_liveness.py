@@ -0,0 +1,127 @@
+"""
+Motion liveness: the original full-resolution two-frame check vs. the
+reduced-decode, face-ROI, early-exit sequence engine.
+
+Synthetic 1280x720 JPEG sequences of a drawn (Haar-detectable) face on a
+textured background, with sensor noise. Scenarios:
+
+    static       nothing moves (a photo on a stand)
+    small        the face drifts about 8 px over the capture
+    large        the face drifts about 80 px over the capture
+    background   the face is still, something moves behind it
+
+The frames sample one capture span evenly, as the UI does (five frames over
+one second). The legacy path scores the first and last frame at full
+resolution, the pair the original UI took one second apart; the engine
+scores the whole sequence (whole frame and face ROI). Reports mean
+score, live-decision rate, agreement with the legacy decision, frames decoded
+and latency.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_liveness
+    python -m benchmarks.bench_liveness --frames 8 --trials 40
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.liveness import LivenessEngine, legacy_motion_score
+from benchmarks.common import draw_face
+
+SIZE = (720, 1280)
+FACE = 450
+SCENARIOS = ("static", "small", "large", "background")
+
+
+def background(rng) -> np.ndarray:
+    noise = rng.integers(60, 200, (SIZE[0] // 90, SIZE[1] // 90, 3), dtype=np.uint8)
+    return cv2.resize(noise, (SIZE[1], SIZE[0]), interpolation=cv2.INTER_CUBIC)
+
+
+def sequence(scenario: str, frames: int, seed: int) -> list[bytes]:
+    rng = np.random.default_rng(seed)
+    scene = background(rng)
+    face = draw_face(FACE)
+    drift = {"static": 0, "small": 8, "large": 80, "background": 0}[scenario]
+    fx, fy = (SIZE[1] - FACE) // 2, (SIZE[0] - FACE) // 2
+    out = []
+    for i in range(frames):
+        img = scene.copy()
+        if scenario == "background":
+            x = 40 + i * 240 // max(1, frames - 1)
+            cv2.rectangle(img, (x, 80), (x + 220, 640), (30, 60, 90), -1)
+        x = fx + drift * i // max(1, frames - 1)
+        y = fy + int(rng.integers(-1, 2)) if drift else fy
+        img[y:y + FACE, x:x + FACE] = face
+        img = np.clip(img + rng.normal(0, 3, img.shape), 0, 255).astype(np.uint8)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        out.append(buf.tobytes())
+    return out
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=settings.LIVENESS_MOTION_THRESHOLD)
+    args = parser.parse_args()
+
+    engines = {
+        "frame": LivenessEngine(args.threshold, settings.LIVENESS_MAX_REDUCTION, settings.LIVENESS_MIN_SIDE,
+                                False, settings.LIVENESS_ROI_MARGIN, settings.LIVENESS_EARLY_EXIT_FACTOR),
+        "roi": LivenessEngine(args.threshold, settings.LIVENESS_MAX_REDUCTION, settings.LIVENESS_MIN_SIDE,
+                              True, settings.LIVENESS_ROI_MARGIN, settings.LIVENESS_EARLY_EXIT_FACTOR),
+    }
+    # Warm-up: cascade load, buffer allocation
+    warm = sequence("static", 2, 0)
+    legacy_motion_score(*warm)
+    for engine in engines.values():
+        engine.score(warm)
+
+    print(f"{SIZE[1]}x{SIZE[0]} JPEG, {args.frames} frames/sequence, {args.trials} trials, "
+          f"threshold={args.threshold}, max_reduction={settings.LIVENESS_MAX_REDUCTION}")
+    print(f"{'scenario':>10} {'path':>7} {'score':>7} {'live%':>6} {'agree%':>7} {'frames':>7} {'roi%':>5} "
+          f"{'p50 ms':>7} {'p95 ms':>7}")
+    for scenario in SCENARIOS:
+        rows = {name: {"score": [], "live": [], "agree": [], "frames": [], "roi": [], "ms": []}
+                for name in ("legacy", *engines)}
+        for trial in range(args.trials):
+            frames = sequence(scenario, args.frames, 1000 + trial)
+            score, ms = timed(legacy_motion_score, frames[0], frames[-1])
+            legacy_live = score > args.threshold
+            row = rows["legacy"]
+            row["score"].append(score)
+            row["live"].append(legacy_live)
+            row["agree"].append(True)
+            row["frames"].append(2)
+            row["roi"].append(False)
+            row["ms"].append(ms)
+            for name, engine in engines.items():
+                result, ms = timed(engine.score, frames)
+                row = rows[name]
+                row["score"].append(result.score)
+                row["live"].append(result.live)
+                row["agree"].append(result.live == legacy_live)
+                row["frames"].append(result.frames_used)
+                row["roi"].append(result.roi is not None)
+                row["ms"].append(ms)
+        for name, row in rows.items():
+            ms = sorted(row["ms"])
+            print(f"{scenario:>10} {name:>7} {statistics.mean(row['score']):>7.2f} "
+                  f"{100 * statistics.mean(row['live']):>6.0f} {100 * statistics.mean(row['agree']):>7.0f} "
+                  f"{statistics.mean(row['frames']):>7.1f} {100 * statistics.mean(row['roi']):>5.0f} "
+                  f"{ms[len(ms) // 2]:>7.2f} {ms[min(len(ms) - 1, int(len(ms) * 0.95))]:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
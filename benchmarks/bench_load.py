@@ -0,0 +1,219 @@
+"""
+In-process load test: an exam cohort against the ASGI app (httpx
+ASGITransport, no network, lifespan included) on a throwaway SQLite
+database.
+
+Every simulated student registers, enrolls a face and a voice, passes the
+liveness check, starts a session, verifies face and voice at the start,
+answers `--checks` random multimodal checks, verifies at the end, submits
+and reads the session metrics. Students arrive over `--ramp` seconds, at
+most `--concurrency` at a time. Faces and voices are synthetic and differ
+per student, and every verification sends a fresh capture (new sensor
+noise), so the embedding cache does not answer them. `--warmup` students run
+first, untimed, so worker process start-up and first-call imports are not
+counted.
+
+Like the UI should, the simulated client honours `429 Retry-After` (up to
+MAX_RETRIES times); the step latency then includes the wait. Reported:
+per-step latency (p50/p95/p99), 429 rejections and errors, overall
+requests/s and completed sessions/s, and peak resident memory of the server
+process and of its inference worker processes.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --students 100 --concurrency 25 --checks 3
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+from benchmarks.common import face_jpeg, memory_mb, summarize, synthetic_wav
+
+STEPS = (
+    "register", "enroll_face", "enroll_voice", "liveness", "session_start", "face_start", "voice_start",
+    "random_check", "face_end", "voice_end", "submit", "metrics",
+)
+MAX_RETRIES = 3
+
+
+def prepare_environment(workdir: str):
+    """Points the app at a fresh database and index; must run before anything under `app` is imported."""
+    from cryptography.fernet import Fernet
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["ASYNC_DATABASE_URL"] = ""
+    os.environ["FACE_INDEX_PATH"] = os.path.join(workdir, "face_index.bin")
+    try:
+        Fernet(os.environ.get("ENCRYPTION_KEY", ""))
+    except Exception:
+        os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.rejected = {step: 0 for step in STEPS}
+        self.sessions = 0
+
+    async def call(self, client, step: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        for attempt in range(MAX_RETRIES + 1):
+            response = await client.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt == MAX_RETRIES:
+                break
+            self.rejected[step] += 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+        self.samples[step].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[step] += 1
+        return response
+
+
+def media(index: int, checks: int, voice_seconds: float) -> dict:
+    captures = 2 + checks
+    return {
+        "image": face_jpeg(index),
+        "audio": synthetic_wav(16000, voice_seconds, seed=index),
+        "probes": [face_jpeg(index, noise_seed=100_000 + index * captures + i) for i in range(captures)],
+        "voices": [synthetic_wav(16000, voice_seconds, seed=index, noise_seed=100_000 + index * captures + i)
+                   for i in range(captures)],
+        "frames": [face_jpeg(index, offset=(0, 0)), face_jpeg(index, offset=(48, 16), noise_seed=200_000 + index)],
+    }
+
+
+async def student(client, recorder: Recorder, index: int, checks: int, run: str, data: dict):
+    image, audio, probes, voices, frames = (data[key] for key in ("image", "audio", "probes", "voices", "frames"))
+
+    r = await recorder.call(client, "register", "POST", "/auth/register", json={
+        "email": f"student{index}.{run}@bench.example", "password": "benchmark", "full_name": f"Student {index}",
+    })
+    if r.status_code != 200:
+        return
+    user_id = r.json()["id"]
+    await recorder.call(client, "enroll_face", "POST", "/enroll/face",
+                        files={"file": ("face.jpg", image)}, data={"user_id": user_id})
+    await recorder.call(client, "enroll_voice", "POST", "/enroll/voice",
+                        files={"file": ("voice.wav", audio)}, data={"user_id": user_id})
+    r = await recorder.call(client, "liveness", "POST", "/verify/authenticate/face/liveness",
+                            files=[("frames", (f"f{i}.jpg", frame)) for i, frame in enumerate(frames)])
+    liveness = r.json() if r.status_code == 200 else {}
+    r = await recorder.call(client, "session_start", "POST", "/exam/session/start", data={
+        "user_id": user_id, "duration_minutes": 60,
+        "liveness_ok": str(bool(liveness.get("liveness"))).lower(), "liveness_score": liveness.get("score", 0.0),
+    })
+    if r.status_code != 200:
+        return
+    session = {"user_id": user_id, "session_id": r.json()["session_id"]}
+
+    capture = iter(zip(probes, voices))
+    for phase in ("start", "random", "end"):
+        if phase == "random":
+            for _ in range(checks):
+                probe, voice = next(capture)
+                await recorder.call(client, "random_check", "POST", "/verify/authenticate/multimodal/random",
+                                    files={"face_file": ("face.jpg", probe), "voice_file": ("voice.wav", voice)},
+                                    data=session)
+            continue
+        probe, voice = next(capture)
+        await recorder.call(client, f"face_{phase}", "POST", f"/verify/authenticate/face/{phase}",
+                            files={"file": ("face.jpg", probe)}, data=session)
+        await recorder.call(client, f"voice_{phase}", "POST", f"/verify/authenticate/voice/{phase}",
+                            files={"file": ("voice.wav", voice)}, data=session)
+    r = await recorder.call(client, "submit", "POST", "/exam/session/submit", data=session)
+    await recorder.call(client, "metrics", "GET", f"/exam/metrics/session/{session['session_id']}")
+    if r.status_code == 200:
+        recorder.sessions += 1
+
+
+async def _run(students: int, concurrency: int, ramp: float, checks: int, voice_seconds: float, warmup: int) -> dict:
+    import httpx
+
+    from app.core.config import settings
+    from app.db import migrations
+    from app.db.base import Base
+    from app.db.session import engine
+    from app.main import app
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    recorder = Recorder()
+    # Generated up front: the simulated clients share the event loop (and CPU) with the app
+    cohort = [media(i, checks, voice_seconds) for i in range(students + warmup)]
+    # Repeated runs share the database, so each registers its own accounts
+    run = uuid.uuid4().hex[:8]
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async with app.router.lifespan_context(app):
+        # Unhandled server errors count as 500s instead of aborting the run
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url=f"http://bench{settings.API_V1_STR}",
+                                     timeout=None) as client:
+
+            warm = Recorder()
+            await asyncio.gather(*(student(client, warm, students + i, checks, run, cohort[students + i]) for i in range(warmup)))
+
+            async def arrive(index: int):
+                await asyncio.sleep(ramp * index / max(1, students))
+                async with slots:
+                    await student(client, recorder, index, checks, run, cohort[index])
+
+            started = time.perf_counter()
+            await asyncio.gather(*(arrive(i) for i in range(students)))
+            elapsed = time.perf_counter() - started
+        memory = memory_mb()
+
+    requests = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        "students": students,
+        "elapsed_s": round(elapsed, 2),
+        "requests": requests,
+        "requests_per_s": round(requests / elapsed, 2),
+        "sessions_per_s": round(recorder.sessions / elapsed, 3),
+        "errors": sum(recorder.errors.values()),
+        "rejected": sum(recorder.rejected.values()),
+        **memory,
+        "steps": {
+            step: {**summarize(samples, elapsed), "rejected": recorder.rejected[step], "errors": recorder.errors[step]}
+            for step, samples in recorder.samples.items() if samples
+        },
+    }
+
+
+def run(students: int = 40, concurrency: int = 40, ramp: float = 2.0, checks: int = 2,
+        voice_seconds: float = 3.0, warmup: int = 2) -> dict:
+    return asyncio.run(_run(students, concurrency, ramp, checks, voice_seconds, warmup))
+
+
+def report(results: dict):
+    print(f"{results['students']} students, {results['requests']} requests in {results['elapsed_s']} s: "
+          f"{results['requests_per_s']} req/s, {results['sessions_per_s']} sessions/s, "
+          f"{results['rejected']} rejected (429, retried), {results['errors']} errors")
+    print(f"peak RSS: server {results['rss_peak_mb']} MB, inference workers {results['workers_rss_peak_mb']} MB")
+    print(f"{'step':>14} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'429s':>6} {'errors':>7}")
+    for step, row in results["steps"].items():
+        print(f"{step:>14} {row['count']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+              f"{row['p99_ms']:>9.1f} {row['rejected']:>6} {row['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=40, help="students in an exam at the same time")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which students arrive")
+    parser.add_argument("--checks", type=int, default=2, help="random multimodal checks per session")
+    parser.add_argument("--voice-seconds", type=float, default=3.0)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed students run before the cohort")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench-load-") as workdir:
+        prepare_environment(workdir)
+        report(run(args.students, args.concurrency, args.ramp, args.checks, args.voice_seconds, args.warmup))
+
+
+if __name__ == "__main__":
+    main()
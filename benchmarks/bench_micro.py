@@ -0,0 +1,121 @@
+"""
+Microbenchmarks of the verification hot path on synthetic input:
+
+    face_embedding     face_embedding.compute_embedding on a 640x480 JPEG
+                       (decode, detect, model or ORB, whichever is configured)
+    voice_embedding    voice_embedding.compute_embedding on 5 s of 16 kHz speech
+    compare_face       scoring.compare, one probe vs. one stored face template
+    compare_face_5     the same against five templates (multi-sample enrollment)
+    compare_voice      scoring.compare for a voice probe
+    fuse               scoring.fuse of a face and a voice comparison
+    decode_template    template_format.decode_template (binary float32 blob)
+    decode_legacy      the same for a legacy JSON row
+    decrypt_template   templates.decrypt_template (Fernet + decode)
+    cached_face        what a re-submitted 640x480 JPEG costs instead of
+                       face_embedding: content hash + embedding cache hit
+
+Each operation is timed call by call after a short warm-up; reported are
+p50/p95/p99 and calls per second. `benchmarks.suite` compares the numbers
+with the baseline file.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --repeats 200 --only compare_face decrypt_template
+"""
+import argparse
+import json
+
+import numpy as np
+from cryptography.fernet import Fernet
+
+from app.core.config import settings
+from app.models.biometric_data import BiometricType
+from app.services import face_embedding, voice_embedding
+from app.services.embedding_cache import EmbeddingCache, content_digest
+from app.services.model_registry import face_models
+from app.services.scoring import compare, fuse
+from app.services.template_format import VOICE_MODEL, decode_template, encode_template
+from app.services.templates import decrypt_template, encrypt_template
+from benchmarks.common import face_jpeg, synthetic_wav, time_calls
+
+# Slow operations get fewer calls than the sub-millisecond ones
+SLOW = {"face_embedding": 0.1, "voice_embedding": 0.2}
+
+
+def ensure_encryption_key():
+    try:
+        Fernet(settings.ENCRYPTION_KEY)
+    except Exception:
+        settings.ENCRYPTION_KEY = Fernet.generate_key().decode()
+
+
+def operations() -> dict:
+    ensure_encryption_key()
+    face_models.load_and_warmup()
+    image = face_jpeg(1)
+    audio = synthetic_wav(16000, 5, seed=1)
+
+    face_vector, face_model = face_embedding.compute_tagged_embedding(image)
+    voice_vector = voice_embedding.compute_embedding(audio)
+    rng = np.random.default_rng(0)
+    face_templates = [
+        decode_template(encode_template(np.asarray(face_vector) + rng.normal(0, 0.01, len(face_vector)),
+                                        BiometricType.FACE, face_model, "float32"), BiometricType.FACE)
+        for _ in range(5)
+    ]
+    voice_template = decode_template(encode_template(voice_vector, BiometricType.VOICE, VOICE_MODEL, "float32"),
+                                     BiometricType.VOICE)
+    blob = encode_template(face_vector, BiometricType.FACE, face_model, "float32")
+    legacy = json.dumps([float(v) for v in face_vector]).encode()
+    encrypted = encrypt_template(face_vector, BiometricType.FACE, face_model)
+    face_cmp = compare(face_vector, face_model, face_templates[0])
+    voice_cmp = compare(voice_vector, VOICE_MODEL, voice_template)
+    weights = [settings.FUSION_FACE_WEIGHT, settings.FUSION_VOICE_WEIGHT]
+    cache = EmbeddingCache(16, 3600)
+    cache.put("face", face_model, content_digest(image), face_vector, face_model)
+
+    def cached_face(data: bytes):
+        return cache.get("face", face_model, content_digest(data))
+
+    return {
+        "face_embedding": (face_embedding.compute_embedding, image),
+        "voice_embedding": (voice_embedding.compute_embedding, audio),
+        "compare_face": (compare, face_vector, face_model, face_templates[0]),
+        "compare_face_5": (compare, face_vector, face_model, face_templates),
+        "compare_voice": (compare, voice_vector, VOICE_MODEL, voice_template),
+        "fuse": (fuse, [face_cmp, voice_cmp], weights, settings.FUSION_MODE, settings.FUSION_THRESHOLD),
+        "decode_template": (decode_template, blob, BiometricType.FACE),
+        "decode_legacy": (decode_template, legacy, BiometricType.FACE),
+        "decrypt_template": (decrypt_template, encrypted, BiometricType.FACE),
+        "cached_face": (cached_face, image),
+    }
+
+
+def run(repeats: int = 500, only: list[str] | None = None) -> dict:
+    results = {}
+    for name, (fn, *args) in operations().items():
+        if only and name not in only:
+            continue
+        results[name] = time_calls(fn, *args, repeats=max(5, int(repeats * SLOW.get(name, 1.0))))
+    return results
+
+
+def report(results: dict):
+    print(f"{'operation':>18} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for name, row in results.items():
+        print(f"{name:>18} {row['count']:>6} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} "
+              f"{row['p99_ms']:>9.3f} {row['ops_per_s']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=500)
+    parser.add_argument("--only", nargs="+", help="operations to run (default: all)")
+    args = parser.parse_args()
+    results = run(args.repeats, args.only)
+    print(f"face backend: {face_models.backend or 'none (ORB)'}, voice mode: {settings.VOICE_FEATURE_MODE}")
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
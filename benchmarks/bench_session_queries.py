@@ -0,0 +1,121 @@
+"""
+Session metrics/details latency on a large verification_events table.
+
+Seeds a SQLite database with `--events` rows spread over `--sessions` exam
+sessions, then times, for random sessions, the aggregate query that builds a
+session's metrics rollup (run when the session is not cached) and the first
+session_details page, with AsyncSession on aiosqlite: once without the
+(session_id, id) index and once with it.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_session_queries --events 1000000 --sessions 2000 --queries 200
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.v1.endpoints.exam import session_details
+from app.db.base import Base
+from app.db.session import _apply_sqlite_pragmas, _engine_kwargs
+from app.models import biometric_data, exam_session, user, verification_event  # noqa: F401
+from app.services.session_metrics import SessionMetrics
+
+INDEX = "ix_verification_events_session_id_id"
+
+
+def _seed(path: str, events: int, sessions: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    started = datetime.datetime(2025, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("INSERT INTO users (id, email, hashed_password) VALUES (1, 'bench@example.com', 'x')")
+    conn.executemany(
+        "INSERT INTO exam_sessions (id, user_id, started_at, status, schedule_type) VALUES (?, 1, ?, 'ACTIVE', 'START_END')",
+        [(s, str(started)) for s in range(1, sessions + 1)],
+    )
+    rng = random.Random(0)
+    chunk = 100_000
+    for offset in range(0, events, chunk):
+        # Interleaved sessions, as concurrent exams write them
+        conn.executemany(
+            "INSERT INTO verification_events (session_id, user_id, modality, phase, match, score, threshold, metric, mock_used, created_at) "
+            "VALUES (?, 1, 'FACE', 'RANDOM', ?, ?, 0.3, 'cosine', 0, ?)",
+            [
+                (rng.randint(1, sessions), int(rng.random() > 0.1), rng.random(), str(started + datetime.timedelta(seconds=i)))
+                for i in range(offset, min(events, offset + chunk))
+            ],
+        )
+    conn.commit()
+    conn.close()
+
+
+def _set_index(path: str, enabled: bool):
+    conn = sqlite3.connect(path)
+    if enabled:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {INDEX} ON verification_events (session_id, id)")
+    else:
+        conn.execute(f"DROP INDEX IF EXISTS {INDEX}")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+async def _bench(path: str, sessions: int, queries: int) -> dict:
+    url = f"sqlite+aiosqlite:///{path}"
+    engine = create_async_engine(url, **_engine_kwargs(url))
+    event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    rng = random.Random(1)
+    results = {}
+    try:
+        details_args = {"after_id": 0, "limit": None, "fields": None, "modality": None, "phase": None, "format": "json"}
+        for name, call in (
+            ("metrics", SessionMetrics._load),
+            ("details", lambda session_id, db: session_details(session_id, db=db, **details_args)),
+        ):
+            timings = []
+            for _ in range(queries):
+                async with Session() as db:
+                    started = time.perf_counter()
+                    await call(rng.randint(1, sessions), db)
+                    timings.append(time.perf_counter() - started)
+            results[name] = np.array(timings) * 1000
+    finally:
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        started = time.perf_counter()
+        _seed(path, args.events, args.sessions)
+        print(f"Seeded {args.events} events over {args.sessions} sessions in {time.perf_counter() - started:.1f}s")
+        print(f"{'index':<10} {'query':<8} {'p50 ms':>8} {'p95 ms':>8}")
+        for enabled in (False, True):
+            _set_index(path, enabled)
+            for name, timings in asyncio.run(_bench(path, args.sessions, args.queries)).items():
+                label = "on" if enabled else "off"
+                print(f"{label:<10} {name:<8} {np.percentile(timings, 50):>8.1f} {np.percentile(timings, 95):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
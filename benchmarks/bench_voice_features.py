@@ -0,0 +1,58 @@
+"""
+Voice feature extraction: latency and embedding agreement.
+
+Compares the original whole-buffer librosa pipeline with the streaming
+extractor in "exact" and "lean" mode on synthetic speech-like recordings at
+common sample rates (or on the files given with --file). Agreement is the
+cosine similarity with the librosa embedding.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_voice_features
+    python -m benchmarks.bench_voice_features --file sample.wav --repeats 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.voice_embedding import compute_embedding, compute_embedding_librosa
+from benchmarks.common import synthetic_wav
+
+
+def timed(fn, payload, repeats):
+    result = fn(payload)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn(payload)
+    return result, (time.perf_counter() - started) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", action="append", default=[], help="audio file to use instead of synthetic input")
+    parser.add_argument("--rates", type=int, nargs="+", default=[8000, 16000, 44100, 48000])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[3, 10, 30])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.file:
+        cases = [(path, open(path, "rb").read()) for path in args.file]
+    else:
+        cases = [
+            (f"{rate / 1000:g} kHz {seconds:g} s", synthetic_wav(rate, seconds))
+            for rate in args.rates for seconds in args.seconds
+        ]
+
+    print(f"{'input':<18} {'librosa ms':>10} {'exact ms':>9} {'lean ms':>8} {'speedup':>8} {'cos exact':>10} {'cos lean':>9}")
+    for name, payload in cases:
+        reference, t_ref = timed(compute_embedding_librosa, payload, args.repeats)
+        exact, t_exact = timed(lambda p: compute_embedding(p, mode="exact"), payload, args.repeats)
+        lean, t_lean = timed(lambda p: compute_embedding(p, mode="lean"), payload, args.repeats)
+        cos_exact = float(np.dot(reference, exact))
+        cos_lean = float(np.dot(reference, lean))
+        print(f"{name:<18} {t_ref:>10.1f} {t_exact:>9.1f} {t_lean:>8.1f} {t_ref / t_lean:>7.1f}x "
+              f"{cos_exact:>10.6f} {cos_lean:>9.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Memory per API worker: `--workers` processes that each load the face model
+(what `gunicorn -w N` does without a sidecar) vs. the same workers sharing
+one face model sidecar over a Unix socket (FACE_MODEL_SIDECAR_SOCKET).
+
+Each worker imports the app, loads the face model (or connects to the
+sidecar), warms it up and embeds single crops for `--repeats` calls. The
+memory of every process is then read from /proc/<pid>/smaps_rollup. PSS
+splits shared pages between the processes that share them, so PSS totals add
+up to what the deployment really uses. USS is what a process alone holds.
+
+The ONNX backend is used with `--onnx PATH`. Without it, a synthetic model
+is built with the `onnx` package: the embedding is one MatMul whose weights
+take `--model-mb` (VGG-Face weighs about 580 MB). The embed latency column
+shows the cost of the socket round trip.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_workers
+    python -m benchmarks.bench_workers --workers 4 --model-mb 512
+    python -m benchmarks.bench_workers --onnx models/vgg_face.onnx
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import process_memory_mb, summarize
+
+INPUT = (224, 224, 3)
+
+
+def synthetic_model(path: str, megabytes: int):
+    """NHWC crops -> flatten -> one dense layer whose weights take about `megabytes`."""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    features = int(np.prod(INPUT))
+    dim = max(1, megabytes * 2**20 // (features * 4))
+    weights = np.random.default_rng(0).standard_normal((features, dim), dtype=np.float32)
+    graph = helper.make_graph(
+        [
+            helper.make_node("Reshape", ["input", "flat_shape"], ["flat"]),
+            helper.make_node("MatMul", ["flat", "weights"], ["embedding"]),
+        ],
+        "synthetic_face",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", *INPUT])],
+        [helper.make_tensor_value_info("embedding", TensorProto.FLOAT, ["N", dim])],
+        [numpy_helper.from_array(np.array([-1, features], np.int64), "flat_shape"),
+         numpy_helper.from_array(weights, "weights")],
+    )
+    # IR version 7 (opset 13) loads in every onnxruntime the app supports
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=7)
+    onnx.save(model, path)
+
+
+def _worker(env: dict, repeats: int, conn):
+    # Spawned: the environment is in place before anything under `app` is imported
+    os.environ.update(env)
+    import app.main  # noqa: F401  (everything a gunicorn worker imports)
+    from app.services.model_registry import face_models
+
+    face_models.load_and_warmup()
+    if face_models.state != "ready":
+        conn.send({"state": face_models.state, "error": face_models.error})
+        conn.recv()
+        return
+    crop = np.random.default_rng(1).random((1, *face_models.input_size, 3), dtype=np.float32)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        face_models.embed(crop)
+        samples.append(time.perf_counter() - started)
+    conn.send({"state": face_models.state, "backend": face_models.backend, **summarize(samples)})
+    conn.recv()
+
+
+def _run_mode(mode: str, workers: int, repeats: int, env: dict, socket_path: str) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    sidecar = None
+    if mode == "sidecar":
+        env = {**env, "FACE_MODEL_SIDECAR_SOCKET": socket_path}
+        sidecar = subprocess.Popen([sys.executable, "-m", "app.scripts.model_sidecar", "--socket", socket_path],
+                                   env={**os.environ, **env}, stderr=subprocess.DEVNULL)
+    procs = []
+    try:
+        for _ in range(workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, args=(env, repeats, child))
+            proc.start()
+            procs.append((proc, parent))
+        reports = [parent.recv() for _, parent in procs]
+        failed = [r for r in reports if r["state"] != "ready"]
+        if failed:
+            raise SystemExit(f"{mode}: face model not loaded ({failed[0]['state']}): {failed[0].get('error')}")
+        memory = [process_memory_mb(proc.pid) for proc, _ in procs]
+        sidecar_memory = process_memory_mb(sidecar.pid) if sidecar is not None else None
+    finally:
+        for proc, parent in procs:
+            try:
+                parent.send("done")
+            except OSError:
+                pass
+            proc.join(10)
+        if sidecar is not None:
+            sidecar.terminate()
+            sidecar.wait(10)
+    processes = memory + ([sidecar_memory] if sidecar_memory else [])
+    return {
+        "state": reports[0]["state"],
+        "backend": reports[0]["backend"],
+        "embed_p50_ms": float(np.median([r["p50_ms"] for r in reports])),
+        "worker_pss_mb": round(float(np.mean([m["pss_mb"] for m in memory])), 1),
+        "worker_uss_mb": round(float(np.mean([m["uss_mb"] for m in memory])), 1),
+        "sidecar_pss_mb": sidecar_memory["pss_mb"] if sidecar_memory else None,
+        "total_pss_mb": round(sum(m["pss_mb"] for m in processes), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--model-mb", type=int, default=256, help="weights of the synthetic model")
+    parser.add_argument("--onnx", help="use this ONNX face model instead of a synthetic one")
+    parser.add_argument("--repeats", type=int, default=20, help="embed calls per worker")
+    args = parser.parse_args()
+
+    from benchmarks.bench_load import prepare_environment
+
+    with tempfile.TemporaryDirectory(prefix="bench-workers-") as workdir:
+        prepare_environment(workdir)
+        model_path = args.onnx
+        if model_path is None:
+            model_path = os.path.join(workdir, "synthetic_face.onnx")
+            synthetic_model(model_path, args.model_mb)
+        env = {
+            "FACE_MODEL_BACKEND": "onnx",
+            "FACE_ONNX_MODEL_PATH": os.path.abspath(model_path),
+            "FACE_MODEL_SIDECAR_SOCKET": "",
+        }
+        size_mb = os.path.getsize(model_path) / 2**20
+        print(f"{args.workers} workers, ONNX model {size_mb:.0f} MB ({'synthetic' if args.onnx is None else model_path})")
+        print(f"{'mode':>10} {'state':>7} {'embed p50 ms':>13} {'worker PSS':>11} {'worker USS':>11} "
+              f"{'sidecar PSS':>12} {'total PSS':>10}")
+        for mode in ("in-process", "sidecar"):
+            row = _run_mode(mode, args.workers, args.repeats, env, os.path.join(workdir, "face-model.sock"))
+            sidecar = f"{row['sidecar_pss_mb']:.1f}" if row["sidecar_pss_mb"] is not None else "-"
+            print(f"{mode:>10} {row['state']:>7} {row['embed_p50_ms']:>13.2f} {row['worker_pss_mb']:>11.1f} "
+                  f"{row['worker_uss_mb']:>11.1f} {sidecar:>12} {row['total_pss_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
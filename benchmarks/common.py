@@ -0,0 +1,229 @@
+"""
+Helpers shared by the benchmarks: synthetic faces and speech, latency
+summaries, process memory, and the baseline file used by benchmarks.suite.
+"""
+import io
+import json
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+import soundfile as sf
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def draw_face(size: int, seed: int | None = None) -> np.ndarray:
+    """A Haar-detectable drawn face; `seed` varies proportions and tone per identity."""
+    rng = np.random.default_rng(seed)
+    jitter = (lambda spread: 1.0 + rng.uniform(-spread, spread)) if seed is not None else (lambda spread: 1.0)
+    img = np.full((size, size, 3), 230, np.uint8)
+    c, r = size // 2, size // 4
+    skin = tuple(int(v * jitter(0.1)) for v in (150, 170, 200))
+    cv2.ellipse(img, (c, c), (int(r * 0.8 * jitter(0.05)), r), 0, 0, 360, skin, -1)
+    eye_dx, mouth_w = int(r // 3 * jitter(0.15)), int(r // 3 * jitter(0.2))
+    for dx in (-1, 1):
+        cv2.ellipse(img, (c + dx * eye_dx, c - r // 4), (r // 7, r // 14), 0, 0, 360, (40, 40, 40), -1)
+        cv2.line(img, (c + dx * eye_dx - r // 6, c - r // 2 + 8), (c + dx * eye_dx + r // 6, c - r // 2 + 8),
+                 (60, 60, 60), max(2, r // 25))
+    cv2.line(img, (c, c - r // 8), (c, c + r // 6), (110, 120, 150), max(2, r // 30))
+    cv2.ellipse(img, (c, c + r // 2), (mouth_w, r // 10), 0, 0, 180, (60, 60, 120), -1)
+    return cv2.GaussianBlur(img, (5, 5), 0)
+
+
+def face_jpeg(seed: int, size=(480, 640), offset=(0, 0), noise_seed: int | None = None) -> bytes:
+    """A webcam-like frame of identity `seed`, the face shifted by `offset` (x, y) pixels."""
+    rng = np.random.default_rng(noise_seed if noise_seed is not None else seed)
+    face_size = min(size) * 3 // 4
+    img = np.full((*size, 3), 200, np.uint8)
+    x = (size[1] - face_size) // 2 + offset[0]
+    y = (size[0] - face_size) // 2 + offset[1]
+    img[y:y + face_size, x:x + face_size] = draw_face(face_size, seed)
+    img = np.clip(img + rng.normal(0, 3, img.shape), 0, 255).astype(np.uint8)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buf.tobytes()
+
+
+def synthetic_wav(sr: int, seconds: float, seed: int = 0, noise_seed: int | None = None) -> bytes:
+    """Voiced segments (harmonics of a gliding pitch) separated by pauses; `seed` sets the speaker."""
+    rng = np.random.default_rng(noise_seed if noise_seed is not None else seed)
+    t = np.arange(int(sr * seconds)) / sr
+    base = 140 + 10 * (seed % 7)
+    pitch = base + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sr
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = (np.sin(2 * np.pi * 1.5 * t) > -0.3).astype(np.float64)
+    y = 0.2 * voiced * envelope + 0.01 * rng.standard_normal(len(t))
+    buf = io.BytesIO()
+    sf.write(buf, y.astype(np.float32), sr, format="WAV")
+    return buf.getvalue()
+
+
+def summarize(samples: list[float], elapsed: float | None = None) -> dict:
+    """p50/p95/p99 (ms) of per-call durations in seconds, plus calls per second."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    total = elapsed if elapsed is not None else float(np.sum(samples))
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "ops_per_s": round(len(samples) / total, 2) if total > 0 else None,
+    }
+
+
+def time_calls(fn, *args, repeats: int, warmup: int = 3) -> dict:
+    for _ in range(warmup):
+        fn(*args)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _status_kb(pid, field: str) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _child_pids() -> list[int]:
+    pids = []
+    try:
+        for task in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{task}/children") as fh:
+                pids.extend(int(pid) for pid in fh.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+def memory_mb() -> dict:
+    """Peak resident memory of this process and of its live children (worker pools), Linux only."""
+    main = _status_kb("self", "VmHWM")
+    children = [kb for kb in (_status_kb(pid, "VmHWM") for pid in _child_pids()) if kb is not None]
+    return {
+        "rss_peak_mb": round(main / 1024, 1) if main is not None else None,
+        "workers_rss_peak_mb": round(sum(children) / 1024, 1) if children else None,
+    }
+
+
+def process_memory_mb(pid) -> dict:
+    """
+    Resident (RSS), proportional (PSS: shared pages split between their users)
+    and unique (USS) memory of one process, from /proc/<pid>/smaps_rollup (Linux).
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fh:
+            for line in fh:
+                name, _, rest = line.partition(":")
+                if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    fields[name] = int(rest.split()[0])
+    except OSError:
+        return {"rss_mb": None, "pss_mb": None, "uss_mb": None}
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+    }
+
+
+def machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def median(runs: list[dict]) -> dict:
+    """Per-key median of several result trees of the same shape."""
+    merged = {}
+    for key, value in runs[0].items():
+        values = [run[key] for run in runs if key in run]
+        if isinstance(value, dict):
+            merged[key] = median(values)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and None not in values:
+            middle = float(np.median(values))
+            merged[key] = round(middle) if all(isinstance(v, int) for v in values) else round(middle, 3)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _direction(key: str) -> int:
+    """
+    +1 if larger is worse, -1 if smaller is worse, 0 if not compared. Tail
+    percentiles are reported but not compared: on shared machines they move
+    far more between runs than the median does. Per-operation ops/s only
+    restates the latency, so throughput is compared for whole runs.
+    """
+    if key.endswith("p50_ms") or key.endswith("_mb") or key.endswith("errors"):
+        return 1
+    if key.endswith("_per_s") and not key.endswith("ops_per_s"):
+        return -1
+    return 0
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_ms: float = 0.05) -> list[str]:
+    """
+    Regressions of `current` against `baseline` (both flattened): latencies,
+    memory and error counts more than `tolerance` above the baseline,
+    throughput more than `tolerance` below it. Latency differences under
+    `min_ms` are ignored (timer noise on sub-millisecond operations).
+    """
+    regressions = []
+    for key, old in sorted(baseline.items()):
+        new = current.get(key)
+        direction = _direction(key)
+        if new is None or direction == 0:
+            continue
+        if key.endswith("errors"):
+            worse = new > old
+        elif direction > 0:
+            worse = new > old * (1 + tolerance) and not (key.endswith("_ms") and new - old < min_ms)
+        else:
+            worse = new < old / (1 + tolerance)
+        if worse:
+            change = f"{(new - old) / old * 100:+.0f}%" if old else "new"
+            regressions.append(f"{key}: {old} -> {new} ({change})")
+    return regressions
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_baseline(results: dict, path: str = BASELINE_PATH):
+    with open(path, "w") as fh:
+        json.dump({"machine": machine(), "results": flatten(results)}, fh, indent=2, sort_keys=True)
+        fh.write("\n")
@@ -0,0 +1,92 @@
+"""
+Runs the microbenchmarks and the in-process cohort load test with fixed
+sizes and seeds, and compares the results with a baseline file.
+
+Microbenchmark medians, load-test peak memory and errors more than
+`--tolerance` above the baseline, and load-test throughput more than
+`--tolerance` below it, are reported as regressions and make the command
+exit with status 1. With
+`--rounds N` everything runs N times and the per-metric median is used,
+which is how baselines should be recorded. Baselines are machine-specific:
+record one on the machine (or CI runner) that runs the comparison. The
+committed `benchmarks/baseline.json` comes from a 1-CPU container with the
+ORB face fallback (no DeepFace), recorded with --rounds 3.
+
+Usage (from the repository root):
+    python -m benchmarks.suite                      # run and compare with benchmarks/baseline.json
+    python -m benchmarks.suite --rounds 3 --save-baseline   # record a new baseline
+    python -m benchmarks.suite --only micro --output results.json
+"""
+import argparse
+import json
+import sys
+import tempfile
+
+from benchmarks.common import BASELINE_PATH, compare, flatten, load_baseline, machine, median, save_baseline
+
+# Fixed sizes, so runs are comparable with each other and with the baseline
+MICRO_REPEATS = 500
+LOAD = {"students": 32, "concurrency": 16, "ramp": 2.0, "checks": 2, "voice_seconds": 3.0, "warmup": 2}
+
+
+def gated(key: str) -> bool:
+    """
+    Whether a result is compared with the baseline. Per-step latencies of the
+    load test depend on how the cohort happens to interleave and are only
+    reported; the run as a whole is judged by throughput, errors and memory.
+    """
+    return key.startswith("micro.") or (key.startswith("load.") and ".steps." not in key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=("micro", "load"), help="run one part only")
+    parser.add_argument("--rounds", type=int, default=1, help="repeat and use the per-metric median")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative regression (0.3 = 30%%)")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-suite-") as workdir:
+        # The load test needs its own database; settings are read when `app` is first imported
+        from benchmarks import bench_load
+        bench_load.prepare_environment(workdir)
+        from benchmarks import bench_micro
+
+        results = {}
+        if args.only in (None, "micro"):
+            results["micro"] = median([bench_micro.run(MICRO_REPEATS) for _ in range(max(1, args.rounds))])
+            print("== microbenchmarks")
+            bench_micro.report(results["micro"])
+        if args.only in (None, "load"):
+            results["load"] = median([bench_load.run(**LOAD) for _ in range(max(1, args.rounds))])
+            print("\n== cohort load test")
+            bench_load.report(results["load"])
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"machine": machine(), "results": results}, fh, indent=2)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; record one with --save-baseline")
+        return
+    if baseline.get("machine") != machine():
+        print(f"\nWarning: baseline was recorded on {baseline.get('machine')}, this is {machine()}")
+    recorded = {key: value for key, value in baseline["results"].items() if gated(key)}
+    regressions = compare(flatten(results), recorded, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
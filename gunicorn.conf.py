@@ -0,0 +1,77 @@
+"""
+Gunicorn settings for running the API with several uvicorn workers:
+
+    FACE_MODEL_SIDECAR_SOCKET=/tmp/biometric-face-model.sock gunicorn app.main:app
+
+With FACE_MODEL_SIDECAR_SOCKET set, the master starts one face model sidecar
+(app.scripts.model_sidecar) before forking the workers, restarts it whenever
+it exits (backing off while it keeps failing) and stops it on exit. The
+workers then send their face batches to it instead of each loading the
+weights; their readiness probe fails while it is unreachable. The app is not
+preloaded in the master: TensorFlow and ONNX Runtime start thread pools that
+do not survive a fork, and the database engines must not be shared across
+processes.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+# A sidecar that stays up this long is considered healthy again: the restart delay starts over
+SIDECAR_STABLE_SECONDS = 60
+SIDECAR_MAX_RESTART_DELAY = 60
+
+_sidecar = None
+_supervisor = None
+_stopping = threading.Event()
+
+
+def _start_sidecar(server, path: str):
+    global _sidecar
+    _sidecar = subprocess.Popen([sys.executable, "-m", "app.scripts.model_sidecar", "--socket", path])
+    server.log.info(f"Started face model sidecar (pid {_sidecar.pid}) on {path}")
+
+
+def _supervise(server, path: str):
+    delay, started = 1.0, time.monotonic()
+    while not _stopping.wait(1.0):
+        code = _sidecar.poll()
+        if code is None:
+            if time.monotonic() - started >= SIDECAR_STABLE_SECONDS:
+                delay = 1.0
+            continue
+        server.log.error(f"Face model sidecar exited with status {code}; restarting in {delay:.0f}s")
+        if _stopping.wait(delay):
+            return
+        delay = min(delay * 2, SIDECAR_MAX_RESTART_DELAY)
+        _start_sidecar(server, path)
+        started = time.monotonic()
+
+
+def on_starting(server):
+    global _supervisor
+    path = os.getenv("FACE_MODEL_SIDECAR_SOCKET", "")
+    if path:
+        _start_sidecar(server, path)
+        _supervisor = threading.Thread(target=_supervise, args=(server, path), name="sidecar-supervisor",
+                                       daemon=True)
+        _supervisor.start()
+
+
+def on_exit(server):
+    _stopping.set()
+    if _supervisor is not None:
+        _supervisor.join()
+    if _sidecar is not None and _sidecar.poll() is None:
+        _sidecar.terminate()
+        try:
+            _sidecar.wait(timeout=graceful_timeout)
+        except subprocess.TimeoutExpired:
+            _sidecar.kill()
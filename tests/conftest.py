@@ -0,0 +1,79 @@
+"""
+Unit tests run without a server: the settings are read from the environment
+when `app` is first imported, so point the app at a throwaway database and
+keep the face model out of the picture before any test module imports it.
+"""
+import base64
+import os
+import tempfile
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="biometric-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/test.db")
+os.environ.setdefault("ENCRYPTION_KEY", base64.urlsafe_b64encode(b"k" * 32).decode())
+os.environ.setdefault("FACE_MODEL_BACKEND", "none")
+os.environ.setdefault("FACE_MODEL_PRELOAD", "false")
+os.environ.setdefault("FACE_INDEX_PATH", os.path.join(_workdir, "face_index.bin"))
+os.environ.setdefault("EVENT_WRITER_DURABILITY", "sync")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    """The throwaway database with every table and migration applied."""
+    import app.main  # noqa: F401  (imports every model)
+    from app.db import migrations
+    from app.db.base import Base
+    from app.db.session import engine
+
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    from app.db.session import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def exam_session(db):
+    """(user_id, session_id) of a fresh user with an active exam session."""
+    import datetime
+    import uuid
+
+    from app.models.exam_session import ExamSession
+    from app.models.user import User
+
+    user = User(email=f"{uuid.uuid4().hex}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    session = ExamSession(user_id=user.id, started_at=datetime.datetime.now())
+    db.add(session)
+    db.commit()
+    return user.id, session.id
+
+
+@pytest.fixture
+def store_event(db):
+    """Inserts a verification event directly, as another worker's writer would."""
+    import datetime
+
+    from app.models.biometric_data import BiometricType
+    from app.models.verification_event import VerificationEvent, VerificationPhase
+
+    def store(user_id: int, session_id: int, match: bool = True, score: float = 0.9) -> VerificationEvent:
+        event = VerificationEvent(session_id=session_id, user_id=user_id, modality=BiometricType.FACE,
+                                  phase=VerificationPhase.START, match=match, score=score, threshold=0.3,
+                                  metric="cosine", mock_used=False, created_at=datetime.datetime.now())
+        db.add(event)
+        db.commit()
+        return event
+
+    return store
@@ -0,0 +1,45 @@
+import uuid
+
+import app.api.v1.endpoints.auth as auth
+from app.db.session import SessionLocal
+from app.models.user import User as UserModel
+from app.schemas.user import UserCreate
+
+
+def _new_user() -> UserCreate:
+    return UserCreate(email=f"{uuid.uuid4().hex}@example.com", password="secret", full_name="Test User")
+
+
+def test_existing_user_is_returned_without_hashing(db, monkeypatch):
+    user = _new_user()
+    created = auth.register(user, db)
+
+    def fail(password):
+        raise AssertionError("hashed a password for an existing user")
+
+    monkeypatch.setattr(auth, "get_password_hash", fail)
+    assert auth.register(user, db).id == created.id
+
+
+def test_concurrent_registration_returns_the_winner(db, monkeypatch):
+    user = _new_user()
+    hash_password = auth.get_password_hash
+
+    def hash_while_another_request_registers(password):
+        other = SessionLocal()
+        try:
+            other.add(UserModel(email=user.email, hashed_password="x", full_name="Winner"))
+            other.commit()
+        finally:
+            other.close()
+        return hash_password(password)
+
+    monkeypatch.setattr(auth, "get_password_hash", hash_while_another_request_registers)
+    assert auth.register(user, db).full_name == "Winner"
+
+
+def test_new_user_is_stored_hashed(db):
+    user = _new_user()
+    created = auth.register(user, db)
+    assert created.hashed_password != user.password
+    assert auth.pwd_context.verify(user.password, created.hashed_password)
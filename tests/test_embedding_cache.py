@@ -0,0 +1,112 @@
+import os
+
+from app.services import embedding_cache as module
+from app.services.embedding_cache import EmbeddingCache, content_digest, content_hasher
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(module.time, "monotonic", clock)
+    return clock
+
+
+def _digest(i: int) -> bytes:
+    return content_digest(f"upload-{i}".encode())
+
+
+def test_incremental_digest_matches_one_shot():
+    hasher = content_hasher()
+    for chunk in (b"RIFF", b"....", b"data"):
+        hasher.update(chunk)
+    assert hasher.digest() == content_digest(b"RIFF....data")
+
+
+def test_hit_miss_and_pipeline_isolation():
+    cache = EmbeddingCache(max_entries=4, ttl_seconds=60)
+    assert cache.get("voice", "mfcc-v1", _digest(1)) is None
+    cache.put("voice", "mfcc-v1", _digest(1), [0.5, 0.25], "MFCC")
+    assert cache.get("voice", "mfcc-v1", _digest(1)) == ([0.5, 0.25], "MFCC")
+    # Another pipeline or modality never sees the vector
+    assert cache.get("voice", "mfcc-v2", _digest(1)) is None
+    assert cache.get("face", "mfcc-v1", _digest(1)) is None
+    stats = cache.stats()
+    assert stats["voice"]["hits"] == 1
+    assert stats["voice"]["misses"] == 2
+    assert stats["face"]["misses"] == 1
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=60)
+    for i in range(2):
+        cache.put("voice", "p", _digest(i), [float(i)], "MFCC")
+    cache.get("voice", "p", _digest(0))
+    cache.put("voice", "p", _digest(2), [2.0], "MFCC")
+    assert cache.get("voice", "p", _digest(1)) is None
+    assert cache.get("voice", "p", _digest(0)) == ([0.0], "MFCC")
+    assert cache.get("voice", "p", _digest(2)) == ([2.0], "MFCC")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = _clock(monkeypatch)
+    cache = EmbeddingCache(max_entries=4, ttl_seconds=10)
+    cache.put("voice", "p", _digest(1), [1.0], "MFCC")
+    clock.now += 9
+    assert cache.get("voice", "p", _digest(1)) is not None
+    clock.now += 2
+    assert cache.get("voice", "p", _digest(1)) is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0
+
+
+def test_evicted_vector_is_zeroed_and_returned_values_are_copies():
+    cache = EmbeddingCache(max_entries=1, ttl_seconds=60)
+    cache.put("voice", "p", _digest(1), [1.0, 2.0], "MFCC")
+    held, _ = cache.get("voice", "p", _digest(1))
+    stored = cache._entries[("voice", "p", _digest(1))][0]
+    cache.put("voice", "p", _digest(2), [3.0, 4.0], "MFCC")
+    assert not stored.any()
+    assert held == [1.0, 2.0]
+
+
+def test_spill_tier_serves_evicted_entries(tmp_path):
+    cache = EmbeddingCache(max_entries=1, ttl_seconds=60, spill_dir=str(tmp_path), spill_entries=2)
+    for i in range(3):
+        cache.put("voice", "p", _digest(i), [float(i), 1.0], "MFCC")
+    assert cache.stats()["spilled"] == 2
+    # Served from disk and promoted back to memory
+    assert cache.get("voice", "p", _digest(0)) == ([0.0, 1.0], "MFCC")
+    assert cache.stats()["voice"]["spill_hits"] == 1
+    assert cache.get("voice", "p", _digest(0)) == ([0.0, 1.0], "MFCC")
+    assert cache.stats()["voice"]["hits"] == 1
+    cache.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_spill_tier_is_bounded_and_expires(tmp_path, monkeypatch):
+    clock = _clock(monkeypatch)
+    cache = EmbeddingCache(max_entries=1, ttl_seconds=10, spill_dir=str(tmp_path), spill_entries=1)
+    for i in range(3):
+        cache.put("voice", "p", _digest(i), [float(i)], "MFCC")
+    # Only the most recently evicted entry fits on disk
+    assert cache.get("voice", "p", _digest(0)) is None
+    clock.now += 11
+    assert cache.get("voice", "p", _digest(1)) is None
+    assert cache.stats()["spilled"] == 0
+    cache.close()
+
+
+def test_disabled_cache_stores_nothing():
+    cache = EmbeddingCache(max_entries=0, ttl_seconds=60)
+    cache.put("voice", "p", _digest(1), [1.0], "MFCC")
+    assert cache.get("voice", "p", _digest(1)) is None
+    assert cache.stats()["entries"] == 0
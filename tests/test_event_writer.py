@@ -0,0 +1,92 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.biometric_data import BiometricType
+from app.models.verification_event import VerificationEvent, VerificationPhase
+from app.services.event_writer import ASYNC, SYNC, EventWriter
+
+
+def _values(user_id: int, session_id: int, score: float = 0.9) -> dict:
+    return dict(session_id=session_id, user_id=user_id, modality=BiometricType.FACE, phase=VerificationPhase.START,
+                match=True, score=score, threshold=0.3, metric="cosine", mock_used=False,
+                created_at=datetime.datetime.now())
+
+
+def _stored(db, session_id: int) -> int:
+    db.expire_all()
+    return db.scalar(select(func.count()).select_from(VerificationEvent)
+                     .where(VerificationEvent.session_id == session_id))
+
+
+async def test_sync_submit_returns_after_commit_and_batches_concurrent_events(db, exam_session):
+    user_id, session_id = exam_session
+    writer = EventWriter(max_batch_size=64, flush_ms=50, max_queue=100, durability=SYNC)
+    await asyncio.gather(*(writer.submit(**_values(user_id, session_id)) for _ in range(10)))
+    assert _stored(db, session_id) == 10
+    stats = writer.stats()
+    assert stats["written"] == 10
+    assert stats["batches"] < 10
+    assert stats["max_batch_seen"] > 1
+    await writer.close()
+
+
+async def test_batches_never_exceed_max_batch_size(db, exam_session):
+    user_id, session_id = exam_session
+    writer = EventWriter(max_batch_size=3, flush_ms=50, max_queue=100, durability=SYNC)
+    await asyncio.gather(*(writer.submit(**_values(user_id, session_id)) for _ in range(7)))
+    assert _stored(db, session_id) == 7
+    assert writer.max_batch_seen <= 3
+    assert writer.batches >= 3
+    await writer.close()
+
+
+async def test_submit_many_writes_rows_in_one_transaction(db, exam_session):
+    user_id, session_id = exam_session
+    writer = EventWriter(max_batch_size=1, flush_ms=0, max_queue=100, durability=SYNC)
+    await writer.submit_many([_values(user_id, session_id, score) for score in (0.1, 0.2, 0.3)])
+    assert _stored(db, session_id) == 3
+    assert writer.batches == 1
+    assert writer.max_batch_seen == 3
+    await writer.close()
+
+
+async def test_async_submit_does_not_wait_and_close_drains(db, exam_session):
+    user_id, session_id = exam_session
+    writer = EventWriter(max_batch_size=64, flush_ms=10_000, max_queue=100, durability=ASYNC)
+    for _ in range(5):
+        await writer.submit(**_values(user_id, session_id))
+    assert writer.written == 0
+    assert _stored(db, session_id) == 0
+    await writer.close()
+    assert _stored(db, session_id) == 5
+    assert writer.stats()["written"] == 5
+
+
+async def test_wait_overrides_async_durability(db, exam_session):
+    user_id, session_id = exam_session
+    writer = EventWriter(max_batch_size=64, flush_ms=0, max_queue=100, durability=ASYNC)
+    await writer.submit(wait=True, **_values(user_id, session_id))
+    assert _stored(db, session_id) == 1
+    await writer.close()
+
+
+async def test_failed_write_is_reported_to_sync_callers(monkeypatch, exam_session):
+    user_id, session_id = exam_session
+    writer = EventWriter(max_batch_size=64, flush_ms=0, max_queue=100, durability=SYNC)
+
+    async def fail(rows):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(writer, "_write", fail)
+    with pytest.raises(RuntimeError):
+        await writer.submit(**_values(user_id, session_id))
+    assert writer.failed == 1
+    assert writer.written == 0
+    # The writer keeps running after a failed batch
+    monkeypatch.undo()
+    await writer.submit(**_values(user_id, session_id))
+    assert writer.written == 1
+    await writer.close()
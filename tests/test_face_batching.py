@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.services.face_embedding import FaceBatcher
+from app.services.inference import InferenceBusyError
+from app.services.model_registry import face_models
+
+
+class _FakeModel:
+    """Stands in for face_models.embed: one vector per crop, derived from the crop itself."""
+
+    def __init__(self, gate: threading.Event | None = None, error: Exception | None = None):
+        self.gate = gate
+        self.error = error
+        self.batch_sizes = []
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        self.batch_sizes.append(len(batch))
+        return batch[:, 0, 0, :] * 2
+
+
+def _crop(i: int) -> np.ndarray:
+    return np.full((4, 4, 3), float(i), dtype=np.float32)
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    def install(**kwargs) -> _FakeModel:
+        model = _FakeModel(**kwargs)
+        monkeypatch.setattr(face_models, "embed", model)
+        return model
+
+    return install
+
+
+async def test_concurrent_crops_share_batches_and_get_their_own_vectors(fake_model):
+    model = fake_model()
+    batcher = FaceBatcher(max_batch_size=8, max_wait_ms=50)
+    try:
+        vectors = await asyncio.gather(*(batcher.embed(_crop(i)) for i in range(8)))
+    finally:
+        batcher.close()
+    for i, vector in enumerate(vectors):
+        assert np.all(vector == 2.0 * i)
+    assert sum(model.batch_sizes) == 8
+    assert len(model.batch_sizes) < 8
+    assert batcher.stats()["max_batch_seen"] > 1
+
+
+async def test_batches_never_exceed_max_batch_size(fake_model):
+    model = fake_model()
+    batcher = FaceBatcher(max_batch_size=3, max_wait_ms=50)
+    try:
+        vectors = await asyncio.gather(*(batcher.embed(_crop(i)) for i in range(10)))
+    finally:
+        batcher.close()
+    assert [float(v[0]) for v in vectors] == [2.0 * i for i in range(10)]
+    assert max(model.batch_sizes) <= 3
+    assert batcher.stats()["items"] == 10
+
+
+async def test_failed_forward_pass_fails_every_crop_of_the_batch(fake_model):
+    fake_model(error=RuntimeError("model crashed"))
+    batcher = FaceBatcher(max_batch_size=4, max_wait_ms=50)
+    try:
+        results = await asyncio.gather(*(batcher.embed(_crop(i)) for i in range(4)), return_exceptions=True)
+    finally:
+        batcher.close()
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert batcher.stats()["batches"] == 0
+
+
+async def test_full_batcher_rejects_with_busy_error(fake_model):
+    gate = threading.Event()
+    fake_model(gate=gate)
+    batcher = FaceBatcher(max_batch_size=1, max_wait_ms=0)
+    batcher.max_pending = 2
+    try:
+        # One crop per model worker is in flight, then the queue fills up
+        tasks = [asyncio.create_task(batcher.embed(_crop(i))) for i in range(batcher._workers)]
+        await asyncio.sleep(0.1)
+        tasks += [asyncio.create_task(batcher.embed(_crop(i))) for i in range(2)]
+        await asyncio.sleep(0.1)
+        with pytest.raises(InferenceBusyError) as raised:
+            await batcher.embed(_crop(99))
+        assert raised.value.pool == "face-batcher"
+        gate.set()
+        assert len(await asyncio.gather(*tasks)) == batcher._workers + 2
+    finally:
+        gate.set()
+        batcher.close()
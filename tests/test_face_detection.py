@@ -0,0 +1,107 @@
+import os
+import threading
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import face_detection
+from app.services.face_detection import FaceDetector, StageStats, StageTimings, resolve_cascade_path
+
+
+class _FakeCascade:
+    """Returns a fixed box and records the frame size it was given."""
+
+    def __init__(self, box):
+        self.box = box
+        self.shapes = []
+
+    def detectMultiScale(self, gray, **options):
+        self.shapes.append(gray.shape)
+        self.options = options
+        return [self.box] if self.box is not None else []
+
+
+def _detector(cascade, max_side: int = 640) -> FaceDetector:
+    detector = FaceDetector(max_side)
+    detector._local.cascade = cascade
+    return detector
+
+
+def test_cascade_path_prefers_the_setting(monkeypatch, tmp_path):
+    custom = tmp_path / "cascade.xml"
+    custom.write_text("<opencv_storage/>")
+    monkeypatch.setattr(settings, "FACE_CASCADE_PATH", str(custom))
+    assert resolve_cascade_path() == str(custom)
+
+
+def test_cascade_path_falls_back_to_the_shipped_copy(monkeypatch):
+    monkeypatch.setattr(settings, "FACE_CASCADE_PATH", "/does/not/exist.xml")
+    shipped = os.path.join(os.path.dirname(face_detection.__file__), face_detection.CASCADE_FILE)
+    assert resolve_cascade_path() == shipped
+
+
+def test_cascade_is_resolved_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(face_detection, "resolve_cascade_path", lambda: calls.append(1) or None)
+    detector = FaceDetector(640)
+    for _ in range(3):
+        assert detector.load() is False
+    assert len(calls) == 1
+
+
+def test_detectors_are_cached_per_thread():
+    detector = FaceDetector(640)
+    assert detector.load()
+    cascades = []
+
+    def grab():
+        cascades.append(detector._cascade())
+        cascades.append(detector._cascade())
+
+    thread = threading.Thread(target=grab)
+    thread.start()
+    thread.join()
+    grab()
+    assert cascades[0] is cascades[1]
+    assert cascades[2] is cascades[3]
+    assert cascades[0] is not cascades[2]
+
+
+def test_large_frames_are_downscaled_and_the_box_is_mapped_back():
+    cascade = _FakeCascade((100, 50, 80, 80))
+    detector = _detector(cascade, max_side=640)
+    box = detector.detect(np.zeros((960, 1280, 3), dtype=np.uint8))
+    assert cascade.shapes == [(480, 640)]
+    assert box == (200, 100, 160, 160)
+
+
+def test_small_frames_are_not_resized():
+    cascade = _FakeCascade((10, 20, 30, 40))
+    box = _detector(cascade).detect(np.zeros((240, 320, 3), dtype=np.uint8))
+    assert cascade.shapes == [(240, 320)]
+    assert box == (10, 20, 30, 40)
+
+
+def test_grayscale_input_and_min_size_in_frame_pixels():
+    cascade = _FakeCascade((100, 50, 80, 80))
+    _detector(cascade, max_side=640).detect(np.zeros((960, 1280), dtype=np.uint8), min_size=200)
+    assert cascade.shapes == [(480, 640)]
+    assert cascade.options["minSize"] == (100, 100)
+
+
+def test_crop_uses_the_whole_frame_without_a_face():
+    frame = np.zeros((60, 80, 3), dtype=np.uint8)
+    assert _detector(_FakeCascade(None)).crop(frame) is frame
+    assert _detector(False).crop(frame) is frame
+
+
+def test_stage_timings_aggregate():
+    timings = StageTimings()
+    with timings.stage("detect"):
+        pass
+    stats = StageStats()
+    stats.record(timings.stages)
+    stats.record({"detect": 0.002})
+    snapshot = stats.snapshot()
+    assert snapshot["detect"]["count"] == 2
+    assert snapshot["detect"]["max_ms"] >= 2.0
@@ -0,0 +1,74 @@
+import pytest
+
+import app.services.face_tiers as module
+from app.services.face_tiers import FaceTierSelector, parse_tiers
+
+SPEC = "full:haar:0:model:100,reduced:haar:320:model:50,center:center:320:model:0,minimal:haar:240:model:0"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _selector(spec: str = SPEC, queue_step: int = 4) -> FaceTierSelector:
+    return FaceTierSelector(parse_tiers(spec), queue_step=queue_step, retry_seconds=10, alpha=0.5)
+
+
+def _record(selector, name: str, *ms):
+    for value in ms:
+        selector.record(selector.get(name), value / 1000)
+
+
+def test_parse_rejects_bad_entries():
+    with pytest.raises(ValueError):
+        parse_tiers("full:haar:0:model")
+    with pytest.raises(ValueError):
+        parse_tiers("full:mtcnn:0:model:0")
+    with pytest.raises(ValueError):
+        parse_tiers("a:haar:0:model:0,a:haar:320:model:0")
+    with pytest.raises(ValueError):
+        _selector().get("missing")
+
+
+def test_queue_depth_moves_down_compatible_tiers_only():
+    selector = _selector()
+    assert selector.select(queue_depth=3).name == "full"
+    assert selector.select(queue_depth=4).name == "reduced"
+    # The center-crop tier does not match Haar-cropped templates: it is never chosen automatically
+    assert selector.select(queue_depth=8).name == "minimal"
+    assert selector.select(queue_depth=100).name == "minimal"
+    assert selector.select("center", queue_depth=0).name == "center"
+    assert selector.select(queue_depth=100, degrade=False).name == "full"
+
+
+def test_first_sample_is_ignored_and_ewma_skips_over_budget(clock):
+    selector = _selector()
+    _record(selector, "full", 5000)
+    assert selector.stats()["tiers"][0]["latency_ms"] is None
+    _record(selector, "full", 80, 200)
+    assert selector.stats()["tiers"][0]["latency_ms"] == pytest.approx(140)
+    assert selector.select().name == "reduced"
+    assert selector.degraded["budget"] == 1
+
+
+def test_skipped_tier_is_retried_by_one_request(clock):
+    selector = _selector()
+    _record(selector, "full", 0, 300)
+    assert selector.select().name == "reduced"
+    clock[0] += 11
+    assert selector.select().name == "full"
+    # Others keep skipping it until the probe reports back
+    assert selector.select().name == "reduced"
+    _record(selector, "full", 20)
+    assert selector.stats()["tiers"][0]["latency_ms"] == pytest.approx(20)
+    assert selector.select().name == "full"
+
+
+def test_last_reachable_tier_is_never_skipped(clock):
+    selector = _selector("full:haar:0:model:100,reduced:haar:320:model:50")
+    _record(selector, "full", 0, 500)
+    _record(selector, "reduced", 0, 500)
+    assert selector.select().name == "reduced"
@@ -0,0 +1,54 @@
+import pytest
+
+from app.services.scoring import COSINE, EUCLIDEAN, Comparison, fuse, normalized_score
+
+
+def _cosine(score: float, threshold: float = 0.6) -> Comparison:
+    return Comparison(score, score >= threshold, COSINE, threshold)
+
+
+def _euclidean(score: float, threshold: float = 0.6) -> Comparison:
+    return Comparison(score, score < threshold, EUCLIDEAN, threshold)
+
+
+def test_normalized_score_puts_threshold_at_one_half():
+    assert normalized_score(_cosine(0.6)) == pytest.approx(0.5)
+    assert normalized_score(_euclidean(0.6)) == pytest.approx(0.5)
+    assert normalized_score(_cosine(1.0)) == pytest.approx(1.0)
+    assert normalized_score(_cosine(-1.0)) == pytest.approx(0.0)
+    assert normalized_score(_euclidean(0.0)) == pytest.approx(1.0)
+
+
+def test_normalized_score_is_monotonic_and_bounded():
+    cosine = [normalized_score(_cosine(s / 10)) for s in range(-10, 11)]
+    euclidean = [normalized_score(_euclidean(s / 10)) for s in range(0, 30)]
+    assert cosine == sorted(cosine)
+    assert euclidean == sorted(euclidean, reverse=True)
+    assert all(0.0 <= v <= 1.0 for v in cosine + euclidean)
+    # Accepted scores map above 1/2, rejected ones below (the threshold itself maps to 1/2)
+    for c in [_cosine(s / 10) for s in range(-10, 11)] + [_euclidean(s / 10) for s in range(0, 30)]:
+        if c.score != c.threshold:
+            assert (normalized_score(c) > 0.5) == c.match
+
+
+def test_weighted_fusion_is_weighted_mean_of_normalized_scores():
+    face, voice = _cosine(0.9), _euclidean(0.8)
+    fused = fuse([face, voice], [0.7, 0.3], "weighted", 0.5)
+    expected = (0.7 * normalized_score(face) + 0.3 * normalized_score(voice)) / 1.0
+    assert fused.score == pytest.approx(expected)
+    assert fused.match == (expected >= 0.5)
+    assert fused.metric == "fusion-weighted"
+    assert fused.threshold == 0.5
+
+
+@pytest.mark.parametrize("mode, expected", [("either", True), ("both", False)])
+def test_either_and_both_use_the_modality_decisions(mode, expected):
+    assert fuse([_cosine(0.9), _cosine(0.1)], [1, 1], mode, 0.99).match is expected
+    assert fuse([_cosine(0.9), _cosine(0.9)], [1, 1], mode, 0.99).match
+
+
+def test_fusion_rejects_bad_configuration():
+    with pytest.raises(ValueError):
+        fuse([_cosine(0.9)], [0.0], "weighted", 0.5)
+    with pytest.raises(ValueError):
+        fuse([_cosine(0.9)], [1.0], "average", 0.5)
@@ -0,0 +1,88 @@
+import csv
+import uuid
+
+import cv2
+import numpy as np
+import pytest
+
+from app.models.biometric_data import BiometricData, BiometricType
+from app.scripts.import_enrollments import Importer, load_manifest
+
+
+def _image(path, seed: int):
+    rng = np.random.default_rng(seed)
+    cv2.imwrite(str(path), rng.integers(0, 256, (160, 160, 3), dtype=np.uint8))
+
+
+def _manifest(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["email", "modality", "file"])
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture
+def cohort(tmp_path):
+    root = tmp_path / "cohort"
+    root.mkdir()
+    _image(root / "ok.png", 1)
+    (root / "notes.txt").write_text("not a sample")
+    (tmp_path / "outside.png").write_bytes((root / "ok.png").read_bytes())
+    return root
+
+
+def _importer(root, units, job):
+    return Importer(str(root.resolve()), units, job, workers=1, batch_size=10, aggregation="mean",
+                    create_users=True)
+
+
+def test_manifest_problems_are_kept_for_the_report(cohort, tmp_path):
+    email = f"{uuid.uuid4().hex}@example.com"
+    manifest = _manifest(tmp_path / "cohort.csv", [
+        (email, "", "ok.png"),
+        (email, "iris", "ok.png"),
+        (email, "", "../outside.png"),
+        (email, "", "missing.png"),
+    ])
+    units = load_manifest(manifest, str(cohort.resolve()))
+    assert units == {
+        (email, BiometricType.FACE): ["ok.png"],
+        (email, "iris"): ["ok.png"],
+        (email, None): ["../outside.png", "missing.png"],
+    }
+
+
+def test_import_reports_failures_per_file_and_resumes(cohort, tmp_path, db):
+    email = f"{uuid.uuid4().hex}@example.com"
+    manifest = _manifest(tmp_path / "cohort.csv", [
+        (email, "face", "ok.png"),
+        (email, "face", "../outside.png"),
+        (email, "iris", "ok.png"),
+        (email, "", "notes.txt"),
+        (email, "", "../outside.png"),
+        (email, "", "missing.png"),
+    ])
+    units = load_manifest(manifest, str(cohort.resolve()))
+    job = uuid.uuid4().hex
+
+    importer = _importer(cohort, units, job)
+    report = importer.run()
+    assert report["templates"] == 1
+    assert report["files"] == 6
+    assert report["files_failed"] == 5
+    reasons = {(modality, name): reason for _, modality, name, reason in importer.failures}
+    assert reasons == {
+        ("face", "../outside.png"): "../outside.png is outside the import directory",
+        ("iris", "ok.png"): "unknown modality 'iris'",
+        ("", "notes.txt"): "unrecognised file content",
+        ("", "../outside.png"): "../outside.png is outside the import directory",
+        ("", "missing.png"): "file not found",
+    }
+    stored = db.query(BiometricData).filter(BiometricData.device_info == f"bulk_import:{job}").all()
+    assert [row.modality for row in stored] == [BiometricType.FACE]
+
+    # Same job again: the stored unit is skipped, nothing is embedded twice
+    report = _importer(cohort, units, job).run()
+    assert report["templates"] == 0
+    assert report["skipped"] == 1
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from app.services.inference import InferenceBusyError, InferencePool, InferenceUnavailableError
+
+
+def _crash_once(marker: str) -> str:
+    # Kills the worker process the first time, like an OOM kill or a native crash
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "ok"
+
+
+def _always_crash():
+    os._exit(1)
+
+
+def _double(x):
+    return 2 * x
+
+
+async def test_thread_pool_runs_and_counts():
+    pool = InferencePool("test", "thread", workers=1, max_queue=0)
+    try:
+        assert await pool.run(_double, 21) == 42
+        assert pool.stats()["completed"] == 1
+    finally:
+        pool.shutdown()
+
+
+async def test_full_pool_rejects_with_retry_after():
+    pool = InferencePool("test", "thread", workers=1, max_queue=0)
+    pool.in_flight = 1
+    with pytest.raises(InferenceBusyError) as raised:
+        await pool.run(_double, 1)
+    assert raised.value.retry_after >= 1
+    assert pool.rejected == 1
+
+
+async def test_broken_process_pool_is_replaced_and_retried(tmp_path):
+    pool = InferencePool("test", "process", workers=1, max_queue=0)
+    try:
+        assert await pool.run(_crash_once, str(tmp_path / "crashed")) == "ok"
+        assert pool.restarts == 1
+        assert await pool.run(_double, 2) == 4
+    finally:
+        pool.shutdown()
+
+
+async def test_pool_that_keeps_breaking_is_unavailable():
+    pool = InferencePool("test", "process", workers=1, max_queue=0)
+    try:
+        with pytest.raises(InferenceUnavailableError):
+            await pool.run(_always_crash)
+        assert pool.restarts == 2
+        assert await pool.run(_double, 3) == 6
+    finally:
+        pool.shutdown()
@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+from app.services.liveness import LivenessEngine
+
+
+def _engine(threshold: float = 5.0, early_exit_factor: float = 1.5) -> LivenessEngine:
+    return LivenessEngine(threshold, max_reduction=4, min_side=160, use_roi=False, roi_margin=0.25,
+                          early_exit_factor=early_exit_factor)
+
+
+def _frame(offset: int, noise_seed: int) -> bytes:
+    """A 640x480 frame: a face-sized blob shifted `offset` pixels right, plus sensor noise."""
+    img = np.full((480, 640, 3), 200, np.uint8)
+    cv2.ellipse(img, (320 + offset, 240), (110, 140), 0, 0, 360, (110, 130, 160), -1)
+    for dx in (-45, 45):
+        cv2.ellipse(img, (320 + offset + dx, 200), (20, 10), 0, 0, 360, (40, 40, 40), -1)
+    cv2.ellipse(img, (320 + offset, 310), (45, 14), 0, 0, 180, (60, 60, 120), -1)
+    rng = np.random.default_rng(noise_seed)
+    img = np.clip(cv2.GaussianBlur(img, (5, 5), 0) + rng.normal(0, 3, img.shape), 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def _capture(drift: int, frames: int) -> list[bytes]:
+    # One capture span sampled evenly, the face drifting `drift` pixels overall
+    return [_frame(drift * i // (frames - 1), noise_seed=i) for i in range(frames)]
+
+
+def test_dense_sampling_scores_the_whole_span():
+    engine = _engine(early_exit_factor=100)
+    pair = engine.score(_capture(60, 2))
+    sequence = engine.score(_capture(60, 5))
+    assert pair.live and sequence.live
+    # Each frame is measured against the first: five frames over the span see
+    # the motion of the original pair, not a quarter of it
+    assert sequence.score >= 0.8 * pair.score
+
+
+def test_static_capture_is_not_live():
+    result = _engine().score(_capture(0, 5))
+    assert not result.live
+    assert result.frames_used == 5
+
+
+def test_early_exit_stops_decoding():
+    result = _engine(threshold=1.0).score(_capture(120, 6))
+    assert result.live and result.early_exit
+    assert result.frames_used < 6
+
+
+def test_undecodable_frames_are_skipped():
+    frames = _capture(60, 3)
+    result = _engine().score([b"not an image", *frames])
+    assert result.frames_used == 3
@@ -0,0 +1,74 @@
+import re
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.metrics import Metrics, MetricsMiddleware, server_timing
+
+
+def _app(metrics: Metrics, timing_headers: bool) -> TestClient:
+    router = APIRouter()
+
+    @router.get("/session/{session_id}/events")
+    async def events(session_id: int):
+        with metrics.stage("load"):
+            pass
+        return {"session_id": session_id}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/exam")
+    app.add_middleware(MetricsMiddleware, metrics=metrics, timing_headers=timing_headers)
+    return TestClient(app)
+
+
+def test_render_uses_the_prometheus_text_format():
+    metrics = Metrics(True, buckets=(0.1, 1.0))
+    metrics.observe("inference_run_seconds", 0.05, pool="cpu")
+    metrics.observe("inference_run_seconds", 0.5, pool="cpu")
+    metrics.inc("mock_used_total", modality="face")
+    metrics.inc("mock_used_total", modality="face")
+    metrics.set("inference_workers", 4, pool="cpu")
+    text = metrics.render()
+
+    assert "# TYPE biometric_inference_run_seconds histogram" in text
+    assert 'biometric_inference_run_seconds_bucket{pool="cpu",le="0.1"} 1' in text
+    assert 'biometric_inference_run_seconds_bucket{pool="cpu",le="1.0"} 2' in text
+    assert 'biometric_inference_run_seconds_bucket{pool="cpu",le="+Inf"} 2' in text
+    assert 'biometric_inference_run_seconds_count{pool="cpu"} 2' in text
+    assert "# TYPE biometric_mock_used_total counter" in text
+    assert 'biometric_mock_used_total{modality="face"} 2' in text
+    assert 'biometric_inference_workers{pool="cpu"} 4' in text
+    assert text.endswith("\n")
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(False)
+    metrics.inc("mock_used_total", modality="face")
+    with metrics.stage("score"):
+        pass
+    assert metrics.render() == "\n"
+
+
+def test_requests_are_labelled_by_route_template():
+    metrics = Metrics(True)
+    client = _app(metrics, timing_headers=False)
+    for session_id in (1, 2, 3):
+        assert client.get(f"/api/v1/exam/session/{session_id}/events").status_code == 200
+    client.get("/nowhere")
+    text = metrics.render()
+    assert ('biometric_http_request_duration_seconds_count{method="GET",'
+            'route="/api/v1/exam/session/{session_id}/events",status="200"} 3') in text
+    assert 'route="unmatched",status="404"} 1' in text
+    assert "session/1/" not in text
+
+
+def test_server_timing_header_lists_the_request_stages():
+    client = _app(Metrics(False), timing_headers=True)
+    header = client.get("/api/v1/exam/session/7/events").headers["server-timing"]
+    assert re.fullmatch(r"load;dur=\d+\.\d\d, total;dur=\d+\.\d\d", header)
+
+    assert "server-timing" not in _app(Metrics(True), timing_headers=False).get("/api/v1/exam/session/7/events").headers
+
+
+def test_server_timing_format():
+    assert server_timing({"decode": 0.0012, "embed": 0.5}, 0.75) == b"decode;dur=1.20, embed;dur=500.00, total;dur=750.00"
@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.db import migrations
+from app.db.base import Base
+from app.models.biometric_data import BiometricData
+from app.models.exam_session import ExamSession
+from app.models.verification_event import VerificationEvent
+
+
+@pytest.fixture
+def fresh_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/schema.db")
+    yield engine
+    engine.dispose()
+
+
+def _old_schema(engine):
+    """Every table as of the previous release: no kind/sample_count, no query indexes."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for index in BiometricData.__table__.indexes | VerificationEvent.__table__.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_exam_sessions_user_id"))
+        conn.execute(text("ALTER TABLE biometric_data DROP COLUMN kind"))
+        conn.execute(text("ALTER TABLE biometric_data DROP COLUMN sample_count"))
+
+
+def test_upgrade_adds_columns_and_indexes_once(fresh_engine):
+    _old_schema(fresh_engine)
+    assert migrations.upgrade(fresh_engine) == [m.version for m in migrations.MIGRATIONS]
+
+    inspector = inspect(fresh_engine)
+    assert {"kind", "sample_count"} <= {c["name"] for c in inspector.get_columns("biometric_data")}
+    assert "ix_biometric_data_user_modality_id" in {i["name"] for i in inspector.get_indexes("biometric_data")}
+    assert "ix_verification_events_session_id_id" in {
+        i["name"] for i in inspector.get_indexes("verification_events")
+    }
+    assert "ix_exam_sessions_user_id" in {i["name"] for i in inspector.get_indexes("exam_sessions")}
+
+    assert migrations.upgrade(fresh_engine) == []
+    assert all(row["applied"] for row in migrations.status(fresh_engine))
+
+
+def test_iso_timestamps_are_backfilled_in_batches(fresh_engine):
+    Base.metadata.create_all(bind=fresh_engine)
+    migrations.upgrade(fresh_engine)
+    with fresh_engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@example.com', 'x')"))
+        conn.execute(text(
+            "INSERT INTO exam_sessions (id, user_id, started_at, ended_at, status, schedule_type) "
+            "VALUES (1, 1, '2024-05-01T09:00:00.250000', '2024-05-01T10:30:00', 'ACTIVE', 'START_END')"
+        ))
+        for i in range(1, 8):
+            conn.execute(text(
+                "INSERT INTO verification_events (id, session_id, user_id, modality, phase, match, score, "
+                "threshold, metric, mock_used, created_at) VALUES "
+                f"({i}, 1, 1, 'FACE', 'START', 1, 0.9, 0.3, 'cosine', 0, '2024-05-01T09:0{i}:00.123456')"
+            ))
+        conn.execute(text(
+            "INSERT INTO biometric_data (id, user_id, modality, encrypted_descriptor, created_at) "
+            "VALUES (1, 1, 'FACE', x'00', '2024-04-30 08:00:00')"
+        ))
+        assert migrations._datetime_pending(conn) == 9
+
+    assert migrations.backfill(fresh_engine, batch_size=3) == {"0003": 9}
+    assert {row["version"]: row["pending_rows"] for row in migrations.status(fresh_engine)}["0003"] == 0
+    # A rerun has nothing left to rewrite
+    assert migrations.backfill(fresh_engine, batch_size=3) == {"0003": 0}
+
+    with Session(fresh_engine) as db:
+        session = db.get(ExamSession, 1)
+        assert session.started_at == datetime.datetime(2024, 5, 1, 9, 0, 0, 250000)
+        assert session.ended_at == datetime.datetime(2024, 5, 1, 10, 30)
+        created = db.scalars(select(VerificationEvent.created_at).order_by(VerificationEvent.id)).all()
+        assert created[0] == datetime.datetime(2024, 5, 1, 9, 1, 0, 123456)
+        assert len(created) == 7
+        assert db.get(BiometricData, 1).created_at == datetime.datetime(2024, 4, 30, 8)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.model_registry import FaceModelRegistry, pipeline_model_name, preprocess_face
+
+
+def _onnx_model(path: str, input_shape: list, dim: int = 8):
+    """Flatten -> MatMul: a stand-in face model with fixed weights."""
+    from onnx import TensorProto, helper, numpy_helper, save
+
+    features = int(np.prod(input_shape[1:]))
+    weights = np.random.default_rng(0).standard_normal((features, dim)).astype(np.float32)
+    graph = helper.make_graph(
+        [
+            helper.make_node("Reshape", ["input", "flat_shape"], ["flat"]),
+            helper.make_node("MatMul", ["flat", "weights"], ["embedding"]),
+        ],
+        "face",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, input_shape)],
+        [helper.make_tensor_value_info("embedding", TensorProto.FLOAT, ["N", dim])],
+        [numpy_helper.from_array(np.array([-1, features], np.int64), "flat_shape"),
+         numpy_helper.from_array(weights, "weights")],
+    )
+    save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=7), path)
+
+
+def test_model_name_is_tagged_with_the_pipeline():
+    registry = FaceModelRegistry()
+    assert registry.model_name == pipeline_model_name(settings.FACE_MODEL_NAME)
+    # Vectors from DeepFace.represent were recorded under the bare name
+    assert registry.model_name != settings.FACE_MODEL_NAME
+
+
+def test_preprocess_face_pads_to_input_size_as_rgb():
+    crop = np.zeros((100, 50, 3), dtype=np.uint8)
+    crop[..., 0] = 255  # blue in BGR
+    face = preprocess_face(crop, (64, 64))
+    assert face.shape == (64, 64, 3)
+    assert face.dtype == np.float32
+    # The narrow crop is centred between zero columns
+    assert not face[:, :16].any() and not face[:, -16:].any()
+    assert np.allclose(face[:, 16:48, 2], 1.0)
+    assert not face[:, 16:48, :2].any()
+
+
+def test_without_backend_the_registry_serves_the_fallback(monkeypatch):
+    monkeypatch.setattr(settings, "FACE_MODEL_BACKEND", "none")
+    registry = FaceModelRegistry()
+    assert not registry.available()
+    assert registry.state == "unavailable"
+    assert registry.ready
+    assert registry.status()["fallback"]
+    with pytest.raises(RuntimeError):
+        registry.embed(np.zeros((1, 224, 224, 3), dtype=np.float32))
+
+
+@pytest.mark.parametrize("input_shape", [["N", 16, 16, 3], ["N", 3, 16, 16]])
+def test_onnx_backend_embeds_normalised_vectors(tmp_path, monkeypatch, input_shape):
+    path = str(tmp_path / "face.onnx")
+    _onnx_model(path, input_shape)
+    monkeypatch.setattr(settings, "FACE_MODEL_BACKEND", "onnx")
+    monkeypatch.setattr(settings, "FACE_ONNX_MODEL_PATH", path)
+    registry = FaceModelRegistry()
+    registry.load_and_warmup()
+    assert registry.state == "ready"
+    assert registry.input_size == (16, 16)
+    vectors = registry.embed(np.random.default_rng(1).random((3, 16, 16, 3), dtype=np.float32))
+    assert vectors.shape == (3, 8)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
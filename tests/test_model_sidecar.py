@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.services.model_registry import FaceModelRegistry
+from app.services.model_sidecar import SidecarClient
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    path = str(tmp_path / "face-model.sock")
+    proc = subprocess.Popen([sys.executable, "-m", "app.scripts.model_sidecar", "--socket", path],
+                            env={**os.environ, "FACE_MODEL_BACKEND": "none"}, stderr=subprocess.DEVNULL)
+    try:
+        yield path, proc
+    finally:
+        if proc.poll() is None:
+            proc.terminate()
+            proc.wait(10)
+
+
+def test_info_and_clean_shutdown(sidecar):
+    path, proc = sidecar
+    client = SidecarClient(path, timeout=5)
+    info = client.wait_ready(60)
+    assert info["state"] == "unavailable"
+    proc.terminate()
+    assert proc.wait(10) == 0
+    assert not os.path.exists(path)
+
+
+def test_reachability_follows_the_sidecar(sidecar):
+    path, proc = sidecar
+    registry = FaceModelRegistry(path)
+    registry._model = SidecarClient(path, timeout=5)
+    registry._model.wait_ready(60)
+    assert registry.sidecar_reachable() is True
+    proc.terminate()
+    proc.wait(10)
+    assert registry.sidecar_reachable() is False
+    assert FaceModelRegistry("").sidecar_reachable() is None
@@ -0,0 +1,125 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models.biometric_data import BiometricType
+from app.services.scoring import (
+    COSINE,
+    EUCLIDEAN,
+    aggregate,
+    compare,
+    cosine_scores,
+    euclidean_distances,
+    normalize,
+    stack,
+)
+from app.services.model_registry import face_models
+from app.services.template_format import MOCK_MODEL, Template, decode_template
+
+
+# The per-pair code the verification endpoints used before the shared module
+def scalar_cosine(a, b) -> float:
+    dot = sum(float(x) * float(y) for x, y in zip(a, b))
+    return dot / (math.sqrt(sum(float(x) ** 2 for x in a)) * math.sqrt(sum(float(y) ** 2 for y in b)) + 1e-8)
+
+
+def scalar_euclidean(a, b) -> float:
+    return math.sqrt(sum((float(x) - float(y)) ** 2 for x, y in zip(a, b)))
+
+
+def _vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def _template(vector, model: str = "VGG-Face", modality=BiometricType.FACE, normalized: bool | None = None) -> Template:
+    vector = np.asarray(vector, dtype=np.float32)
+    if normalized is None:
+        normalized = abs(float(np.linalg.norm(vector)) - 1.0) < 1e-3
+    return Template(vector, modality, model, normalized)
+
+
+def test_cosine_scores_match_scalar_baseline():
+    probe, templates = _vectors(1, 256, seed=1)[0], _vectors(20, 256, seed=2)
+    expected = [scalar_cosine(probe, t) for t in templates]
+    assert np.allclose(cosine_scores(probe, templates), expected, atol=1e-5)
+    assert np.allclose(cosine_scores(probe, normalize(templates), normalized=True), expected, atol=1e-5)
+
+
+def test_euclidean_distances_match_scalar_baseline():
+    probe, templates = _vectors(1, 128, seed=3)[0], _vectors(10, 128, seed=4)
+    expected = [scalar_euclidean(probe, t) for t in templates]
+    assert np.allclose(euclidean_distances(probe, templates), expected, atol=1e-4)
+
+
+def test_compare_keeps_best_cosine_score():
+    probe = _vectors(1, 64, seed=5)[0]
+    templates = [_template(v) for v in _vectors(5, 64, seed=6)]
+    templates.append(_template(normalize(probe + 0.1 * _vectors(1, 64, seed=7)[0])))
+    result = compare(probe, "VGG-Face", templates)
+    expected = max(scalar_cosine(probe, t.vector) for t in templates)
+    assert result.metric == COSINE
+    assert result.threshold == settings.FACE_COSINE_THRESHOLD
+    assert result.score == pytest.approx(expected, abs=1e-5)
+    assert result.match == (expected >= settings.FACE_COSINE_THRESHOLD)
+
+
+def test_compare_mock_templates_use_smallest_euclidean_distance():
+    probe = _vectors(1, 128, seed=8)[0] * 0.05
+    templates = [_template(v * 0.05, model=MOCK_MODEL) for v in _vectors(3, 128, seed=9)]
+    result = compare(probe, MOCK_MODEL, templates)
+    expected = min(scalar_euclidean(probe, t.vector) for t in templates)
+    assert result.metric == EUCLIDEAN
+    assert result.score == pytest.approx(expected, abs=1e-4)
+    assert result.match == (expected < settings.FACE_EUCLIDEAN_THRESHOLD)
+
+
+def test_voice_templates_use_voice_threshold():
+    probe = _vectors(1, 40, seed=10)[0]
+    result = compare(probe, None, _template(probe, model="MFCC", modality=BiometricType.VOICE))
+    assert result.metric == COSINE
+    assert result.threshold == settings.VOICE_COSINE_THRESHOLD
+    assert result.score == pytest.approx(1.0, abs=1e-5)
+    assert result.match
+
+
+def test_incomparable_templates_are_a_non_match():
+    probe = _vectors(1, 64, seed=11)[0]
+    other_model = compare(probe, "ORB", _template(probe))
+    other_dim = compare(probe, "VGG-Face", _template(_vectors(1, 32, seed=12)[0]))
+    for result in (other_model, other_dim):
+        assert result.score == 0.0
+        assert not result.match
+
+
+def test_stack_reports_normalized_only_if_every_template_is():
+    unit = _template(normalize(_vectors(1, 8)[0]))
+    raw = _template(_vectors(1, 8)[0] * 3, normalized=False)
+    assert stack([unit, unit])[1]
+    assert not stack([unit, raw])[1]
+    # A template not stored as normalised is renormalised before scoring
+    probe = raw.vector
+    assert compare(probe, "VGG-Face", [unit, raw]).score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_legacy_deepface_templates_do_not_match_current_probes():
+    probe = normalize(_vectors(1, 2622, seed=14)[0])
+    legacy = decode_template(json.dumps(probe.tolist()).encode(), BiometricType.FACE, settings.FACE_MODEL_NAME)
+    result = compare(probe, face_models.model_name, legacy)
+    assert not result.match
+    assert result.score == 0.0
+
+
+def test_aggregate():
+    samples = _vectors(5, 32, seed=13)
+    mean = aggregate(samples, "mean")
+    expected = normalize(normalize(samples).mean(axis=0))
+    assert np.allclose(mean, expected, atol=1e-6)
+    assert np.linalg.norm(mean) == pytest.approx(1.0, abs=1e-5)
+    medoid = aggregate(samples, "medoid")
+    totals = [sum(scalar_cosine(a, b) for b in samples) for a in samples]
+    assert np.allclose(medoid, normalize(samples[int(np.argmax(totals))]), atol=1e-6)
+    with pytest.raises(ValueError):
+        aggregate(samples, "max")
@@ -0,0 +1,63 @@
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1.endpoints import exam
+from app.core.config import settings
+
+
+@pytest.fixture
+async def client():
+    app = FastAPI()
+    app.include_router(exam.router, prefix="/exam")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_pages_follow_the_keyset_cursor(client, exam_session, store_event):
+    user_id, session_id = exam_session
+    ids = [store_event(user_id, session_id).id for _ in range(5)]
+    seen = []
+    after_id = 0
+    while after_id is not None:
+        page = (await client.get(f"/exam/session/{session_id}/details", params={"after_id": after_id, "limit": 2})).json()
+        seen += [event["id"] for event in page["log"]]
+        assert len(page["log"]) <= 2
+        after_id = page["next_after_id"]
+    assert seen == ids
+
+
+async def test_limit_is_capped(client, exam_session, store_event, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_DETAILS_MAX_PAGE_SIZE", 2)
+    user_id, session_id = exam_session
+    for _ in range(3):
+        store_event(user_id, session_id)
+    page = (await client.get(f"/exam/session/{session_id}/details", params={"limit": 100})).json()
+    assert len(page["log"]) == 2
+    assert page["next_after_id"] == page["log"][-1]["id"]
+
+
+async def test_fields_are_projected_and_always_include_the_id(client, exam_session, store_event):
+    user_id, session_id = exam_session
+    store_event(user_id, session_id, score=0.7)
+    page = (await client.get(f"/exam/session/{session_id}/details", params={"fields": "score,match"})).json()
+    assert page["log"] == [{"id": page["log"][0]["id"], "score": 0.7, "match": True}]
+
+    response = await client.get(f"/exam/session/{session_id}/details", params={"fields": "score,password"})
+    assert response.status_code == 400
+
+
+async def test_ndjson_export_streams_every_page(client, exam_session, store_event, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_DETAILS_MAX_PAGE_SIZE", 2)
+    user_id, session_id = exam_session
+    ids = [store_event(user_id, session_id).id for _ in range(5)]
+    response = await client.get(f"/exam/session/{session_id}/details", params={"format": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ids
+    assert set(json.loads(lines[0])) >= {"id", "modality", "phase", "score", "created_at"}
+
+    limited = await client.get(f"/exam/session/{session_id}/details", params={"format": "ndjson", "limit": 3})
+    assert [json.loads(line)["id"] for line in limited.text.splitlines()] == ids[:3]
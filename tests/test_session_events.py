@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy.orm import make_transient
+
+from app.db.session import AsyncSessionLocal
+from app.services.session_events import (
+    RESYNC,
+    SessionEventBroker,
+    TooManySubscribersError,
+    event_payload,
+    sse_message,
+)
+
+
+def _event_ids(subscription) -> list[int]:
+    """Ids of the queued `verification` messages (metrics snapshots carry no id)."""
+    ids = []
+    while not subscription.queue.empty():
+        event_id, _ = subscription.queue.get_nowait()
+        if event_id is not None:
+            ids.append(event_id)
+    return ids
+
+
+async def test_publish_reaches_subscribers_of_the_session(exam_session, store_event):
+    user_id, session_id = exam_session
+    broker = SessionEventBroker(max_subscribers=2, queue_size=16)
+    subscription = broker.subscribe(session_id)
+    other = broker.subscribe(session_id + 1000)
+    event = store_event(user_id, session_id)
+    broker.publish([event])
+    assert _event_ids(subscription) == [event.id]
+    assert other.queue.empty()
+    subscription.close()
+    other.close()
+    assert broker.stats()["subscribers"] == 0
+
+
+async def test_subscribers_per_session_are_capped(exam_session):
+    _, session_id = exam_session
+    broker = SessionEventBroker(max_subscribers=1, queue_size=16)
+    broker.subscribe(session_id)
+    with pytest.raises(TooManySubscribersError):
+        broker.subscribe(session_id)
+
+
+async def test_slow_subscriber_gets_a_resync(exam_session, store_event):
+    user_id, session_id = exam_session
+    broker = SessionEventBroker(max_subscribers=1, queue_size=2)
+    subscription = broker.subscribe(session_id)
+    broker.publish([store_event(user_id, session_id) for _ in range(3)])
+    assert subscription.queue.get_nowait() == (None, RESYNC)
+    assert subscription.queue.empty()
+    assert subscription.dropped == 2
+
+
+def test_sse_message_format(exam_session, store_event):
+    user_id, session_id = exam_session
+    event = store_event(user_id, session_id)
+    message = sse_message("verification", event_payload(event), event.id)
+    lines = message.split("\n")
+    assert lines[:2] == ["event: verification", f"id: {event.id}"]
+    assert json.loads(lines[2][len("data: "):])["id"] == event.id
+    assert message.endswith("\n\n")
+
+
+async def test_poller_publishes_other_workers_events_once(exam_session, store_event):
+    user_id, session_id = exam_session
+    broker = SessionEventBroker(max_subscribers=2, queue_size=16, poll_seconds=0.05)
+    subscription = broker.subscribe(session_id)
+    async with AsyncSessionLocal() as db:
+        await broker.start_polling(db)
+
+    local = store_event(user_id, session_id)
+    broker.publish([local])
+    remote = store_event(user_id, session_id)
+    # The poller sees both rows but only publishes the one this worker did not
+    await asyncio.sleep(0.3)
+    assert sorted(_event_ids(subscription)) == [local.id, remote.id]
+    assert broker.polled == 1
+    subscription.close()
+    await asyncio.wait_for(broker._poller, 1.0)
+
+
+async def test_rows_committed_below_the_watermark_are_published(db, exam_session, store_event):
+    user_id, session_id = exam_session
+    broker = SessionEventBroker(max_subscribers=2, queue_size=16, poll_seconds=0.05, rescan_window=100)
+    history = store_event(user_id, session_id)
+    subscription = broker.subscribe(session_id)
+    async with AsyncSessionLocal() as async_db:
+        await broker.start_polling(async_db)
+
+    late = store_event(user_id, session_id)
+    late_id = late.id
+    high = store_event(user_id, session_id)
+    # PostgreSQL assigns ids before commit: the lower id becomes visible after the higher one
+    db.delete(late)
+    db.commit()
+    await asyncio.sleep(0.3)
+    make_transient(late)
+    db.add(late)
+    db.commit()
+    await asyncio.sleep(0.3)
+    # Rows that predate the stream are not sent, even inside the rescanned window
+    assert _event_ids(subscription) == [high.id, late_id]
+    assert history.id < late_id
+    subscription.close()
+    await asyncio.wait_for(broker._poller, 1.0)
@@ -0,0 +1,61 @@
+import app.services.session_metrics as module
+from app.db.session import AsyncSessionLocal
+from app.services.session_metrics import SessionMetrics
+
+
+async def _get(cache: SessionMetrics, session_id: int):
+    async with AsyncSessionLocal() as db:
+        return await cache.get(session_id, db)
+
+
+async def test_rollup_matches_events(exam_session, store_event):
+    user_id, session_id = exam_session
+    store_event(user_id, session_id, score=0.8)
+    store_event(user_id, session_id, match=False, score=0.1)
+    rollup = (await _get(SessionMetrics(10), session_id)).to_dict()
+    assert rollup["events"] == 2 and rollup["failures"] == 1
+    assert rollup["score"]["min"] == 0.1 and rollup["score"]["max"] == 0.8
+
+
+async def test_record_folds_in_committed_events_once(exam_session, store_event):
+    user_id, session_id = exam_session
+    cache = SessionMetrics(10)
+    rollup = await _get(cache, session_id)
+    etag = cache.etag(rollup)
+    event = store_event(user_id, session_id)
+    cache.record([event])
+    cache.record([event])
+    assert rollup.events == 1
+    assert cache.etag(rollup) != etag
+    assert await _get(cache, session_id) is rollup
+    assert cache.hits == 1
+
+
+async def test_least_recently_used_sessions_are_evicted(exam_session, store_event):
+    user_id, session_id = exam_session
+    cache = SessionMetrics(1)
+    await _get(cache, session_id)
+    await _get(cache, session_id + 1000)
+    await _get(cache, session_id)
+    assert cache.loads == 3
+
+
+async def test_other_workers_events_appear_after_ttl(exam_session, store_event, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    user_id, session_id = exam_session
+    cache = SessionMetrics(10, ttl_seconds=5)
+    first = await _get(cache, session_id)
+    etag = cache.etag(first)
+
+    now[0] += 6
+    # Nothing new: rebuilt, but the ETag still matches
+    assert cache.etag(await _get(cache, session_id)) == etag
+
+    store_event(user_id, session_id)
+    assert (await _get(cache, session_id)).events == 0
+    now[0] += 6
+    rollup = await _get(cache, session_id)
+    assert rollup.events == 1
+    assert cache.etag(rollup) != etag
+    assert cache.refreshes == 2
@@ -0,0 +1,67 @@
+import numpy as np
+
+from app.services.template_cache import TemplateCache
+from app.services.template_format import Template
+
+
+def _template(value: float = 1.0) -> Template:
+    return Template(np.full(4, value, dtype=np.float32), "face", "VGG-Face", False, 2)
+
+
+def test_get_returns_copy_that_survives_invalidate():
+    cache = TemplateCache(max_entries=4, ttl_seconds=60)
+    cache.put(1, "face", _template())
+    held = cache.get(1, "face")
+    cache.invalidate(1)
+    assert np.all(held.vector == 1.0)
+    assert cache.get(1, "face") is None
+
+
+def test_put_for_same_key_does_not_zero_held_template():
+    cache = TemplateCache(max_entries=4, ttl_seconds=60)
+    held = cache.put(1, "face", _template(1.0))
+    in_flight = cache.get(1, "face")
+    cache.put(1, "face", _template(2.0))
+    assert np.all(held.vector == 1.0)
+    assert np.all(in_flight.vector == 1.0)
+    assert np.all(cache.get(1, "face").vector == 2.0)
+
+
+def test_handed_out_vectors_are_read_only():
+    cache = TemplateCache(max_entries=4, ttl_seconds=60)
+    cache.put(1, "face", _template())
+    vector = cache.get(1, "face").vector
+    assert vector.dtype == np.float32
+    assert not vector.flags.writeable
+
+
+def test_lru_eviction():
+    cache = TemplateCache(max_entries=2, ttl_seconds=60)
+    cache.put(1, "face", _template())
+    cache.put(2, "face", _template())
+    cache.get(1, "face")
+    cache.put(3, "face", _template())
+    assert cache.get(2, "face") is None
+    assert cache.get(1, "face") is not None
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    import app.services.template_cache as module
+
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    cache = TemplateCache(max_entries=4, ttl_seconds=10)
+    cache.put(1, "face", _template())
+    held = cache.get(1, "face")
+    now[0] += 11
+    assert cache.get(1, "face") is None
+    assert cache.expirations == 1
+    assert np.all(held.vector == 1.0)
+
+
+def test_disabled_cache_passes_through():
+    cache = TemplateCache(max_entries=0, ttl_seconds=60)
+    returned = cache.put(1, "face", _template())
+    assert returned.vector.dtype == np.float32
+    assert cache.get(1, "face") is None
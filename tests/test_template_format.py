@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models.biometric_data import BiometricType
+from app.services import template_format
+from app.services.model_registry import face_models
+from app.services.scoring import compare, normalize
+from app.services.template_format import (
+    FLAG_NORMALIZED,
+    TemplateFormatError,
+    decode_template,
+    encode_template,
+)
+
+# Tolerance of each stored precision against the float32 input
+TOLERANCE = {"float32": 0.0, "float16": 1e-3, "int8": 1e-2}
+
+
+def _unit(dim: int = 512, seed: int = 0) -> np.ndarray:
+    return normalize(np.random.default_rng(seed).standard_normal(dim))
+
+
+def _peaky() -> np.ndarray:
+    # One dominant component: int8 rounds every small one up to a whole step and the norm drifts
+    return normalize(np.array([1.0] + [0.004] * 60))
+
+
+def _flags(data: bytes) -> int:
+    return data[7]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_round_trip_per_dtype(dtype):
+    vector = _unit()
+    template = decode_template(encode_template(vector, BiometricType.VOICE, "MFCC", dtype))
+    assert template.vector.dtype == np.float32
+    assert template.modality == BiometricType.VOICE
+    assert template.model == "MFCC"
+    assert template.version == template_format.FORMAT_VERSION
+    assert template.dim == vector.size
+    assert np.max(np.abs(template.vector - vector)) <= TOLERANCE[dtype]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_normalized_flag_matches_decoded_vector(dtype):
+    for vector in (_unit(), _peaky(), _unit() * 3.0):
+        template = decode_template(encode_template(vector, BiometricType.FACE, "VGG-Face", dtype))
+        assert template.normalized == (abs(float(np.linalg.norm(template.vector)) - 1.0) < 1e-3)
+
+
+def test_int8_quantisation_clears_normalized_flag():
+    data = encode_template(_peaky(), BiometricType.FACE, "VGG-Face", "int8")
+    assert not _flags(data) & FLAG_NORMALIZED
+    assert not decode_template(data).normalized
+
+
+def test_stale_flag_on_quantised_template_is_not_trusted():
+    # Written before the flag was computed after quantisation
+    data = bytearray(encode_template(_peaky(), BiometricType.FACE, "VGG-Face", "int8"))
+    data[7] |= FLAG_NORMALIZED
+    assert not decode_template(bytes(data)).normalized
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_quantised_template_scores_like_its_decoded_values(dtype):
+    template = decode_template(encode_template(_peaky(), BiometricType.FACE, "VGG-Face", dtype))
+    probe = _peaky()
+    expected = float(np.dot(probe, template.vector) / (np.linalg.norm(probe) * np.linalg.norm(template.vector)))
+    # A flagged template is scored as if it were exactly unit length, which it is up to 1e-3
+    tolerance = 1e-3 if template.normalized else 1e-6
+    assert compare(probe, "VGG-Face", template).score == pytest.approx(expected, abs=tolerance)
+    assert compare(probe, "VGG-Face", template).score <= 1.0 + 1e-3
+
+
+def test_legacy_json_template():
+    vector = _unit(128)
+    template = decode_template(json.dumps(vector.tolist()).encode(), BiometricType.FACE)
+    assert template.version == 0
+    assert template.model == template_format.MOCK_MODEL
+    assert template.normalized
+    assert np.allclose(template.vector, vector)
+
+
+def test_legacy_face_template_keeps_the_deepface_model_name():
+    # Wider legacy face rows came from DeepFace.represent, not from this service's pipeline
+    template = decode_template(json.dumps(_unit(2622).tolist()).encode(), BiometricType.FACE, settings.FACE_MODEL_NAME)
+    assert template.model == settings.FACE_MODEL_NAME
+    assert template.model != face_models.model_name
+
+
+def test_corrupt_templates_are_rejected():
+    data = encode_template(_unit(), BiometricType.FACE, "VGG-Face")
+    with pytest.raises(TemplateFormatError):
+        decode_template(data[:10])
+    with pytest.raises(TemplateFormatError):
+        decode_template(data[:-4])
+    with pytest.raises(TemplateFormatError):
+        encode_template(_unit(), BiometricType.FACE, "VGG-Face", "float64")
@@ -0,0 +1,107 @@
+import io
+import os
+import tempfile
+import zlib
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from app.services.uploads import (
+    RequestSizeLimitMiddleware,
+    looks_like_audio,
+    looks_like_image,
+    read_upload,
+    spool_upload,
+)
+
+
+def _upload(data: bytes, size: int | None = None) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), size=size)
+
+
+async def test_read_upload_returns_the_payload():
+    assert await read_upload(_upload(b"x" * 100), max_bytes=100) == b"x" * 100
+
+
+async def test_read_upload_rejects_oversized_payloads_while_reading():
+    with pytest.raises(HTTPException) as excinfo:
+        await read_upload(_upload(b"x" * 101), max_bytes=100)
+    assert excinfo.value.status_code == 413
+
+
+async def test_declared_size_is_rejected_before_reading():
+    upload = _upload(b"", size=1000)
+    with pytest.raises(HTTPException) as excinfo:
+        async with spool_upload(upload, max_bytes=100):
+            pass
+    assert excinfo.value.status_code == 413
+
+
+async def test_small_uploads_stay_in_memory():
+    data = b"RIFF" + b"\x00" * 100
+    async with spool_upload(_upload(data), max_bytes=1000, spill_bytes=1000) as spooled:
+        assert spooled.path is None
+        assert spooled.source == data
+        assert spooled.size == len(data)
+        assert spooled.crc32 == zlib.crc32(data)
+        assert spooled.head == data[:16]
+
+
+async def test_large_uploads_spill_to_disk_and_are_removed():
+    data = os.urandom(200 * 1024)
+    async with spool_upload(_upload(data), max_bytes=len(data), spill_bytes=1024) as spooled:
+        path = spooled.source
+        assert isinstance(path, str)
+        with open(path, "rb") as fh:
+            assert fh.read() == data
+        assert spooled.crc32 == zlib.crc32(data)
+    assert not os.path.exists(path)
+
+
+async def test_spilled_file_is_removed_when_the_limit_is_hit(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    with pytest.raises(HTTPException):
+        async with spool_upload(_upload(os.urandom(200 * 1024)), max_bytes=100 * 1024, spill_bytes=1024):
+            pass
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_signature_checks():
+    assert looks_like_image(b"\x89PNG\r\n\x1a\n" + b"\x00" * 8)
+    assert looks_like_image(b"RIFF\x00\x00\x00\x00WEBP")
+    assert not looks_like_image(b"RIFF\x00\x00\x00\x00WAVE")
+    assert looks_like_audio(b"RIFF\x00\x00\x00\x00WAVE")
+    assert looks_like_audio(b"fLaC")
+    assert not looks_like_audio(b"not audio at all")
+
+
+def _limited_app(max_bytes: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=max_bytes)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_middleware_passes_bodies_within_the_limit():
+    response = _limited_app(100).post("/echo", content=b"x" * 100)
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+
+def test_middleware_rejects_by_content_length():
+    response = _limited_app(100).post("/echo", content=b"x" * 101)
+    assert response.status_code == 413
+
+
+def test_middleware_rejects_chunked_bodies_mid_stream():
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 50
+
+    response = _limited_app(100).post("/echo", content=chunks())
+    assert response.status_code == 413
@@ -0,0 +1,173 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.models.biometric_data import BiometricData, BiometricType, TemplateKind
+from app.models.user import User
+from app.services.template_format import MOCK_MODEL
+from app.services.templates import encrypt_template
+from app.services.vector_index import FaceIndex, VectorIndex
+
+MODEL = "VGG-Face"
+
+
+def _vector(seed: int, dim: int = 16) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def _user(db, name: str) -> int:
+    user = User(email=f"{name}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def _store(db, user_id: int, vector, kind: TemplateKind = TemplateKind.SINGLE) -> int:
+    row = BiometricData(user_id=user_id, modality=BiometricType.FACE, created_at=datetime.utcnow(),
+                        encrypted_descriptor=encrypt_template(vector, BiometricType.FACE, MODEL), kind=kind)
+    db.add(row)
+    db.commit()
+    return row.id
+
+
+def _index(path) -> FaceIndex:
+    return FaceIndex(str(path), ivf_threshold=1000, nlist=0, nprobe=4)
+
+
+def test_flat_search_finds_exact_vector():
+    index = VectorIndex(16, ivf_threshold=1000)
+    vectors = np.stack([_vector(i) for i in range(20)])
+    index.add(np.arange(20), np.arange(100, 120), vectors)
+    row_id, user_id, score = index.search(vectors[7], k=1)[0]
+    assert (row_id, user_id) == (7, 107)
+    assert score > 0.999
+
+
+def test_ivf_search_finds_exact_vector():
+    index = VectorIndex(16, ivf_threshold=64, nprobe=64)
+    vectors = np.stack([_vector(i) for i in range(200)])
+    index.add(np.arange(200), np.arange(200), vectors)
+    assert index.kind == "ivf"
+    assert index.search(vectors[42], k=1)[0][0] == 42
+
+
+def test_catch_up_after_restart_loads_rows_stored_elsewhere(db, tmp_path):
+    path = tmp_path / "face_index.bin"
+
+    first = _index(path)
+    first.load_or_build()
+    start = first.size
+    # Rows stored by an import or another worker, which this process never sees...
+    users = [_user(db, f"index-{tmp_path.name}-{i}") for i in range(4)]
+    elsewhere = [_store(db, users[i], _vector(i)) for i in range(3)]
+    # ...and one it enrolls itself, with a higher id
+    own = _store(db, users[3], _vector(10))
+    first.add(own, users[3], _vector(10), MODEL)
+    first.save()
+
+    restarted = _index(path)
+    restarted.load_or_build()
+    assert restarted.size == start + 4
+    found = {row_id for row_id, _, _ in restarted.search(_vector(1), MODEL, k=1)}
+    assert found == {elsewhere[1]}
+    assert restarted.max_row_id == own
+
+    # A further restart decrypts nothing new
+    again = _index(path)
+    again.load()
+    assert again._catch_up(db) == 0
+
+
+def test_save_leaves_no_temp_files(tmp_path):
+    index = _index(tmp_path / "face_index.bin")
+    index.add(1, 1, _vector(0), MODEL)
+    index.save()
+    index.save()
+    assert [p.name for p in tmp_path.iterdir()] == ["face_index.bin"]
+    loaded = _index(tmp_path / "face_index.bin")
+    assert loaded.load() and loaded.size == 1
+
+
+def test_vector_index_remove_keeps_search_consistent():
+    index = VectorIndex(16, ivf_threshold=64, nprobe=64)
+    vectors = np.stack([_vector(i) for i in range(100)])
+    index.add(np.arange(100), np.arange(100), vectors)
+    assert index.remove(42)
+    assert not index.remove(42)
+    assert index.size == 99
+    assert index.search(vectors[42], k=1)[0][0] != 42
+    # The entry moved into the freed slot is still found
+    assert index.search(vectors[99], k=1)[0][0] == 99
+
+
+def test_re_enrollment_replaces_the_users_template(tmp_path):
+    index = _index(tmp_path / "face_index.bin")
+    index.add(1, 7, _vector(1), MODEL)
+    index.add(2, 7, _vector(2), MODEL)
+    assert index.size == 1
+    # The old template no longer finds the user through its own row
+    assert index.search(_vector(1), MODEL, k=1)[0][0] == 2
+    # An older row arriving late does not displace the newer one
+    index.add(0, 7, _vector(0), MODEL)
+    assert index.size == 1
+    # Neither does a newer mock template stay searchable, but it retires the real one
+    index.add(3, 7, _vector(3), MOCK_MODEL)
+    assert index.size == 0
+
+
+def test_catch_up_indexes_only_the_newest_row_per_user(db, tmp_path):
+    index = _index(tmp_path / "face_index.bin")
+    index.load_or_build()
+    start = index.size
+    user_id = _user(db, f"reenroll-{tmp_path.name}")
+    old = _store(db, user_id, _vector(20))
+    new = _store(db, user_id, _vector(21))
+    assert index._catch_up(db) == 1
+    assert index.size == start + 1
+    assert index.search(_vector(20), MODEL, k=50)[0][0] != old
+    assert {row_id for row_id, uid, _ in index.search(_vector(21), MODEL, k=50) if uid == user_id} == {new}
+
+    # After a restart the snapshot knows the user's template, so nothing is decrypted again
+    index.save()
+    restarted = _index(tmp_path / "face_index.bin")
+    restarted.load()
+    restarted.max_row_id = old - 1
+    assert restarted._catch_up(db) == 0
+    assert restarted.size == start + 1
+
+
+def test_catch_up_ignores_per_sample_rows(db, tmp_path):
+    index = _index(tmp_path / "face_index.bin")
+    index.load_or_build()
+    user_id = _user(db, f"samples-{tmp_path.name}")
+    template = _store(db, user_id, _vector(30), TemplateKind.AGGREGATE)
+    _store(db, user_id, _vector(31), TemplateKind.SAMPLE)
+    index._catch_up(db)
+    assert {row_id for row_id, uid, _ in index.search(_vector(31), MODEL, k=50) if uid == user_id} == {template}
+
+
+def test_refresh_adds_rows_stored_by_other_workers(db, tmp_path):
+    user_id = _user(db, f"refresh-{tmp_path.name}")
+    index = FaceIndex(str(tmp_path / "face_index.bin"), ivf_threshold=1000, nlist=0, nprobe=4, refresh_seconds=0.01)
+    index.load_or_build()
+    row_id = _store(db, user_id, _vector(40))
+    assert row_id not in {hit[0] for hit in index.search(_vector(40), MODEL, k=1)}
+    time.sleep(0.02)
+    assert index.refresh_due()
+    assert index.refresh() == 1
+    assert index.search(_vector(40), MODEL, k=1)[0][0] == row_id
+    assert not index.refresh_due()
+
+
+def test_catch_up_rescans_ids_below_the_watermark(db, tmp_path):
+    index = FaceIndex(str(tmp_path / "face_index.bin"), ivf_threshold=1000, nlist=0, nprobe=4, rescan_window=100)
+    index.load_or_build()
+    user_id = _user(db, f"late-{tmp_path.name}")
+    late = _store(db, user_id, _vector(50))
+    # Another worker's higher id was scanned while this row was still uncommitted
+    index.max_row_id = late + 1
+    assert index._catch_up(db) == 1
+    assert index.search(_vector(50), MODEL, k=1)[0][0] == late
+    # Rows of the window seen before are not decrypted again
+    assert index._catch_up(db) == 0
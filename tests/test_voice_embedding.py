@@ -0,0 +1,66 @@
+import io
+
+import librosa
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.services.voice_embedding import (
+    DELTA_WIDTH,
+    _mfcc_means,
+    compute_embedding,
+    compute_embedding_librosa,
+)
+
+
+def _wav(sr: int, seconds: float, seed: int = 0) -> bytes:
+    """Voiced segments (harmonics of a gliding pitch) separated by pauses."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sr * seconds)) / sr
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sr
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = (np.sin(2 * np.pi * 1.5 * t) > -0.3).astype(np.float64)
+    y = 0.2 * voiced * envelope + 0.01 * rng.standard_normal(len(t))
+    buf = io.BytesIO()
+    sf.write(buf, y.astype(np.float32), sr, format="WAV")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("sr", [8000, 16000, 44100])
+def test_exact_mode_reproduces_librosa(sr):
+    payload = _wav(sr, 3)
+    reference = np.asarray(compute_embedding_librosa(payload))
+    exact = np.asarray(compute_embedding(payload, mode="exact"))
+    # A few float32 ulps of the unit-norm vector (~1e-8 at 16/44.1 kHz, 6e-8 at 8 kHz)
+    assert np.max(np.abs(exact - reference)) <= 1e-7
+
+
+@pytest.mark.parametrize("sr", [8000, 16000, 44100])
+def test_lean_mode_agrees_with_librosa(sr):
+    payload = _wav(sr, 3)
+    reference = np.asarray(compute_embedding_librosa(payload))
+    lean = np.asarray(compute_embedding(payload, mode="lean"))
+    assert float(np.dot(reference, lean)) >= 0.99994
+
+
+def test_spilled_path_matches_in_memory_payload(tmp_path):
+    payload = _wav(16000, 2)
+    path = tmp_path / "sample.wav"
+    path.write_bytes(payload)
+    assert compute_embedding(str(path), mode="exact") == compute_embedding(payload, mode="exact")
+
+
+def test_delta_means_match_librosa():
+    rng = np.random.default_rng(1)
+    log_mel = rng.standard_normal((128, 5 * DELTA_WIDTH)).astype(np.float32)
+    mfcc_mean, delta_mean, delta2_mean = _mfcc_means(log_mel)
+    mfcc = librosa.feature.mfcc(S=log_mel, n_mfcc=40)
+    assert np.allclose(mfcc_mean, mfcc.mean(axis=1), atol=1e-4)
+    assert np.allclose(delta_mean, librosa.feature.delta(mfcc).mean(axis=1), atol=1e-5)
+    assert np.allclose(delta2_mean, librosa.feature.delta(mfcc, order=2).mean(axis=1), atol=1e-5)
+
+
+def test_undecodable_payload_has_no_embedding():
+    assert compute_embedding(b"not audio", mode="lean") is None
+    assert compute_embedding(b"", mode="exact") is None